@@ -0,0 +1,4 @@
+# Time every import the app makes when SMARTTAX_IMPORT_PROFILE=1 (see app.startup)
+from app.startup import install_import_profiler
+
+install_import_profiler()
@@ -0,0 +1,324 @@
+"""
+Trade-Level Capital Gains Breakdown
+
+Parsers reduce a report to a few bucket totals, which cannot be explained
+to a user or reconciled against AIS/26AS. Parsers that can also return a
+``Breakdown``: one row per trade / matched lot / redemption, stored
+column by column:
+
+    name, isin           dictionary-encoded (int32 codes + unique strings)
+    buy_date, sell_date  datetime64[D] (NaT when the report has none)
+    quantity, cost, proceeds, gain   float64
+    bucket               int8 code into BUCKETS
+
+Columnar NumPy arrays (the same layout as an Arrow record batch with
+dictionary columns) keep a 100k-row table at a few MB, make filtering a
+handful of vectorised comparisons over the unique names, and pickle
+cheaply from the parser worker processes.
+
+Breakdowns are kept in a ``BreakdownStore`` under the ID returned with the
+parse result, so the paging endpoint never re-parses the file: an LRU of
+tables in memory, optionally backed by ``.npz`` files in a directory that
+every API process can share.
+
+Configuration (environment variables):
+    SMARTTAX_BREAKDOWN_CACHE_SIZE: Tables kept in memory (default: 32)
+    SMARTTAX_BREAKDOWN_DIR: Directory for the on-disk tier (default:
+        unset, memory only)
+    SMARTTAX_BREAKDOWN_DIR_MAX_FILES: Tables kept on disk; the oldest are
+        deleted beyond this (default: 2000)
+
+Author: SmartTax Team
+"""
+
+import csv
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+BREAKDOWN_CACHE_SIZE = int(os.getenv("SMARTTAX_BREAKDOWN_CACHE_SIZE", "32"))
+BREAKDOWN_DIR = os.getenv("SMARTTAX_BREAKDOWN_DIR") or None
+BREAKDOWN_DIR_MAX_FILES = int(os.getenv("SMARTTAX_BREAKDOWN_DIR_MAX_FILES", "2000"))
+
+# Key under which worker processes hand the table back with the summary
+BREAKDOWN_KEY = "_breakdown"
+
+# Bucket names, indexed by the ``bucket`` code
+BUCKETS = (
+    "stcg_before", "stcg_after", "ltcg_before", "ltcg_after", "intraday",
+    "equity_stcg", "equity_ltcg", "debt_stcg", "debt_ltcg", "unclassified",
+)
+BUCKET_CODES = {name: code for code, name in enumerate(BUCKETS)}
+
+# Most rows one page may return
+MAX_PAGE_ROWS = 1000
+
+_TEXT_COLUMNS = ("name", "isin")
+_DATE_COLUMNS = ("buy_date", "sell_date")
+_NUMBER_COLUMNS = ("quantity", "cost", "proceeds", "gain")
+
+COLUMNS = _TEXT_COLUMNS + _DATE_COLUMNS + _NUMBER_COLUMNS + ("bucket",)
+
+
+def bucket_codes(is_long: np.ndarray, is_before: np.ndarray) -> np.ndarray:
+    """stcg/ltcg before/after codes from two boolean arrays"""
+    return (2 * is_long.astype(np.int8) + (~is_before).astype(np.int8)).astype(np.int8)
+
+
+def _encode(values: Iterable[Any]) -> tuple:
+    import pandas as pd     # only needed once a table is built; keeps API start-up light
+
+    codes, uniques = pd.factorize(pd.Series(list(values), dtype=object))
+    names = [str(v).strip() for v in uniques]
+    # Missing values (code -1) become ""
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(names), codes)
+        names.append("")
+    return codes.astype(np.int32), names
+
+
+def _iso(day) -> Optional[str]:
+    return None if np.isnat(day) else str(day)
+
+
+class Breakdown:
+    """Columnar trade-level table; build with ``from_columns`` or ``concat``"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], dictionaries: Dict[str, List[str]]):
+        self.arrays = arrays                # column -> array (codes for text columns)
+        self.dictionaries = dictionaries    # text column -> unique strings
+
+    @classmethod
+    def from_columns(cls, n: int, bucket: np.ndarray, **columns) -> "Breakdown":
+        """
+        Build from per-row columns of length ``n``; missing columns are
+        filled (empty names, NaT dates, NaN numbers). Text columns may be
+        any iterable; dates anything datetime64-convertible.
+        """
+        arrays: Dict[str, np.ndarray] = {}
+        dictionaries: Dict[str, List[str]] = {}
+
+        for name in _TEXT_COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                arrays[name], dictionaries[name] = np.zeros(n, dtype=np.int32), [""]
+            else:
+                arrays[name], dictionaries[name] = _encode(values)
+        for name in _DATE_COLUMNS:
+            values = columns.get(name)
+            arrays[name] = (np.full(n, np.datetime64("NaT"), dtype="datetime64[D]")
+                            if values is None else np.asarray(values).astype("datetime64[D]"))
+        for name in _NUMBER_COLUMNS:
+            values = columns.get(name)
+            arrays[name] = (np.full(n, np.nan) if values is None
+                            else np.asarray(values, dtype=np.float64))
+        arrays["bucket"] = np.broadcast_to(np.asarray(bucket, dtype=np.int8), (n,)).copy()
+        return cls(arrays, dictionaries)
+
+    @classmethod
+    def concat(cls, parts: List["Breakdown"]) -> "Breakdown":
+        if not parts:
+            return cls.from_columns(0, np.zeros(0, dtype=np.int8))
+        arrays: Dict[str, np.ndarray] = {}
+        dictionaries: Dict[str, List[str]] = {}
+        for name in _TEXT_COLUMNS:
+            # Re-encode codes against one merged dictionary
+            values = np.concatenate([
+                np.asarray(p.dictionaries[name], dtype=object)[p.arrays[name]] for p in parts
+            ])
+            arrays[name], dictionaries[name] = _encode(values)
+        for name in _DATE_COLUMNS + _NUMBER_COLUMNS + ("bucket",):
+            arrays[name] = np.concatenate([p.arrays[name] for p in parts])
+        return cls(arrays, dictionaries)
+
+    def __len__(self) -> int:
+        return len(self.arrays["bucket"])
+
+    # ============================================================
+    # QUERIES
+    # ============================================================
+
+    def select(self, symbol: Optional[str] = None, bucket: Optional[str] = None) -> np.ndarray:
+        """
+        Row indices matching the filters.
+
+        ``symbol`` matches a name case-insensitively (substring) or an ISIN
+        exactly; only the unique names are compared, then the codes.
+
+        Raises:
+            ValueError: Unknown bucket name
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if symbol:
+            needle = symbol.strip().lower()
+            names = [n.lower() for n in self.dictionaries["name"]]
+            name_hits = np.flatnonzero([needle in n for n in names])
+            isin_hits = np.flatnonzero([i.lower() == needle for i in self.dictionaries["isin"]])
+            keep &= (np.isin(self.arrays["name"], name_hits)
+                     | np.isin(self.arrays["isin"], isin_hits))
+        if bucket:
+            if bucket not in BUCKET_CODES:
+                raise ValueError(f"Unknown bucket '{bucket}'; expected one of {', '.join(BUCKETS)}")
+            keep &= self.arrays["bucket"] == BUCKET_CODES[bucket]
+        return np.flatnonzero(keep)
+
+    def rows(self, idx: np.ndarray) -> List[dict]:
+        """Rows ``idx`` as JSON-ready dicts"""
+        names = np.asarray(self.dictionaries["name"], dtype=object)[self.arrays["name"][idx]]
+        isins = np.asarray(self.dictionaries["isin"], dtype=object)[self.arrays["isin"][idx]]
+        buy = self.arrays["buy_date"][idx]
+        sell = self.arrays["sell_date"][idx]
+        numbers = {c: np.round(self.arrays[c][idx], 6) for c in _NUMBER_COLUMNS}
+        buckets = self.arrays["bucket"][idx]
+
+        out = []
+        for k in range(len(idx)):
+            row = {"name": names[k], "isin": isins[k],
+                   "buy_date": _iso(buy[k]), "sell_date": _iso(sell[k])}
+            for c in _NUMBER_COLUMNS:
+                value = numbers[c][k]
+                row[c] = None if np.isnan(value) else float(value)
+            row["bucket"] = BUCKETS[buckets[k]]
+            out.append(row)
+        return out
+
+    def page(self, offset: int = 0, limit: int = 100, symbol: Optional[str] = None,
+             bucket: Optional[str] = None) -> dict:
+        """One page of the filtered rows, with the filtered total and gain"""
+        idx = self.select(symbol, bucket)
+        limit = max(0, min(limit, MAX_PAGE_ROWS))
+        offset = max(0, offset)
+        return {
+            "total": int(len(idx)),
+            "total_gain": round(float(np.nansum(self.arrays["gain"][idx])), 2),
+            "offset": offset,
+            "limit": limit,
+            "rows": self.rows(idx[offset:offset + limit]),
+        }
+
+    def to_csv(self, idx: Optional[np.ndarray] = None) -> str:
+        idx = np.arange(len(self)) if idx is None else idx
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(self.rows(idx))
+        return out.getvalue()
+
+    # ============================================================
+    # SERIALISATION
+    # ============================================================
+
+    def save(self, path: str):
+        """Write as an uncompressed .npz (one array per column)"""
+        payload = dict(self.arrays)
+        for name in _TEXT_COLUMNS:
+            payload[f"{name}_dictionary"] = np.asarray(self.dictionaries[name], dtype=str)
+        with open(path, "wb") as f:
+            np.savez(f, **payload)
+
+    @classmethod
+    def load(cls, path: str) -> "Breakdown":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in COLUMNS}
+            dictionaries = {name: data[f"{name}_dictionary"].tolist() for name in _TEXT_COLUMNS}
+        return cls(arrays, dictionaries)
+
+
+class BreakdownStore:
+    """LRU of breakdown tables by ID, with an optional shared directory tier"""
+
+    def __init__(self, max_entries: int = BREAKDOWN_CACHE_SIZE,
+                 directory: Optional[str] = BREAKDOWN_DIR,
+                 max_files: int = BREAKDOWN_DIR_MAX_FILES):
+        self.max_entries = max(0, max_entries)
+        self.directory = directory
+        self.max_files = max(1, max_files)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+        self._memory: "OrderedDict[str, Breakdown]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _path(self, breakdown_id: str) -> str:
+        return os.path.join(self.directory, f"{breakdown_id}.npz")
+
+    def put(self, breakdown_id: str, table: Breakdown):
+        with self._lock:
+            self._memory_put(breakdown_id, table)
+        if self.directory:
+            # Unique per process, since several API workers may share the directory
+            tmp = f"{self._path(breakdown_id)}.{os.getpid()}.tmp"
+            table.save(tmp)
+            os.replace(tmp, self._path(breakdown_id))
+            self._prune()
+
+    def _prune(self):
+        """Delete the oldest tables on disk beyond ``max_files``"""
+        try:
+            with os.scandir(self.directory) as entries:
+                files = [(e.stat().st_mtime, e.path) for e in entries if e.name.endswith(".npz")]
+        except OSError:
+            return
+        if len(files) <= self.max_files:
+            return
+        files.sort()
+        for _, path in files[:len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass    # already removed by another worker
+
+    def get(self, breakdown_id: str) -> Optional[Breakdown]:
+        with self._lock:
+            table = self._memory.get(breakdown_id)
+            if table is not None:
+                self._memory.move_to_end(breakdown_id)
+                self._hits += 1
+                return table
+
+        table = None
+        if self.directory and breakdown_id.isalnum():
+            try:
+                table = Breakdown.load(self._path(breakdown_id))
+            except OSError:
+                table = None    # never stored, or pruned
+
+        with self._lock:
+            if table is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._memory_put(breakdown_id, table)
+        return table
+
+    def __contains__(self, breakdown_id: str) -> bool:
+        with self._lock:
+            if breakdown_id in self._memory:
+                return True
+        return (bool(self.directory) and breakdown_id.isalnum()
+                and os.path.exists(self._path(breakdown_id)))
+
+    def _memory_put(self, breakdown_id: str, table: Breakdown):
+        if self.max_entries == 0:
+            return
+        self._memory[breakdown_id] = table
+        self._memory.move_to_end(breakdown_id)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_entries,
+                "rows_in_memory": sum(len(t) for t in self._memory.values()),
+                "disk_enabled": bool(self.directory),
+                "hits": self._hits,
+                "misses": self._misses,
+            }
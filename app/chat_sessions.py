@@ -0,0 +1,315 @@
+"""
+Per-User Chatbot Sessions
+
+Each browser/client gets its own conversation history and tax context,
+keyed by a session ID (``X-Session-ID`` header or ``smarttax_session``
+cookie), instead of every user sharing one TaxAdvisorChatbot.
+
+Memory is bounded at every level:
+- Per session: history capped by message count and by an approximate
+  token budget (oldest messages are dropped first)
+- Per store: idle sessions expire after a TTL, and the least recently used
+  sessions are evicted when the session count or total size ceiling is hit
+
+Backends:
+- "memory": in-process dict (default, one uvicorn worker)
+- "sqlite": SQLite file in WAL mode, shared by every worker on the host
+
+Configuration (environment variables):
+    SMARTTAX_CHAT_BACKEND: "memory" or "sqlite" (default: memory)
+    SMARTTAX_CHAT_DB: SQLite file for the sqlite backend
+        (default: smarttax_sessions.db)
+    SMARTTAX_CHAT_MAX_MESSAGES: History messages kept per session (default: 40)
+    SMARTTAX_CHAT_MAX_TOKENS: Approximate history tokens per session (default: 4000)
+    SMARTTAX_CHAT_SESSION_TTL: Idle seconds before a session expires (default: 7200)
+    SMARTTAX_CHAT_MAX_SESSIONS: Sessions kept at once (default: 1000)
+    SMARTTAX_CHAT_MEMORY_MB: Total size ceiling for all sessions (default: 64)
+
+Author: SmartTax Team
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+CHAT_BACKEND = os.getenv("SMARTTAX_CHAT_BACKEND", "memory")
+CHAT_DB = os.getenv("SMARTTAX_CHAT_DB", "smarttax_sessions.db")
+CHAT_MAX_MESSAGES = int(os.getenv("SMARTTAX_CHAT_MAX_MESSAGES", "40"))
+CHAT_MAX_TOKENS = int(os.getenv("SMARTTAX_CHAT_MAX_TOKENS", "4000"))
+CHAT_SESSION_TTL = float(os.getenv("SMARTTAX_CHAT_SESSION_TTL", "7200"))
+CHAT_MAX_SESSIONS = int(os.getenv("SMARTTAX_CHAT_MAX_SESSIONS", "1000"))
+CHAT_MEMORY_MB = float(os.getenv("SMARTTAX_CHAT_MEMORY_MB", "64"))
+
+SESSION_HEADER = "X-Session-ID"
+SESSION_COOKIE = "smarttax_session"
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def trim_history(
+    history: List[Dict[str, str]],
+    max_messages: int = CHAT_MAX_MESSAGES,
+    max_tokens: int = CHAT_MAX_TOKENS,
+) -> List[Dict[str, str]]:
+    """
+    Drop the oldest messages until both the count and token caps hold.
+
+    The newest message is always kept, even if it alone exceeds the budget.
+    """
+    history = history[-max_messages:] if max_messages > 0 else []
+
+    tokens = 0
+    keep = 0
+    for msg in reversed(history):
+        tokens += estimate_tokens(msg.get("content", ""))
+        if tokens > max_tokens and keep > 0:
+            break
+        keep += 1
+
+    return history[len(history) - keep:]
+
+
+# ============================================================
+# BACKENDS
+# ============================================================
+# A session's state is {"history": [...], "user_context": {...}}; backends
+# store it with its size in bytes and last access time.
+
+class MemorySessionBackend:
+    """LRU dict of session states in this process"""
+
+    def __init__(self, max_sessions: int, max_bytes: int):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # session ID -> (state, size in bytes, last saved)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str, ttl: float) -> Optional[dict]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            state, size, last_access = entry
+            if time.time() - last_access > ttl:
+                self._remove(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def save(self, session_id: str, state: dict, size: int):
+        with self._lock:
+            self._remove(session_id)
+            self._sessions[session_id] = (state, size, time.time())
+            self._total_bytes += size
+            while self._sessions and (
+                len(self._sessions) > self.max_sessions
+                or self._total_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._sessions)))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._remove(session_id)
+
+    def expire(self, ttl: float) -> int:
+        cutoff = time.time() - ttl
+        with self._lock:
+            expired = [sid for sid, (_, _, t) in self._sessions.items() if t < cutoff]
+            for sid in expired:
+                self._remove(sid)
+            return len(expired)
+
+    def _remove(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._total_bytes}
+
+
+class SQLiteSessionBackend:
+    """Session states in a SQLite file (WAL) shared between worker processes"""
+
+    def __init__(self, db_path: str, max_sessions: int, max_bytes: int):
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # Open (and create the table) now, so a bad path fails at start-up
+        with self._lock:
+            self._db
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        """
+        This process's connection. A connection inherited across fork()
+        (gunicorn --preload) is never used; the worker opens its own.
+        """
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_sessions ("
+                " id TEXT PRIMARY KEY, state TEXT NOT NULL,"
+                " size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS chat_sessions_last_access"
+                " ON chat_sessions (last_access)"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def load(self, session_id: str, ttl: float) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, last_access FROM chat_sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            if time.time() - row[1] > ttl:
+                self._db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+                return None
+            return json.loads(row[0])
+
+    def save(self, session_id: str, state: dict, size: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_sessions (id, state, size, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(state), size, time.time()),
+            )
+            # Evict least recently used sessions beyond the caps
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chat_sessions"
+            ).fetchone()
+            while count > self.max_sessions or total > self.max_bytes:
+                oldest = self._db.execute(
+                    "SELECT id, size FROM chat_sessions ORDER BY last_access LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                self._db.execute("DELETE FROM chat_sessions WHERE id = ?", (oldest[0],))
+                count -= 1
+                total -= oldest[1]
+            self._db.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def expire(self, ttl: float) -> int:
+        with self._lock:
+            cur = self._db.execute(
+                "DELETE FROM chat_sessions WHERE last_access < ?", (time.time() - ttl,)
+            )
+            self._db.commit()
+            return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM chat_sessions"
+            ).fetchone()
+            return {"sessions": count, "bytes": total}
+
+
+# ============================================================
+# STORE
+# ============================================================
+
+class ChatSessionStore:
+    """
+    Loads and saves per-session chatbot state with bounded memory.
+
+    Typical use in a request handler::
+
+        bot = store.load(session_id)
+        reply = bot.generate_response(message)
+        store.save(session_id, bot)
+    """
+
+    # Run a full TTL sweep at most this often (seconds)
+    SWEEP_INTERVAL = 60.0
+
+    def __init__(
+        self,
+        backend: str = CHAT_BACKEND,
+        db_path: str = CHAT_DB,
+        max_messages: int = CHAT_MAX_MESSAGES,
+        max_tokens: int = CHAT_MAX_TOKENS,
+        ttl: float = CHAT_SESSION_TTL,
+        max_sessions: int = CHAT_MAX_SESSIONS,
+        memory_mb: float = CHAT_MEMORY_MB,
+    ):
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+
+        max_bytes = int(memory_mb * 1024 * 1024)
+        if backend == "sqlite":
+            self.backend = SQLiteSessionBackend(db_path, max_sessions, max_bytes)
+        elif backend == "memory":
+            self.backend = MemorySessionBackend(max_sessions, max_bytes)
+        else:
+            raise ValueError(f"Unknown chat session backend: {backend}")
+        self.backend_name = backend
+
+        self._last_sweep = time.time()
+
+    def load(self, session_id: str):
+        """TaxAdvisorChatbot holding this session's history and context"""
+        from app.chatbot import TaxAdvisorChatbot
+
+        bot = TaxAdvisorChatbot()
+        state = self.backend.load(session_id, self.ttl)
+        if state:
+            bot.load_state(state)
+        return bot
+
+    def save(self, session_id: str, bot):
+        """Trim the bot's history to the caps and persist its state"""
+        bot.conversation_history = trim_history(
+            bot.conversation_history, self.max_messages, self.max_tokens
+        )
+        state = bot.dump_state()
+        size = len(json.dumps(state, ensure_ascii=False).encode("utf-8"))
+        self.backend.save(session_id, state, size)
+
+        now = time.time()
+        if now - self._last_sweep > self.SWEEP_INTERVAL:
+            self._last_sweep = now
+            self.backend.expire(self.ttl)
+
+    def delete(self, session_id: str):
+        self.backend.delete(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend_name,
+            "max_messages": self.max_messages,
+            "max_tokens": self.max_tokens,
+            "ttl": self.ttl,
+            **self.backend.stats(),
+        }
@@ -1,12 +1,123 @@
 """
 Tax Advisor Chatbot using local LLM (Phi-3-mini via Ollama)
 Provides tax insights, suggestions, and answers based on user's tax data
+
+Prompt layout is kept stable between turns so Ollama can reuse the
+evaluated prefix (KV cache) of the previous request instead of processing
+the whole prompt again:
+- System prompt = static rules text first (memoized per rule version),
+  then the user's context; the rendered prompt is memoized per
+  (rule version, context hash)
+- History is sent in a window that slides in steps of HISTORY_STEP
+  messages rather than one exchange at a time, so older messages keep
+  their position for several turns
+
+Author: SmartTax Team
 """
 
+import hashlib
 import json
-from typing import Dict, Any, List, Optional
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, List, Optional
 from datetime import datetime
 
+from app import metrics
+from app.ollama_client import (
+    GENERATION_OPTIONS, OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_TIMEOUT,
+    OLLAMA_URL, OllamaBusyError, OllamaClient, OllamaError, OllamaUnavailableError
+)
+from app.intent_router import ROUTER, Intent
+from app.response_cache import ResponseCache
+
+from app.tax_rules import (
+    TaxRules, UnknownRulesError, cut_off_label, describe_rules,
+    format_inr, format_rate, get_rules
+)
+
+logger = logging.getLogger(__name__)
+
+# History messages sent to the LLM, and how far the window jumps when full
+HISTORY_WINDOW = 10
+HISTORY_STEP = 4
+
+# Rendered system prompts kept per (rule version, context hash)
+SYSTEM_PROMPT_CACHE_SIZE = 256
+
+_HTTP_SESSION = None
+
+
+def _http_session():
+    """Shared requests.Session for the blocking Ollama path (keep-alive)"""
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        import requests
+        _HTTP_SESSION = requests.Session()
+    return _HTTP_SESSION
+
+
+def _fallback_path(error: OllamaError) -> str:
+    """Fallback metric label for a rule-based answer given because of ``error``"""
+    if isinstance(error, OllamaUnavailableError):
+        return "rule_based_circuit_open"
+    if isinstance(error, OllamaBusyError):
+        return "rule_based_busy"
+    return "rule_based_error"
+
+
+# ============================================================
+# SYSTEM PROMPT
+# ============================================================
+
+@lru_cache(maxsize=32)
+def _static_prompt(rules: TaxRules) -> str:
+    """Part of the system prompt that only depends on the rules"""
+    return f"""You are a professional Indian tax advisor AI assistant specializing in Income Tax Returns (ITR-1 and ITR-2) for FY {rules.financial_year} under the {rules.regime.title()} Tax Regime.
+
+Your role:
+- Provide accurate tax advice based on Indian tax laws
+- Explain tax calculations and suggest optimizations
+- Answer questions about Form-16, capital gains, mutual funds
+- Help users understand their tax liability and potential savings
+
+{describe_rules(rules)}
+
+Guidelines:
+- Be concise and practical
+- Use Indian currency format (₹)
+- Cite specific sections when relevant
+- Suggest legal tax-saving strategies
+- Never advise tax evasion
+"""
+
+
+def context_hash(context: Dict[str, Any]) -> str:
+    """Stable hash of a user context (key order does not matter)"""
+    blob = json.dumps(context, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+# (rule version, context hash) -> rendered system prompt
+_PROMPT_CACHE: "OrderedDict[tuple, str]" = OrderedDict()
+_PROMPT_CACHE_LOCK = threading.Lock()
+
+
+def history_window(history: List[Dict[str, str]], messages_total: int) -> List[Dict[str, str]]:
+    """
+    The history messages to send with the next request.
+
+    At most HISTORY_WINDOW messages; the window start only moves in steps
+    of HISTORY_STEP (counted over the whole conversation, including
+    messages already trimmed from the session), so consecutive requests
+    share the same prefix.
+    """
+    first_kept = messages_total - len(history)
+    overflow = messages_total - HISTORY_WINDOW
+    start = -(-overflow // HISTORY_STEP) * HISTORY_STEP if overflow > 0 else 0
+    return history[max(0, start - first_kept):]
+
 
 class TaxAdvisorChatbot:
     """
@@ -14,60 +125,72 @@ class TaxAdvisorChatbot:
     Uses local LLM for privacy and offline capability
     """
     
-    def __init__(self):
+    # Intents whose rule-based answer is built from the user's calculation
+    CONTEXT_INTENTS = ('tax_saving', 'explain_calculation')
+    
+    # Context keys that only select the rules (already part of rule_version)
+    RULE_CONTEXT_KEYS = ('financial_year', 'regime')
+    
+    def __init__(self, rules: Optional[TaxRules] = None):
         self.conversation_history: List[Dict[str, str]] = []
         self.user_context: Dict[str, Any] = {}
+        self.rules: TaxRules = rules or get_rules()
+        self.messages_total = 0
+        self.last_timings: Dict[str, Any] = {}
+        self._context_hash = context_hash(self.user_context)
         
     def set_user_context(self, context: Dict[str, Any]):
         """
         Set the user's tax context (salary, calculations, documents, etc.)
+
+        If the context names a ``financial_year`` / ``regime``, answers use
+        that year's rules.
         """
         self.user_context = context
-        
+        self._context_hash = context_hash(context)
+        if context.get('financial_year') or context.get('regime'):
+            try:
+                self.rules = get_rules(context.get('financial_year'), context.get('regime'))
+            except UnknownRulesError:
+                pass
+        
+    def dump_state(self) -> Dict[str, Any]:
+        """JSON-serialisable session state (history and context)"""
+        return {
+            "history": list(self.conversation_history),
+            "user_context": self.user_context,
+            "messages_total": self.messages_total,
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        """Restore state saved by dump_state"""
+        self.conversation_history = list(state.get("history", []))
+        self.set_user_context(state.get("user_context") or {})
+        self.messages_total = state.get("messages_total", len(self.conversation_history))
+
     def build_system_prompt(self) -> str:
         """
         Build a comprehensive system prompt with user's tax context
-        """
-        context_summary = self._summarize_context()
-        
-        system_prompt = f"""You are a professional Indian tax advisor AI assistant specializing in Income Tax Returns (ITR-1 and ITR-2) for FY 2024-25 under the New Tax Regime.
-
-Your role:
-- Provide accurate tax advice based on Indian tax laws
-- Explain tax calculations and suggest optimizations
-- Answer questions about Form-16, capital gains, mutual funds
-- Help users understand their tax liability and potential savings
 
+        Static rules come first and the user's context last; the result is
+        memoized per (rule version, context hash).
+        """
+        key = (self.rules.rule_version, self._context_hash)
+        with _PROMPT_CACHE_LOCK:
+            prompt = _PROMPT_CACHE.get(key)
+            if prompt is not None:
+                _PROMPT_CACHE.move_to_end(key)
+                return prompt
+        
+        prompt = f"""{_static_prompt(self.rules)}
 Current User Context:
-{context_summary}
-
-Tax Rules (FY 2024-25 New Regime):
-- Standard Deduction: ₹75,000
-- Section 87A Rebate: Full tax rebate if taxable income ≤ ₹12,00,000
-- LTCG Exemption: ₹1,25,000 on equity/equity MF
-- Health & Education Cess: 4% on total income tax
-- Equity STCG (before 23 July): 15%, (after): 20%
-- Equity LTCG (before 23 July): 10%, (after): 12.5%
-- Equity MF STCG: 20%, LTCG: 12.5%
-- Debt MF gains: Added to income, taxed as per slab
-
-Tax Slabs (New Regime):
-- Up to ₹4,00,000: 0%
-- ₹4,00,001 - ₹8,00,000: 5%
-- ₹8,00,001 - ₹12,00,000: 10%
-- ₹12,00,001 - ₹16,00,000: 15%
-- ₹16,00,001 - ₹20,00,000: 20%
-- ₹20,00,001 - ₹24,00,000: 25%
-- Above ₹24,00,000: 30%
-
-Guidelines:
-- Be concise and practical
-- Use Indian currency format (₹)
-- Cite specific sections when relevant
-- Suggest legal tax-saving strategies
-- Never advise tax evasion
+{self._summarize_context()}
 """
-        return system_prompt
+        with _PROMPT_CACHE_LOCK:
+            _PROMPT_CACHE[key] = prompt
+            while len(_PROMPT_CACHE) > SYSTEM_PROMPT_CACHE_SIZE:
+                _PROMPT_CACHE.popitem(last=False)
+        return prompt
     
     def _summarize_context(self) -> str:
         """
@@ -110,12 +233,51 @@ Guidelines:
             if 'mf_tax' in calc:
                 summary_parts.append(f"- MF Tax: ₹{calc.get('mf_tax', 0):,.2f}")
             summary_parts.append(f"- Total Income Tax (before cess): ₹{calc.get('total_before_cess', 0):,.2f}")
-            summary_parts.append(f"- Cess (4%): ₹{calc.get('cess', 0):,.2f}")
+            summary_parts.append(f"- Cess ({format_rate(self.rules.cess_rate)}): ₹{calc.get('cess', 0):,.2f}")
             summary_parts.append(f"- Total Tax Liability: ₹{calc.get('total_tax', 0):,.2f}")
             summary_parts.append(f"- Net Payable: ₹{calc.get('net_payable', 0):,.2f}")
         
         return "\n".join(summary_parts) if summary_parts else "No tax data available."
     
+    def build_messages(self, user_message: str) -> List[Dict[str, str]]:
+        """
+        Ollama chat messages: system prompt, recent history, then the new
+        user message. Call before the message is added to the history.
+        """
+        messages = [
+            {"role": "system", "content": self.build_system_prompt()}
+        ]
+        
+        # Add recent conversation history (up to 5 exchanges)
+        for msg in history_window(self.conversation_history, self.messages_total):
+            messages.append({
+                "role": msg["role"],
+                "content": msg["content"]
+            })
+        
+        # Add current user message
+        messages.append({"role": "user", "content": user_message})
+        return messages
+    
+    def _record_exchange(self, user_message: str, response: str):
+        """Append the user message and assistant reply to the history"""
+        now = datetime.utcnow().isoformat()
+        self.conversation_history.append({
+            "role": "user",
+            "content": user_message,
+            "timestamp": now
+        })
+        self.conversation_history.append({
+            "role": "assistant",
+            "content": response,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        self.messages_total += 2
+    
+    def _start_timings(self) -> Dict[str, Any]:
+        self.last_timings = {"followup": bool(self.conversation_history)}
+        return self.last_timings
+    
     def generate_response(self, user_message: str, use_ollama: bool = True) -> str:
         """
         Generate a response to user's question
@@ -127,64 +289,146 @@ Guidelines:
         Returns:
             AI-generated response
         """
-        # Add user message to history
-        self.conversation_history.append({
-            "role": "user",
-            "content": user_message,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        
-        if use_ollama:
+        direct = self._direct_answer(user_message) if use_ollama else None
+        if direct is not None:
+            response = direct
+        elif use_ollama:
             response = self._generate_with_ollama(user_message)
         else:
             response = self._generate_rule_based(user_message)
         
-        # Add assistant response to history
-        self.conversation_history.append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        self._record_exchange(user_message, response)
+        return response
+    
+    def _cache_scope(self, user_message: str, cache: Optional[ResponseCache]) -> Optional[str]:
+        if cache is None:
+            return None
+        return cache.scope_for(user_message, self.rules.rule_version, self._context_hash,
+                               self.has_tax_data)
+    
+    @property
+    def has_tax_data(self) -> bool:
+        """Whether the prompt carries the user's own numbers (see _summarize_context)"""
+        return any(value for key, value in self.user_context.items()
+                   if key not in self.RULE_CONTEXT_KEYS)
+    
+    async def agenerate_response(
+        self,
+        user_message: str,
+        client: "OllamaClient",
+        cache: Optional[ResponseCache] = None
+    ) -> str:
+        """
+        Async generate_response using the shared pooled Ollama client.
+
+        Confident intents are answered by the intent router without the
+        LLM. With a ``cache``, repeat questions are answered from it and new LLM
+        answers are stored in it. Falls back to rule-based answers if Ollama
+        fails or is busy (those are not cached).
+        """
+        direct = self._direct_answer(user_message)
+        if direct is not None:
+            self._record_exchange(user_message, direct)
+            return direct
+        
+        scope = self._cache_scope(user_message, cache)
+        cached = cache.get(user_message, scope) if scope else None
         
+        if cached is not None:
+            self._start_timings()["cached"] = True
+            response = cached
+        else:
+            try:
+                response = await client.chat(
+                    self.build_messages(user_message), timings=self._start_timings()
+                )
+                if not response:
+                    response = "I apologize, but I couldn't generate a response."
+                elif scope:
+                    cache.put(user_message, scope, response)
+            except OllamaError as e:
+                if not isinstance(e, OllamaUnavailableError):
+                    logger.warning("Ollama error: %s", e)
+                metrics.fallback("chatbot", _fallback_path(e))
+                response = self._generate_rule_based(user_message)
+        
+        self._record_exchange(user_message, response)
         return response
     
+    async def astream_response(
+        self,
+        user_message: str,
+        client: "OllamaClient",
+        cache: Optional[ResponseCache] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the reply in chunks as Ollama produces them.
+
+        The exchange is added to the history only once the reply is complete;
+        if the consumer stops early (client disconnected) nothing is recorded.
+        If Ollama fails before producing any text, the rule-based answer is
+        yielded as a single chunk. Direct (intent router) and cached answers
+        are yielded as one chunk too.
+
+        Raises:
+            OllamaError: Ollama failed after part of the reply was yielded;
+                the partial reply is neither recorded nor cached
+        """
+        direct = self._direct_answer(user_message)
+        if direct is not None:
+            yield direct
+            self._record_exchange(user_message, direct)
+            return
+        
+        scope = self._cache_scope(user_message, cache)
+        cached = cache.get(user_message, scope) if scope else None
+        if cached is not None:
+            self._start_timings()["cached"] = True
+            yield cached
+            self._record_exchange(user_message, cached)
+            return
+        
+        parts: List[str] = []
+        try:
+            async for token in client.stream_chat(
+                self.build_messages(user_message), timings=self._start_timings()
+            ):
+                parts.append(token)
+                yield token
+            if scope:
+                cache.put(user_message, scope, "".join(parts))
+        except OllamaError as e:
+            if not isinstance(e, OllamaUnavailableError):
+                logger.warning("Ollama error: %s", e)
+            if parts:
+                # Half an answer must not be kept as if it were the reply
+                metrics.fallback("chatbot", "stream_interrupted")
+                raise
+            metrics.fallback("chatbot", _fallback_path(e))
+            fallback = self._generate_rule_based(user_message)
+            parts.append(fallback)
+            yield fallback
+        
+        self._record_exchange(user_message, "".join(parts))
+    
     def _generate_with_ollama(self, user_message: str) -> str:
         """
-        Generate response using Ollama local LLM
+        Generate response using Ollama local LLM (blocking; the API uses
+        agenerate_response)
         """
         try:
-            import requests
-            
-            # Build messages for Ollama
-            messages = [
-                {"role": "system", "content": self.build_system_prompt()}
-            ]
-            
-            # Add recent conversation history (last 5 exchanges)
-            recent_history = self.conversation_history[-10:] if len(self.conversation_history) > 10 else self.conversation_history
-            for msg in recent_history:
-                messages.append({
-                    "role": msg["role"],
-                    "content": msg["content"]
-                })
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
             # Call Ollama API
-            response = requests.post(
-                "http://localhost:11434/api/chat",
+            response = _http_session().post(
+                f"{OLLAMA_URL}/api/chat",
                 json={
-                    "model": "phi3:mini",  # Phi-3-mini (3.8B) - excellent at reasoning
-                    "messages": messages,
+                    "model": OLLAMA_MODEL,
+                    "messages": self.build_messages(user_message),
                     "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "top_p": 0.9,
-                        "num_predict": 500
-                    }
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                    "options": GENERATION_OPTIONS
                 },
-                timeout=30
+                # Fail fast if nothing is listening
+                timeout=(2, OLLAMA_TIMEOUT)
             )
             
             if response.status_code == 200:
@@ -194,54 +438,96 @@ Guidelines:
                 return self._generate_rule_based(user_message)
                 
         except Exception as e:
-            print(f"Ollama error: {e}")
+            logger.warning("Ollama error: %s", e)
             return self._generate_rule_based(user_message)
     
+    def _direct_answer(self, user_message: str) -> Optional[str]:
+        """
+        Rule-based answer if the intent router is confident, else None.
+
+        Answers built from the user's calculation are only given directly
+        when there is a calculation to talk about.
+        """
+        intent = ROUTER.route(user_message)
+        direct = intent.confident and (
+            intent.name not in self.CONTEXT_INTENTS or 'calculation' in self.user_context
+        )
+        ROUTER.record(intent.name if direct else None)
+        if not direct:
+            return None
+        
+        self._start_timings()["intent"] = intent.name
+        return self._answer_intent(intent)
+    
     def _generate_rule_based(self, user_message: str) -> str:
         """
         Fallback rule-based responses when Ollama is not available
         """
-        message_lower = user_message.lower()
-        
-        # Tax saving suggestions
-        if any(word in message_lower for word in ['save', 'reduce', 'lower', 'optimize']):
+        return self._answer_intent(ROUTER.route(user_message))
+    
+    def _answer_intent(self, intent: Intent) -> str:
+        if intent.name == 'tax_saving':
             return self._get_tax_saving_suggestions()
-        
-        # Calculation explanation
-        if any(word in message_lower for word in ['calculate', 'computation', 'how', 'why']):
+        if intent.name == 'explain_calculation':
             return self._explain_calculation()
-        
-        # LTCG/STCG questions
-        if 'ltcg' in message_lower or 'long term' in message_lower:
-            return """**Long Term Capital Gains (LTCG):**
+        if intent.name == 'ltcg':
+            return self._ltcg_rules_text()
+        if intent.name == 'stcg':
+            return self._stcg_rules_text()
+        if intent.name == 'cess':
+            return self._cess_rules_text()
+        return self._help_text()
+    
+    def _help_text(self) -> str:
+        return f"""I'm your tax advisor assistant. I can help you with:
+
+• Understanding your tax calculations
+• Explaining STCG/LTCG rules
+• Tax-saving suggestions
+• Form-16 and capital gains queries
+• {self.rules.regime.title()} Tax Regime rules (FY {self.rules.financial_year})
+
+What would you like to know about your taxes?"""
+    
+    def _rate_lines(self, before: float, after: float) -> str:
+        """Tax rate line(s), split at the cut-off date when the year has one"""
+        rules = self.rules
+        if rules.cut_off_date is None:
+            return f"- Tax rate: {format_rate(after)}"
+        label = f"{cut_off_label(rules)} {rules.cut_off_date.year}"
+        return (f"- Tax rate (before {label}): {format_rate(before)}\n"
+                f"- Tax rate (after {label}): {format_rate(after)}")
+
+    def _ltcg_rules_text(self) -> str:
+        rules = self.rules
+        return f"""**Long Term Capital Gains (LTCG):**
 
 For Equity Shares & Equity MF:
 - Holding period: > 12 months
-- LTCG exemption: ₹1,25,000 per year
-- Tax rate (before 23 July 2024): 10%
-- Tax rate (after 23 July 2024): 12.5%
+- LTCG exemption: {format_inr(rules.ltcg_exemption)} per year
+{self._rate_lines(rules.equity_ltcg_rate_before, rules.equity_ltcg_rate_after)}
 
 LTCG is calculated on gains above the exemption limit."""
-        
-        if 'stcg' in message_lower or 'short term' in message_lower:
-            return """**Short Term Capital Gains (STCG):**
+
+    def _stcg_rules_text(self) -> str:
+        rules = self.rules
+        return f"""**Short Term Capital Gains (STCG):**
 
 For Equity Shares:
 - Holding period: ≤ 12 months
-- Tax rate (before 23 July 2024): 15%
-- Tax rate (after 23 July 2024): 20%
+{self._rate_lines(rules.equity_stcg_rate_before, rules.equity_stcg_rate_after)}
 
 For Equity Mutual Funds:
 - Holding period: ≤ 12 months
-- Tax rate: 20% (flat)
+- Tax rate: {format_rate(rules.equity_mf_stcg_rate)} (flat)
 
 No exemption available for STCG."""
-        
-        # Cess questions
-        if 'cess' in message_lower:
-            return """**Health & Education Cess:**
 
-- Rate: 4% of total income tax
+    def _cess_rules_text(self) -> str:
+        rate = self.rules.cess_rate
+        return f"""**Health & Education Cess:**
+
+- Rate: {format_rate(rate)} of total income tax
 - Applied on: Total income tax (salary tax + capital gains tax)
 - Not applied on: Individual components separately
 
@@ -249,19 +535,8 @@ Example:
 - Salary Tax: ₹1,00,000
 - Capital Gains Tax: ₹50,000
 - Total Income Tax: ₹1,50,000
-- Cess (4%): ₹6,000
-- Final Tax Liability: ₹1,56,000"""
-        
-        # Default response
-        return """I'm your tax advisor assistant. I can help you with:
-
-• Understanding your tax calculations
-• Explaining STCG/LTCG rules
-• Tax-saving suggestions
-• Form-16 and capital gains queries
-• New Tax Regime rules (FY 2024-25)
-
-What would you like to know about your taxes?"""
+- Cess ({format_rate(rate)}): {format_inr(150000 * rate)}
+- Final Tax Liability: {format_inr(150000 * (1 + rate))}"""
     
     def _get_tax_saving_suggestions(self) -> str:
         """
@@ -275,19 +550,21 @@ What would you like to know about your taxes?"""
         
         # Check if near Section 87A threshold
         taxable_income = calc.get('taxable_income', 0)
-        if 1100000 <= taxable_income <= 1250000:
-            suggestions.append("• You're close to the ₹12L threshold for Section 87A rebate. Consider:")
+        rebate_limit = self.rules.rebate_87a_limit
+        if rebate_limit - 100000 <= taxable_income <= rebate_limit + 50000:
+            suggestions.append(f"• You're close to the {format_inr(rebate_limit)} threshold for Section 87A rebate. Consider:")
             suggestions.append("  - Maximizing standard deduction claims")
             suggestions.append("  - Reviewing any additional income sources")
         
         # LTCG optimization
         ltcg_total = self.user_context.get('equity', {}).get('ltcg_total', 0) + \
                      self.user_context.get('mutual_funds', {}).get('equity_ltcg', 0)
-        if ltcg_total > 125000:
-            taxable_ltcg = ltcg_total - 125000
+        exemption = self.rules.ltcg_exemption
+        if ltcg_total > exemption:
+            taxable_ltcg = ltcg_total - exemption
             suggestions.append(f"\n• Your LTCG is ₹{ltcg_total:,.2f} (taxable: ₹{taxable_ltcg:,.2f})")
             suggestions.append("  - Consider spreading sales across financial years")
-            suggestions.append("  - Utilize the ₹1.25L exemption annually")
+            suggestions.append(f"  - Utilize the {format_inr(exemption)} exemption annually")
         
         # TDS optimization
         tds_paid = self.user_context.get('salary', {}).get('tds_paid', 0)
@@ -313,7 +590,7 @@ What would you like to know about your taxes?"""
 
 1. **Income Computation:**
    - Gross Salary: ₹{self.user_context.get('salary', {}).get('gross_salary', 0):,.2f}
-   - Less: Standard Deduction: ₹75,000
+   - Less: Standard Deduction: {format_inr(self.rules.standard_deduction)}
    - Taxable Salary: ₹{calc.get('taxable_income', 0):,.2f}
 
 2. **Tax Calculation:**
@@ -329,7 +606,7 @@ What would you like to know about your taxes?"""
         explanation += f"""
 3. **Final Liability:**
    - Total Income Tax: ₹{calc.get('total_before_cess', 0):,.2f}
-   - Add: Cess (4%): ₹{calc.get('cess', 0):,.2f}
+   - Add: Cess ({format_rate(self.rules.cess_rate)}): ₹{calc.get('cess', 0):,.2f}
    - **Total Tax Liability: ₹{calc.get('total_tax', 0):,.2f}**
    
 4. **Net Payable:**
@@ -342,6 +619,7 @@ What would you like to know about your taxes?"""
     def clear_history(self):
         """Clear conversation history"""
         self.conversation_history = []
+        self.messages_total = 0
     
     def get_conversation_history(self) -> List[Dict[str, str]]:
         """Get full conversation history"""
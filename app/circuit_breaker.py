@@ -0,0 +1,156 @@
+"""
+Circuit Breaker
+
+Guards calls to a backend that can go down (the local Ollama server).
+While the backend keeps failing, callers are told immediately to use
+their fallback instead of each waiting for a timeout.
+
+States:
+- closed: calls go through; outcomes are tracked over a sliding window
+  of the last ``window`` calls. When at least ``min_calls`` are recorded
+  and the failure rate reaches ``failure_rate``, the breaker opens.
+- open: calls are refused for ``open_seconds``, then the breaker goes
+  half-open.
+- half_open: up to ``probe_calls`` calls at a time are let through as
+  probes. A successful probe closes the breaker; a failed one re-opens it.
+
+An external health check can force the state with ``force_open`` (backend
+unreachable) and ``probe`` (backend back: allow probes right away).
+
+Author: SmartTax Team
+"""
+
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the breaker is open"""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker with half-open probing"""
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        min_calls: int = 4,
+        window: int = 20,
+        open_seconds: float = 30.0,
+        probe_calls: int = 1,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.open_seconds = open_seconds
+        self.probe_calls = max(1, probe_calls)
+
+        self._outcomes = deque(maxlen=max(self.min_calls, window))  # True = failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+        self._rejected = 0
+        self._times_opened = 0
+        self._last_error = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance()
+            return self._state
+
+    def _advance(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+
+    def _open(self):
+        if self._state != OPEN:
+            self._times_opened += 1
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+
+    # ============================================================
+    # CALL BOOKKEEPING
+    # ============================================================
+
+    def before_call(self):
+        """
+        Reserve a call; pair with record_success / record_failure / release.
+
+        Raises:
+            CircuitOpenError: The breaker is open, or half-open with all
+                probe slots taken
+        """
+        with self._lock:
+            self._advance()
+            if self._state == OPEN or (
+                self._state == HALF_OPEN and self._probes >= self.probe_calls
+            ):
+                self._rejected += 1
+                raise CircuitOpenError(f"circuit {self._state}")
+            if self._state == HALF_OPEN:
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append(False)
+
+    def record_failure(self, error: str = ""):
+        with self._lock:
+            self._last_error = error or None
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(True)
+            if (
+                len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+            ):
+                self._open()
+
+    def release(self):
+        """End a reserved call that neither succeeded nor failed (e.g. cancelled)"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    # ============================================================
+    # HEALTH CHECK HOOKS
+    # ============================================================
+
+    def force_open(self, error: str = ""):
+        """Open now (health check found the backend unreachable)"""
+        with self._lock:
+            self._last_error = error or self._last_error
+            self._open()
+
+    def probe(self):
+        """Backend looks healthy again: let probes through without waiting"""
+        with self._lock:
+            if self._state == OPEN:
+                self._state = HALF_OPEN
+                self._probes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._advance()
+            calls = len(self._outcomes)
+            return {
+                "state": self._state,
+                "failure_rate": round(sum(self._outcomes) / calls, 4) if calls else 0.0,
+                "window_calls": calls,
+                "rejected": self._rejected,
+                "times_opened": self._times_opened,
+                "last_error": self._last_error,
+            }
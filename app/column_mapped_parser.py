@@ -0,0 +1,192 @@
+"""
+Column-Mapped Capital Gains Parser
+
+Fallback for equity P&L reports from brokers without a dedicated parser
+(Upstox, Angel One, ICICI Direct, ...). They all come down to one table
+with a realised P&L column and a sell date, plus either a short/long term
+column or a buy date to work the term out from. The table is found by its
+header row (matched against COLUMN_ALIASES) on any sheet, and read until
+the first blank or "Total" row.
+
+Rows with no usable sell date, or whose term cannot be told, are skipped
+and counted in ``skipped_rows``.
+
+Author: SmartTax Team
+"""
+
+from datetime import date
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import metrics
+from app.breakdown import Breakdown, bucket_codes
+from app.excel_reader import iter_sheets
+from app.tax_rules import get_rules
+from app.tradebook_parser import long_term_after, parse_numbers, parse_times
+
+# Canonical column -> header names, most specific first
+COLUMN_ALIASES = {
+    "pnl": ("realised p&l", "realized p&l", "realised pnl", "realized pnl",
+            "realised gain", "realized gain", "profit/loss", "profit / loss",
+            "gain/loss", "capital gain", "capital gains", "p&l", "pnl",
+            "profit", "gain"),
+    "sell_date": ("sell date", "sale date", "exit date", "date of sale",
+                  "redemption date", "sell_date", "sold on"),
+    "buy_date": ("buy date", "purchase date", "entry date", "date of purchase",
+                 "acquisition date", "buy_date", "bought on"),
+    "term": ("term", "gain type", "capital gain type", "holding type", "stcg/ltcg"),
+    # Optional, only used for the trade-level breakdown
+    "name": ("stock name", "scrip name", "security name", "symbol", "scrip",
+             "security", "stock", "name"),
+    "isin": ("isin",),
+    "quantity": ("quantity", "qty", "qty.", "units"),
+    "cost": ("buy value", "purchase value", "cost of acquisition", "buy amount", "cost"),
+    "proceeds": ("sell value", "sale value", "sale consideration", "sell amount"),
+}
+
+# Header rows are looked for in the first rows of each sheet only
+HEADER_SCAN_ROWS = 50
+
+
+def match_columns(row: Sequence[Any], aliases: Dict[str, Tuple[str, ...]]) -> Dict[str, int]:
+    """Column index per canonical name whose header appears in ``row``"""
+    headers = [str(h).strip().lower() if h is not None else "" for h in row]
+    columns = {}
+    for name, names in aliases.items():
+        for alias in names:
+            if alias in headers:
+                columns[name] = headers.index(alias)
+                break
+    return columns
+
+
+def resolve_header(row: Sequence[Any]) -> Optional[Dict[str, int]]:
+    """Column indices if ``row`` is a usable P&L header, else None"""
+    columns = match_columns(row, COLUMN_ALIASES)
+    if {"pnl", "sell_date"} <= columns.keys() and ("term" in columns or "buy_date" in columns):
+        return columns
+    return None
+
+
+def _is_blank(row: Sequence[Any]) -> bool:
+    return all(v is None or str(v).strip() in ("", "nan") for v in row)
+
+
+def _term_flags(values: list) -> Tuple[np.ndarray, np.ndarray]:
+    """(is_long, known) from a short/long term column"""
+    text = [str(v).strip().lower() if v is not None else "" for v in values]
+    is_long = np.array([t.startswith(("long", "ltcg", "lt")) for t in text], dtype=bool)
+    is_short = np.array([t.startswith(("short", "stcg", "st")) for t in text], dtype=bool)
+    return is_long, is_long | is_short
+
+
+class ColumnMappedCapitalGainsParser:
+    """
+    Equity P&L report parser driven by header names, not broker layout.
+
+    ``rules`` selects the cut-off date for the before/after split, like
+    the Groww parser.
+    """
+
+    def __init__(self, rules=None):
+        self.cut_off = (rules or get_rules()).cut_off_date or date.max
+
+    def parse(self, file) -> dict:
+        with metrics.stage("section_scan"):
+            data = self.read_file(file)
+        with metrics.stage("compute"):
+            return self.compute(data)
+
+    def parse_with_breakdown(self, file):
+        """Same as parse, plus one Breakdown row per counted trade"""
+        parts = []
+        with metrics.stage("section_scan"):
+            data = self.read_file(file)
+        with metrics.stage("compute"):
+            result = self.compute(data, breakdown=parts)
+        return result, parts[0]
+
+    def read_file(self, file) -> Dict[str, list]:
+        """Columns of the first P&L table on any sheet ({} if none)"""
+        for _, rows in iter_sheets(file):
+            data = self.read_table(rows)
+            if data is not None:
+                return data
+        return {}
+
+    def read_table(self, rows: Iterable[Sequence[Any]]) -> Optional[Dict[str, list]]:
+        """Columns of the first P&L table in ``rows``, or None if there is none"""
+        columns = None
+        data: Dict[str, list] = {}
+
+        for i, row in enumerate(rows):
+            if columns is None:
+                columns = resolve_header(row)
+                if columns is None and i >= HEADER_SCAN_ROWS:
+                    return None
+                if columns is not None:
+                    data = {name: [] for name in columns}
+                continue
+
+            first = next((str(v).strip().lower() for v in row if v is not None), "")
+            if _is_blank(row) or first.startswith("total"):
+                break
+            for name, idx in columns.items():
+                data[name].append(row[idx] if idx < len(row) else None)
+
+        return data if columns is not None else None
+
+    def compute(self, data: Dict[str, list], breakdown: Optional[list] = None) -> dict:
+        """Bucket totals; with a ``breakdown`` list, also append the counted rows"""
+        pnl = parse_numbers(data.get("pnl", []))
+        sell = parse_times(data.get("sell_date", [])).astype("datetime64[D]")
+
+        is_long = np.zeros(len(pnl), dtype=bool)
+        known = np.zeros(len(pnl), dtype=bool)
+        if "term" in data:
+            is_long, known = _term_flags(data["term"])
+        buy = None
+        if "buy_date" in data:
+            buy = parse_times(data["buy_date"]).astype("datetime64[D]")
+            by_date = ~known & ~np.isnat(buy) & ~np.isnat(sell)
+            is_long = np.where(by_date, sell > long_term_after(buy), is_long)
+            known |= by_date
+
+        valid = known & ~np.isnat(sell)
+        before = sell < np.datetime64(self.cut_off)
+
+        result = {}
+        for name, mask in (
+            ("stcg_before", ~is_long & before),
+            ("stcg_after", ~is_long & ~before),
+            ("ltcg_before", is_long & before),
+            ("ltcg_after", is_long & ~before),
+        ):
+            result[name] = round(float(pnl[valid & mask].sum()), 2)
+
+        result.update({
+            "rows": int(valid.sum()),
+            "skipped_rows": int((~valid).sum()),
+        })
+
+        if breakdown is not None:
+            def rows(name, parse=None):
+                if name not in data:
+                    return None
+                values = parse(data[name]) if parse else np.asarray(data[name], dtype=object)
+                return values[valid]
+
+            breakdown.append(Breakdown.from_columns(
+                int(valid.sum()),
+                bucket_codes(is_long[valid], before[valid]),
+                name=rows("name"),
+                isin=rows("isin"),
+                buy_date=None if buy is None else buy[valid],
+                sell_date=sell[valid],
+                quantity=rows("quantity", parse_numbers),
+                cost=rows("cost", parse_numbers),
+                proceeds=rows("proceeds", parse_numbers),
+                gain=pnl[valid],
+            ))
+        return result
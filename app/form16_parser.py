@@ -1,9 +1,23 @@
 import re
+import os
+import logging
+import threading
 import pdfplumber
 import pytesseract
 import fitz  # PyMuPDF
 from PIL import Image
-import io
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from app import metrics
+
+try:
+    # Optional: OCR straight from the rendered pixmap buffer, no image file
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
 
 # Tesseract configuration
 TESSERACT_PATH = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -12,6 +26,24 @@ try:
 except:
     pass
 
+# OCR render resolutions: every page at LOW first, HIGH only where needed
+OCR_LOW_DPI = int(os.getenv("SMARTTAX_OCR_LOW_DPI", "150"))
+OCR_HIGH_DPI = int(os.getenv("SMARTTAX_OCR_HIGH_DPI", "300"))
+
+# Concurrent Tesseract processes per parse
+OCR_THREADS = max(1, int(os.getenv("SMARTTAX_OCR_THREADS", str(min(4, os.cpu_count() or 1)))))
+
+# Text and tables of one PDF page, extracted once and shared by all strategies
+PageContent = namedtuple("PageContent", ["text", "tables"])
+
+# One rendered page: 8-bit grayscale pixmap samples, as PyMuPDF laid them out
+Bitmap = namedtuple("Bitmap", ["samples", "width", "height", "stride", "dpi"])
+
+# Idle tesserocr engines, reused across pages and parses (loading the
+# language data is the slow part of starting one)
+_tess_apis = []
+_tess_lock = threading.Lock()
+
 class Form16Parser:
     def __init__(self):
         pass
@@ -25,17 +57,40 @@ class Form16Parser:
         except:
             return 0.0
 
-    def _extract_from_tables(self, pdf):
+    def _read_pages(self, pdf, has_text):
+        """
+        Walk the PDF once, analysing each page a single time.
+
+        Pages PyMuPDF found no text layer on are skipped; for the rest the
+        text and tables are extracted together and the page's parsed layout
+        is released straight after.
+
+        Returns:
+            list of PageContent, one per page
+        """
+        pages = []
+        for page, text_layer in zip(pdf.pages, has_text):
+            if not text_layer:
+                pages.append(PageContent("", []))
+                continue
+
+            pages.append(PageContent(page.extract_text() or "", page.extract_tables()))
+
+            # Parsed chars/objects are cached on the page until released
+            close = getattr(page, "close", None) or getattr(page, "flush_cache", None)
+            if close:
+                close()
+        return pages
+
+    def _extract_from_tables(self, pages):
         """
         Reads tables page by page.
         Prioritizes the word 'Deducted' for TDS.
         """
         data = {}
         
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            
-            for table in tables:
+        for page in pages:
+            for table in page.tables:
                 for row in table:
                     # Clean row
                     row_items = [str(cell).lower() for cell in row if cell]
@@ -86,20 +141,107 @@ class Form16Parser:
                                 break
         return data
 
-    def _extract_with_ocr(self, pdf_file):
-        """Fallback: OCR for images"""
-        print("Standard extraction failed. Trying OCR...")
-        text_content = ""
+    def _extract_with_ocr(self, doc):
+        """
+        Fallback: OCR for images.
+
+        Pages are rendered at OCR_LOW_DPI and OCR'd in parallel, stopping as
+        soon as gross salary and TDS are both found. If they are not, pages
+        whose text matched neither pattern are re-rendered at OCR_HIGH_DPI.
+        """
+        logger.info("No salary found in the text layer, falling back to OCR")
+        metrics.fallback("form16", "ocr")
+        texts = {}
         try:
-            pdf_file.seek(0)
-            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
-            for page in doc:
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                img = Image.open(io.BytesIO(pix.tobytes("png")))
-                text_content += pytesseract.image_to_string(img) + "\n"
+            self._ocr_pages(doc, range(len(doc)), OCR_LOW_DPI, texts)
+
+            if not self._ocr_complete(texts):
+                retry = [
+                    n for n in range(len(doc))
+                    if not self._extract_text_regex(texts.get(n, ""))
+                ]
+                if retry:
+                    metrics.fallback("form16", "ocr_high_dpi")
+                self._ocr_pages(doc, retry, OCR_HIGH_DPI, texts)
         except Exception as e:
-            print(f"OCR Error: {e}")
-        return text_content
+            logger.warning("Form-16 OCR failed: %s", e)
+            metrics.fallback("form16", "ocr_error")
+        return self._join_pages(texts)
+
+    def _ocr_pages(self, doc, page_numbers, dpi, texts):
+        """
+        OCR ``page_numbers`` of ``doc`` at ``dpi`` into ``texts`` (page -> text).
+
+        PyMuPDF is not thread-safe, so pages are rendered on this thread and
+        only the Tesseract calls (separate processes) run in the pool. At most
+        OCR_THREADS pages are rendered ahead, and results are consumed in page
+        order so rendering stops once the data is complete.
+        """
+        pages = iter(page_numbers)
+        pending = deque()
+
+        with ThreadPoolExecutor(max_workers=OCR_THREADS) as pool:
+            def submit_next():
+                n = next(pages, None)
+                if n is not None:
+                    with metrics.stage("ocr_render"):
+                        bitmap = self._render_page(doc[n], dpi)
+                    pending.append((n, pool.submit(metrics.in_context(self._ocr_image), bitmap)))
+
+            for _ in range(OCR_THREADS):
+                submit_next()
+
+            while pending:
+                n, future = pending.popleft()
+                texts[n] = future.result()
+
+                if self._ocr_complete(texts):
+                    for _, rest in pending:
+                        rest.cancel()
+                    break
+                submit_next()
+
+    def _ocr_image(self, bitmap):
+        """
+        Tesseract text of one rendered page (runs in the OCR thread pool).
+
+        With tesserocr the pixmap buffer goes to Tesseract as is. pytesseract
+        can only pass a file, so the page is written as binary PGM, which is
+        the raw samples behind a short header: no compression either way.
+        """
+        with metrics.stage("ocr_page"):
+            if tesserocr is not None:
+                return self._ocr_buffer(bitmap)
+            img = Image.frombuffer("L", (bitmap.width, bitmap.height), bitmap.samples,
+                                   "raw", "L", bitmap.stride, 1)
+            img.format = "PPM"
+            return pytesseract.image_to_string(img)
+
+    def _ocr_buffer(self, bitmap):
+        with _tess_lock:
+            api = _tess_apis.pop() if _tess_apis else None
+        if api is None:
+            api = tesserocr.PyTessBaseAPI()
+        try:
+            api.SetImageBytes(bitmap.samples, bitmap.width, bitmap.height, 1, bitmap.stride)
+            api.SetSourceResolution(bitmap.dpi)
+            return api.GetUTF8Text()
+        finally:
+            with _tess_lock:
+                _tess_apis.append(api)
+
+    def _render_page(self, page, dpi):
+        """Render a page to an 8-bit grayscale bitmap"""
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        return Bitmap(pix.samples, pix.width, pix.height, pix.stride, dpi)
+
+    def _join_pages(self, texts):
+        return "\n".join(texts[n] for n in sorted(texts)) + "\n" if texts else ""
+
+    def _ocr_complete(self, texts):
+        """Whether the OCR text so far already yields gross salary and TDS"""
+        data = self._extract_text_regex(self._join_pages(texts))
+        return data.get("gross_salary", 0) > 0 and "tds_paid" in data
 
     def _extract_text_regex(self, text):
         """Regex Search (Backup)"""
@@ -120,49 +262,74 @@ class Form16Parser:
 
     def parse(self, pdf_file):
         result = {"employer_name": "Unknown", "gross_salary": 0.0, "tds_paid": 0.0}
-        
+
+        # --- 0. Cheap text-layer check (PyMuPDF) ---
         try:
-            with pdfplumber.open(pdf_file) as pdf:
-                # --- 1. Employer Name ---
-                try:
-                    page1_text = pdf.pages[0].extract_text()
-                    match = re.search(r"(?i)employer[:\s\n]+([A-Za-z0-9\s\.]+)", page1_text)
-                    if match:
-                        name_candidate = match.group(1).split('\n')[0].strip()
-                        if "from" not in name_candidate.lower() and "to" not in name_candidate.lower():
-                            result["employer_name"] = name_candidate
-                except:
-                    pass
-
-                # --- 2. Table Extraction ---
-                table_data = self._extract_from_tables(pdf)
-                result.update(table_data)
-
-                # --- 3. Text Line Extraction (Backup) ---
-                if result["gross_salary"] == 0.0:
-                    full_text = ""
-                    for page in pdf.pages:
-                        t = page.extract_text()
-                        if t: full_text += t + "\n"
-                    
-                    text_data = self._extract_text_regex(full_text)
-                    if text_data.get("gross_salary", 0) > 0:
-                        result.update(text_data)
+            pdf_file.seek(0)
+            doc = fitz.open(stream=pdf_file.read(), filetype="pdf")
+        except Exception as e:
+            logger.warning("Could not open Form-16 PDF: %s", e)
+            metrics.fallback("form16", "unreadable_pdf")
+            return result
+
+        try:
+            with metrics.stage("text_layer_check"):
+                has_text = [bool(page.get_text().strip()) for page in doc]
+
+            # Scanned PDFs go straight to OCR without any pdfplumber work
+            if any(has_text):
+                self._parse_text_layer(pdf_file, has_text, result)
+
+            # --- 4. OCR Backup ---
+            if result["gross_salary"] == 0.0:
+                ocr_text = self._extract_with_ocr(doc)
+                with metrics.stage("regex"):
+                    ocr_data = self._extract_text_regex(ocr_text)
+                if ocr_data.get("gross_salary", 0) > 0:
+                    result.update(ocr_data)
+
+                    # Try employer name in OCR
+                    if result["employer_name"] == "Unknown":
+                         match = re.search(r"(?i)employer[:\s\n]+([A-Za-z0-9\s\.]+)", ocr_text)
+                         if match:
+                            result["employer_name"] = match.group(1).split('\n')[0].strip()
+        finally:
+            doc.close()
+
+        return result
 
+    def _parse_text_layer(self, pdf_file, has_text, result):
+        """Table, regex and employer-name strategies over one pdfplumber pass"""
+        try:
+            pdf_file.seek(0)
+            with metrics.stage("pdfplumber"), pdfplumber.open(pdf_file) as pdf:
+                pages = self._read_pages(pdf, has_text)
         except Exception as e:
-            print(f"Error reading PDF: {e}")
+            logger.warning("pdfplumber could not read Form-16 PDF: %s", e)
+            metrics.fallback("form16", "pdfplumber_error")
+            return
 
-        # --- 4. OCR Backup ---
+        # --- 1. Employer Name ---
+        try:
+            match = re.search(r"(?i)employer[:\s\n]+([A-Za-z0-9\s\.]+)", pages[0].text)
+            if match:
+                name_candidate = match.group(1).split('\n')[0].strip()
+                if "from" not in name_candidate.lower() and "to" not in name_candidate.lower():
+                    result["employer_name"] = name_candidate
+        except:
+            pass
+
+        # --- 2. Table Extraction ---
+        with metrics.stage("tables"):
+            table_data = self._extract_from_tables(pages)
+        result.update(table_data)
+
+        # --- 3. Text Line Extraction (Backup) ---
         if result["gross_salary"] == 0.0:
-            ocr_text = self._extract_with_ocr(pdf_file)
-            ocr_data = self._extract_text_regex(ocr_text)
-            if ocr_data.get("gross_salary", 0) > 0:
-                result.update(ocr_data)
-                
-                # Try employer name in OCR
-                if result["employer_name"] == "Unknown":
-                     match = re.search(r"(?i)employer[:\s\n]+([A-Za-z0-9\s\.]+)", ocr_text)
-                     if match: 
-                        result["employer_name"] = match.group(1).split('\n')[0].strip()
-
-        return result
\ No newline at end of file
+            metrics.fallback("form16", "regex")
+            full_text = "".join(page.text + "\n" for page in pages if page.text)
+
+            with metrics.stage("regex"):
+                text_data = self._extract_text_regex(full_text)
+            if text_data.get("gross_salary", 0) > 0:
+                result.update(text_data)
@@ -1,7 +1,12 @@
+import numpy as np
 import pandas as pd
 from datetime import date
+from typing import Optional
 
-CUT_OFF_DATE = date(2024, 7, 23)
+from app import metrics
+from app.breakdown import Breakdown, bucket_codes
+from app.excel_reader import can_stream, cell, iter_sheet_rows
+from app.tax_rules import get_rules
 
 
 def parse_amount(val):
@@ -22,82 +27,333 @@ def parse_amount(val):
         return 0.0
 
 
+def parse_amount_column(col):
+    """
+    Vectorized parse_amount for a whole column.
+
+    Plain numbers and "1,234.50" / "(1,234.50)" strings are converted with
+    pandas; anything pandas can't convert falls back to parse_amount so the
+    result is identical to applying parse_amount cell by cell.
+    """
+    if pd.api.types.is_numeric_dtype(col.dtype) and not pd.api.types.is_bool_dtype(col.dtype):
+        return col.astype(float).fillna(0.0).to_numpy()
+
+    # Object columns holding only numbers (e.g. quantities read row by row)
+    if pd.api.types.infer_dtype(col, skipna=True) in ("integer", "floating", "mixed-integer-float"):
+        return col.astype(float).fillna(0.0).to_numpy()
+
+    missing = col.isna().to_numpy()
+    s = col.astype(str).str.replace(",", "", regex=False).str.strip()
+    negative = (s.str.startswith("(") & s.str.endswith(")")).to_numpy()
+    s = s.where(~negative, s.str[1:-1])
+
+    values = pd.to_numeric(s, errors="coerce").astype(float).to_numpy()
+    values = np.where(negative, -values, values)
+
+    unresolved = np.isnan(values) & ~missing
+    if unresolved.any():
+        raw = col.to_numpy()
+        for i in np.flatnonzero(unresolved):
+            values[i] = parse_amount(raw[i])
+
+    values[missing] = 0.0
+    return values
+
+
+def split_sell_dates(col, cut_off: Optional[date] = None):
+    """
+    Parse a sell-date column and split it around ``cut_off`` (default: the
+    default rules' cut-off; years without one count every date as before).
+
+    Trade reports repeat the same few hundred dates across thousands of rows,
+    so each distinct value is parsed once (with the same dayfirst rules as a
+    single-cell pd.to_datetime) and the result is broadcast back.
+
+    Returns:
+        (valid, is_before): boolean arrays; rows with unparseable dates are
+        not valid and must be skipped
+    """
+    if cut_off is None:
+        cut_off = get_rules().cut_off_date or date.max
+
+    codes, uniques = pd.factorize(col)
+
+    unique_valid = np.zeros(len(uniques) + 1, dtype=bool)
+    unique_before = np.zeros(len(uniques) + 1, dtype=bool)
+    for j, val in enumerate(uniques):
+        sell_date = pd.to_datetime(val, dayfirst=True, errors="coerce")
+        if pd.isna(sell_date):
+            continue
+        unique_valid[j] = True
+        unique_before[j] = sell_date.date() < cut_off
+
+    # Missing cells have code -1, which indexes the trailing "invalid" slot
+    return unique_valid[codes], unique_before[codes]
+
+
+def _parse_dates(col):
+    """datetime64 per cell, parsing each distinct value once like split_sell_dates"""
+    codes, uniques = pd.factorize(col)
+    parsed = pd.to_datetime(
+        pd.Series(uniques, dtype=object), dayfirst=True, errors="coerce", format="mixed"
+    ).to_numpy(dtype="datetime64[ns]")
+    return np.append(parsed, np.datetime64("NaT"))[codes]
+
+
+def _sequential_sum(values, start=0.0):
+    """Left-to-right float sum, bit-identical to accumulating row by row"""
+    if len(values) == 0:
+        return start
+    return float(np.cumsum(np.concatenate(([start], values)))[-1])
+
+
+def _resolve_columns(header_row):
+    """
+    Find the P&L and sell-date column indices in a section header row.
+
+    Returns:
+        (pnl_idx, sell_idx), or None if either column is missing
+    """
+    headers = [str(x).lower().strip() for x in header_row]
+    try:
+        pnl_idx = next(
+            i for i, h in enumerate(headers)
+            if "p&l" in h or "pnl" in h
+        )
+        sell_idx = next(
+            i for i, h in enumerate(headers)
+            if "sell" in h and "date" in h
+        )
+    except StopIteration:
+        return None
+    return pnl_idx, sell_idx
+
+
+def _detail_columns(header_row):
+    """
+    Indices of the per-trade detail columns present in a section header
+    (stock name, ISIN, quantity, buy/sell dates, values or prices).
+    """
+    headers = [str(x).lower().strip() for x in header_row]
+    wanted = {
+        "name": lambda h: "name" in h or h in ("symbol", "scrip"),
+        "isin": lambda h: h == "isin",
+        "quantity": lambda h: h in ("quantity", "qty", "qty."),
+        "buy_date": lambda h: "buy" in h and "date" in h,
+        "buy_value": lambda h: "buy" in h and "value" in h,
+        "buy_price": lambda h: "buy" in h and ("price" in h or "rate" in h),
+        "sell_value": lambda h: "sell" in h and "value" in h,
+        "sell_price": lambda h: "sell" in h and ("price" in h or "rate" in h),
+    }
+    columns = {}
+    for name, matches in wanted.items():
+        idx = next((i for i, h in enumerate(headers) if matches(h)), None)
+        if idx is not None:
+            columns[name] = idx
+    return columns
+
+
+def _amount(detail, value_key, price_key, quantity):
+    """Total value from a value column, else quantity x price (NaN if neither)"""
+    if value_key in detail:
+        return parse_amount_column(detail[value_key])
+    if price_key in detail:
+        return quantity * parse_amount_column(detail[price_key])
+    return np.full(len(quantity), np.nan)
+
+
 class GrowwCapitalGainsParser:
     """
     Robust parser for Groww Equity Trades report
+
+    ``rules`` selects the financial year whose cut-off date splits the
+    before/after buckets. Years without a mid-year rate change report
+    every trade as "before" (both rates are the same).
     """
 
+    # Trade rows buffered per section before they are parsed as a column
+    STREAM_CHUNK_ROWS = 5000
+
+    def __init__(self, rules=None):
+        self.cut_off = (rules or get_rules()).cut_off_date or date.max
+
     def parse(self, file):
-        df = pd.read_excel(file, header=None)
+        if can_stream(file):
+            with metrics.stage("section_scan"):
+                return self.parse_rows(iter_sheet_rows(file))
 
-        stcg_before = stcg_after = 0.0
-        ltcg_before = ltcg_after = 0.0
+        df = self._read_dataframe(file)
+        with metrics.stage("section_scan"):
+            return self.parse_dataframe(df)
 
-        mode = None
-        headers = None
+    def parse_with_breakdown(self, file):
+        """Same as parse, plus the trade-level Breakdown"""
+        parts = []
+        if can_stream(file):
+            with metrics.stage("section_scan"):
+                result = self.parse_rows(iter_sheet_rows(file), breakdown=parts)
+        else:
+            df = self._read_dataframe(file)
+            with metrics.stage("section_scan"):
+                result = self.parse_dataframe(df, breakdown=parts)
+        with metrics.stage("breakdown"):
+            return result, Breakdown.concat(parts)
+
+    def _read_dataframe(self, file):
+        """Whole first sheet via pandas, for workbooks the streaming reader cannot open"""
+        metrics.fallback("groww", "pandas")
+        with metrics.stage("pandas_read"):
+            return pd.read_excel(file, header=None)
 
-        for i in range(len(df)):
-            row = df.iloc[i]
-            first_cell = str(row[0]).lower()
+    def parse_dataframe(self, df, breakdown=None):
+        """
+        Compute STCG/LTCG before/after the cut-off from a raw report sheet.
 
-            # ---------------- Detect STCG section ----------------
-            if "short term trades" in first_cell:
-                mode = "STCG"
-                headers = None
+        Section boundaries are found in one pass over the first column, column
+        indices are resolved once per section, and each section's trade rows
+        are parsed as whole columns. If ``breakdown`` is a list, a Breakdown
+        of each section's trades is appended to it.
+        """
+        totals = {"STCG": [0.0, 0.0], "LTCG": [0.0, 0.0]}
+
+        for mode, header_row, start, stop in self._find_sections(df):
+            columns = _resolve_columns(df.iloc[header_row])
+            if columns is None:
                 continue
 
-            # ---------------- Detect LTCG section ----------------
-            if "long term trades" in first_cell:
-                mode = "LTCG"
-                headers = None
+            pnl_idx, sell_idx = columns
+            pnl_col = df.iloc[start:stop, pnl_idx]
+            sell_col = df.iloc[start:stop, sell_idx]
+            valid, is_before, pnl = self._accumulate(totals[mode], pnl_col, sell_col)
+
+            if breakdown is not None:
+                detail = {
+                    name: df.iloc[start:stop, idx].reset_index(drop=True)
+                    for name, idx in _detail_columns(df.iloc[header_row]).items()
+                }
+                breakdown.append(self._breakdown(
+                    mode, detail, pnl, sell_col.reset_index(drop=True), valid, is_before
+                ))
+
+        return self._result(totals)
+
+    def parse_rows(self, rows, breakdown=None):
+        """
+        Compute the same result as parse_dataframe from an iterator of rows.
+
+        Used with the streaming Excel reader: rows are fed through the section
+        state machine as they arrive and trade rows are parsed in chunks of
+        STREAM_CHUNK_ROWS, so memory does not grow with the report size.
+        """
+        totals = {"STCG": [0.0, 0.0], "LTCG": [0.0, 0.0]}
+
+        mode = None
+        header_seen = False
+        columns = None
+        detail_columns = {}
+        pnl_buf = []
+        sell_buf = []
+        detail_buf = {}
+
+        def flush():
+            if pnl_buf:
+                pnl_col = pd.Series(pnl_buf)
+                sell_col = pd.Series(sell_buf)
+                valid, is_before, pnl = self._accumulate(totals[mode], pnl_col, sell_col)
+                if breakdown is not None:
+                    detail = {name: pd.Series(values) for name, values in detail_buf.items()}
+                    breakdown.append(
+                        self._breakdown(mode, detail, pnl, sell_col, valid, is_before)
+                    )
+                pnl_buf.clear()
+                sell_buf.clear()
+                for values in detail_buf.values():
+                    values.clear()
+
+        for row in rows:
+            first_cell = str(cell(row, 0)).lower()
+
+            # ---------------- Detect STCG / LTCG section ----------------
+            if "short term trades" in first_cell or "long term trades" in first_cell:
+                flush()
+                mode = "STCG" if "short term trades" in first_cell else "LTCG"
+                header_seen = False
+                columns = None
                 continue
 
             # ---------------- Detect header row ----------------
-            if mode and headers is None:
-                headers = [str(x).lower().strip() for x in row]
+            if mode and not header_seen:
+                header_seen = True
+                columns = _resolve_columns(row)
+                if breakdown is not None:
+                    detail_columns = _detail_columns(row)
+                    detail_buf = {name: [] for name in detail_columns}
                 continue
 
             # ---------------- Exit section on TOTAL ----------------
             if mode and "total" in first_cell:
+                flush()
                 mode = None
-                headers = None
                 continue
 
-            # ---------------- Parse trade rows ----------------
-            if mode and headers:
-                try:
-                    pnl_idx = next(
-                        i for i, h in enumerate(headers)
-                        if "p&l" in h or "pnl" in h
-                    )
-                    sell_idx = next(
-                        i for i, h in enumerate(headers)
-                        if "sell" in h and "date" in h
-                    )
-                except StopIteration:
-                    continue
+            # ---------------- Buffer trade rows ----------------
+            if mode and columns:
+                pnl_idx, sell_idx = columns
+                pnl_buf.append(cell(row, pnl_idx))
+                sell_buf.append(cell(row, sell_idx))
+                for name, idx in detail_columns.items():
+                    detail_buf[name].append(cell(row, idx))
+                if len(pnl_buf) >= self.STREAM_CHUNK_ROWS:
+                    flush()
+
+        flush()
+        return self._result(totals)
 
-                pnl = parse_amount(row[pnl_idx])
-                sell_date = pd.to_datetime(
-                    row[sell_idx], dayfirst=True, errors="coerce"
-                )
+    def _accumulate(self, total, pnl_col, sell_col):
+        """
+        Add one block of trade rows to a section's [before, after] totals.
 
-                if pd.isna(sell_date):
-                    continue
+        Rows with unparseable sell dates are skipped; sums run in row order.
 
-                is_before = sell_date.date() < CUT_OFF_DATE
+        Returns:
+            (valid, is_before, pnl): split_sell_dates output and the parsed
+            P&L of every row
+        """
+        valid, is_before = split_sell_dates(sell_col, self.cut_off)
+        pnl = parse_amount_column(pnl_col)
+        before = is_before[valid]
 
-                if mode == "STCG":
-                    if is_before:
-                        stcg_before += pnl
-                    else:
-                        stcg_after += pnl
+        total[0] = _sequential_sum(pnl[valid][before], total[0])
+        total[1] = _sequential_sum(pnl[valid][~before], total[1])
+        return valid, is_before, pnl
 
-                elif mode == "LTCG":
-                    if is_before:
-                        ltcg_before += pnl
-                    else:
-                        ltcg_after += pnl
+    def _breakdown(self, mode, detail, gain, sell_col, valid, is_before):
+        """Breakdown of one block of trade rows (the rows _accumulate counted)"""
+        quantity = parse_amount_column(detail["quantity"]) if "quantity" in detail \
+            else np.full(len(gain), np.nan)
+        proceeds = _amount(detail, "sell_value", "sell_price", quantity)
+        cost = _amount(detail, "buy_value", "buy_price", quantity)
+
+        def rows(values):
+            return None if values is None else np.asarray(values)[valid]
+
+        n = int(valid.sum())
+        return Breakdown.from_columns(
+            n,
+            bucket_codes(np.full(n, mode == "LTCG"), is_before[valid]),
+            name=rows(detail.get("name")),
+            isin=rows(detail.get("isin")),
+            buy_date=rows(_parse_dates(detail["buy_date"])) if "buy_date" in detail else None,
+            sell_date=rows(_parse_dates(sell_col)),
+            quantity=quantity[valid],
+            cost=cost[valid],
+            proceeds=proceeds[valid],
+            gain=gain[valid],
+        )
+
+    def _result(self, totals):
+        stcg_before, stcg_after = totals["STCG"]
+        ltcg_before, ltcg_after = totals["LTCG"]
 
         return {
             "stcg_before": round(stcg_before, 2),
@@ -105,3 +361,40 @@ class GrowwCapitalGainsParser:
             "ltcg_before": round(ltcg_before, 2),
             "ltcg_after": round(ltcg_after, 2),
         }
+
+    def _find_sections(self, df):
+        """
+        Locate trade sections in a single scan of the first column.
+
+        A section starts at a "Short Term Trades" / "Long Term Trades" row,
+        the row right after it is the header, and trade rows run until the
+        next "Total" row or the next section title.
+
+        Returns:
+            list of (mode, header_row, first_trade_row, stop_row)
+        """
+        first_col = df[0].astype(str).str.lower() if len(df.columns) else pd.Series(dtype=str)
+        is_short = first_col.str.contains("short term trades", regex=False).to_numpy()
+        is_long = first_col.str.contains("long term trades", regex=False).to_numpy()
+        is_total = first_col.str.contains("total", regex=False).to_numpy()
+
+        sections = []
+        mode = None
+        header_row = None
+
+        for i in np.flatnonzero(is_short | is_long | is_total):
+            if is_short[i] or is_long[i]:
+                if mode:
+                    sections.append((mode, header_row, header_row + 1, i))
+                mode = "STCG" if is_short[i] else "LTCG"
+                header_row = i + 1
+            elif mode and i > header_row:
+                # "Total" closes the section (a "Total" header row does not)
+                sections.append((mode, header_row, header_row + 1, i))
+                mode = None
+
+        if mode:
+            sections.append((mode, header_row, header_row + 1, len(df)))
+
+        # A section title on the last row has no header row to read
+        return [s for s in sections if s[1] < len(df)]
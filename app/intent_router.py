@@ -0,0 +1,162 @@
+"""
+Chatbot Intent Router
+
+Deterministic first tier in front of the LLM. Every intent has a set of
+weighted keywords; all keywords are compiled into one regex, so a message
+is scanned once, and each intent's score is the sum of the weights of the
+distinct keywords found.
+
+An intent is *confident* when its score clears a minimum, beats the
+runner-up by a margin and the message is short (long questions usually
+ask something a canned answer does not cover). Confident intents are
+answered from the rules without calling the LLM; everything else goes to
+Ollama. When Ollama is unavailable the best-scoring intent is used
+regardless of confidence.
+
+Configuration (environment variables):
+    SMARTTAX_INTENT_MIN_SCORE: Score an intent needs to be answered
+        without the LLM (default: 2.0)
+    SMARTTAX_INTENT_MAX_WORDS: Longer messages always go to the LLM
+        (default: 12)
+
+Author: SmartTax Team
+"""
+
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+INTENT_MIN_SCORE = float(os.getenv("SMARTTAX_INTENT_MIN_SCORE", "2.0"))
+INTENT_MAX_WORDS = int(os.getenv("SMARTTAX_INTENT_MAX_WORDS", "12"))
+
+# Lead the best intent must have over the next one to be confident
+INTENT_MARGIN = 1.0
+
+# Intent -> {keyword or phrase: weight}
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "tax_saving": {
+        "save": 2.0, "saving": 2.0, "savings": 2.0, "reduce": 2.0,
+        "optimize": 2.0, "optimise": 2.0, "minimize": 2.0, "minimise": 2.0,
+        "lower": 1.0, "tax planning": 2.0,
+    },
+    "explain_calculation": {
+        "calculate": 2.0, "calculated": 2.0, "calculation": 2.0,
+        "computation": 2.0, "computed": 1.0, "breakdown": 2.0,
+        "net payable": 2.0, "my tax": 1.0, "why": 1.0, "how": 0.5,
+    },
+    "ltcg": {
+        "ltcg": 3.0, "long term": 3.0,
+    },
+    "stcg": {
+        "stcg": 3.0, "short term": 3.0,
+    },
+    "cess": {
+        "cess": 3.0, "health and education": 2.0,
+    },
+    "help": {
+        "help": 1.0, "hi": 1.0, "hello": 1.0, "hey": 1.0,
+        "what can you do": 2.0,
+    },
+}
+
+_WORD = re.compile(r"\w+")
+
+
+class Intent(NamedTuple):
+    """Routing decision for one message"""
+    name: Optional[str]     # None = no keyword matched
+    score: float
+    runner_up: float
+    confident: bool
+
+
+def _phrase_pattern(phrase: str) -> str:
+    # Words may be separated by any run of spaces or hyphens ("long-term")
+    return r"[\s\-]+".join(re.escape(word) for word in phrase.split())
+
+
+def _canonical(matched: str) -> str:
+    return " ".join(re.split(r"[\s\-]+", matched.lower()))
+
+
+class IntentRouter:
+    """Single-pass weighted keyword matcher over INTENT_KEYWORDS"""
+
+    def __init__(
+        self,
+        keywords: Dict[str, Dict[str, float]] = INTENT_KEYWORDS,
+        min_score: float = INTENT_MIN_SCORE,
+        margin: float = INTENT_MARGIN,
+        max_words: int = INTENT_MAX_WORDS,
+    ):
+        self.min_score = min_score
+        self.margin = margin
+        self.max_words = max_words
+
+        # Keyword -> [(intent, weight)]; a keyword may feed several intents
+        self._weights: Dict[str, List[Tuple[str, float]]] = defaultdict(list)
+        for intent, words in keywords.items():
+            for phrase, weight in words.items():
+                self._weights[phrase.lower()].append((intent, weight))
+
+        # Longest phrases first so "net payable" is matched whole
+        phrases = sorted(self._weights, key=len, reverse=True)
+        self._pattern = re.compile(
+            r"\b(?:" + "|".join(_phrase_pattern(p) for p in phrases) + r")\b",
+            re.IGNORECASE,
+        )
+
+        self._lock = threading.Lock()
+        self._confident = 0
+        self._ambiguous = 0
+        self._by_intent: Dict[str, int] = defaultdict(int)
+
+    def scores(self, message: str) -> Dict[str, float]:
+        """Score per intent for ``message`` (intents with no match omitted)"""
+        found = {_canonical(m) for m in self._pattern.findall(message)}
+        totals: Dict[str, float] = defaultdict(float)
+        for phrase in found:
+            for intent, weight in self._weights[phrase]:
+                totals[intent] += weight
+        return totals
+
+    def route(self, message: str) -> Intent:
+        """Best intent for ``message`` and whether it is confident"""
+        ranked = sorted(self.scores(message).items(), key=lambda kv: kv[1], reverse=True)
+        if not ranked:
+            intent = Intent(None, 0.0, 0.0, False)
+        else:
+            name, score = ranked[0]
+            runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+            confident = (
+                score >= self.min_score
+                and score - runner_up >= self.margin
+                and len(_WORD.findall(message)) <= self.max_words
+            )
+            intent = Intent(name, score, runner_up, confident)
+        return intent
+
+    def record(self, answered: Optional[str]):
+        """Count one routed message: the intent answered directly, or None"""
+        with self._lock:
+            if answered:
+                self._confident += 1
+                self._by_intent[answered] += 1
+            else:
+                self._ambiguous += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            routed = self._confident + self._ambiguous
+            return {
+                "answered_directly": self._confident,
+                "sent_to_llm": self._ambiguous,
+                "direct_rate": round(self._confident / routed, 4) if routed else 0.0,
+                "by_intent": dict(self._by_intent),
+            }
+
+
+# Shared by every chatbot instance; compiled once at import
+ROUTER = IntentRouter()
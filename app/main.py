@@ -12,14 +12,30 @@ Features:
 - AI-powered tax advisor chatbot (local LLM via Ollama)
 
 Endpoints:
-    GET  /                      - Health check
+    GET  /                      - Health check (includes LLM circuit breaker state)
+    GET  /parse/stats           - Parser pool and parse cache counters
+    GET  /metrics               - Prometheus metrics (latency, parser stages, fallbacks, LLM)
+    GET  /admin/profiles        - Sampled / slow request profiles (SMARTTAX_PROFILE=1)
+    GET  /admin/profiles/{id}   - One profile as folded stacks (flame graph input)
+    GET  /debug/startup         - Cold start milestones, pre-warming and import times
     POST /parse/form16          - Parse Form-16 PDF
-    POST /parse/equity          - Parse equity trades Excel
-    POST /parse/mf              - Parse mutual fund gains Excel
+    POST /parse/equity          - Parse equity P&L report / tradebook (broker auto-detected)
+    POST /parse/mf              - Parse mutual fund gains (CAS / Groww)
+    POST /parse/tradebook       - FIFO capital gains from a raw tradebook (CSV/Excel)
+    GET  /parse/breakdown/{id}  - Page / filter the trade-level rows of a parse result
+    GET  /tax/rules             - List available financial years / regimes
     POST /calculate/tax         - Calculate total tax liability
+    POST /calculate/tax/batch   - Calculate tax for many rows (JSON rows/columns)
+    POST /calculate/tax/batch/csv - Calculate tax for many rows (CSV upload)
+    POST /itr/compute           - Parse all documents concurrently and calculate tax
     POST /chatbot/message       - Send message to tax advisor AI
+    POST /chatbot/stream        - Same, reply streamed as server-sent events
     GET  /chatbot/history       - Get conversation history
     POST /chatbot/clear         - Clear conversation history
+    GET  /chatbot/sessions/stats - Chat session store usage
+
+Chatbot endpoints are per session: send X-Session-ID (or keep the
+smarttax_session cookie); a new session ID is issued when neither is sent.
 
 Security:
 - CORS enabled for localhost:3000, localhost:3001
@@ -30,18 +46,32 @@ Author: SmartTax Team
 Version: 1.0.0
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Form
+from fastapi import FastAPI, File, UploadFile, HTTPException, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import io
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import sys
+import time
 
-from app.form16_parser import Form16Parser
-from app.groww_parser import GrowwCapitalGainsParser
-from app.mutual_fund_parser import MutualFundCapitalGainsParser
-from app.chatbot import TaxAdvisorChatbot
+from app.chat_sessions import ChatSessionStore, SESSION_COOKIE, SESSION_HEADER, new_session_id
+from app.ollama_client import OllamaClient, OllamaError
+from app.response_cache import ResponseCache
+from app.intent_router import ROUTER as intent_router
+from app.worker_pool import (
+    PARSER_VERSIONS, ParseWorkerPool, PoolSaturatedError, ParseTimeoutError
+)
+from app.parse_cache import ParseCache, cache_key, file_digest
+from app.breakdown import BREAKDOWN_KEY, BreakdownStore
+from app import metrics, profiling, startup
 from app import utils
+from app.tax_rules import TaxRules, UnknownRulesError, available_rules, get_rules
 
 app = FastAPI(title="SmartTax API", version="1.0.0")
 
@@ -52,13 +82,127 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Session-ID"],
 )
 
-# Initialize parsers and chatbot
-form16_parser = Form16Parser()
-groww_parser = GrowwCapitalGainsParser()
-mf_parser = MutualFundCapitalGainsParser()
-chatbot = TaxAdvisorChatbot()
+# Per-route latency histograms for GET /metrics
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+# Opt-in sampling profiler; sampled and slow requests go to /admin/profiles
+profile_store = profiling.ProfileStore()
+if profiling.PROFILE_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware, store=profile_store)
+
+# Chatbot state is kept per session (X-Session-ID header or cookie)
+chat_sessions = ChatSessionStore()
+
+# One pooled connection to Ollama, shared by every chat request
+ollama = OllamaClient()
+
+# Answers to repeat questions are served without a new generation
+response_cache = ResponseCache()
+
+# Parsing runs in worker processes so the event loop stays responsive
+parse_pool = ParseWorkerPool()
+
+# Repeat uploads of the same file are answered from here
+parse_cache = ParseCache()
+
+# Trade-level tables behind parse results, paged by /parse/breakdown/{id}
+breakdown_store = BreakdownStore()
+
+# Parser modules (pandas, openpyxl, OCR) are imported on first use of an
+# endpoint; this loads them in the background once the app is serving
+prewarmer = startup.Prewarmer()
+
+
+@app.on_event("startup")
+def start_parse_pool():
+    parse_pool.start()
+
+
+@app.on_event("shutdown")
+def stop_parse_pool():
+    parse_pool.shutdown()
+
+
+@app.on_event("startup")
+def start_prewarm():
+    startup.mark("startup_complete")
+    prewarmer.start(parse_pool)
+
+
+@app.on_event("startup")
+async def start_ollama_health_check():
+    ollama.start_health_check()
+
+
+@app.on_event("shutdown")
+async def close_ollama_client():
+    await ollama.aclose()
+
+
+def cached_parse(kind: str, contents: bytes,
+                 digest: Optional[str] = None) -> Tuple[str, Optional[dict]]:
+    """
+    Cache key of an upload and its cached result, if any. Hashing a large
+    file and reading SQLite block, so run_parser calls this in a thread.
+    """
+    key = cache_key(kind, PARSER_VERSIONS[kind], contents, digest)
+    return key, parse_cache.get(key)
+
+
+async def run_parser(kind: str, contents: bytes, digest: Optional[str] = None) -> dict:
+    """
+    Run a parser in the worker pool, mapping pool errors to HTTP errors.
+
+    Results are cached by file hash (``digest``, when the caller already
+    computed it), so a repeat upload of the same file never reaches the pool.
+
+    Raises:
+        HTTPException: 429 if the pool is saturated, 504 on timeout
+    """
+    key, cached = await asyncio.to_thread(cached_parse, kind, contents, digest)
+    profile = profiling.current()
+    # A result whose breakdown was evicted is parsed again, so its ID stays valid
+    if cached is not None and ("breakdown_id" not in cached
+                               or cached["breakdown_id"] in breakdown_store):
+        metrics.PARSE_REQUESTS.inc(parser=kind, outcome="cache_hit")
+        if profile is not None:
+            profile.tag(parser=kind, parser_path="cache")
+        return cached
+
+    start = time.perf_counter()
+    try:
+        result = await parse_pool.submit(kind, contents, profile=profile is not None)
+    except PoolSaturatedError:
+        metrics.PARSE_REQUESTS.inc(parser=kind, outcome="rejected")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many documents are being parsed right now, please retry shortly",
+            headers={"Retry-After": "5"}
+        )
+    except ParseTimeoutError as e:
+        metrics.PARSE_REQUESTS.inc(parser=kind, outcome="timeout")
+        raise HTTPException(status_code=504, detail=str(e))
+
+    metrics.PARSE_REQUESTS.inc(parser=kind, outcome="parsed")
+    trace = result.pop(metrics.TRACE_KEY, None)
+    metrics.record_trace(kind, trace, time.perf_counter() - start)
+    stacks = result.pop(profiling.PROFILE_KEY, None)
+    if profile is not None:
+        profile.tag(parser=kind, parser_path=profiling.parser_path(kind, trace))
+        if stacks:
+            profile.merge(stacks, prefix=f"parse worker ({kind})")
+
+    table = result.pop(BREAKDOWN_KEY, None)
+    if table is not None:
+        result["breakdown_id"] = hashlib.sha256(key.encode()).hexdigest()[:32]
+        await asyncio.to_thread(breakdown_store.put, result["breakdown_id"], table)
+
+    await asyncio.to_thread(parse_cache.put, key, result)
+    return result
 
 
 # Pydantic Models
@@ -73,6 +217,25 @@ class TaxCalculationRequest(BaseModel):
     equity_ltcg: Optional[float] = 0.0
     debt_stcg: Optional[float] = 0.0
     debt_ltcg: Optional[float] = 0.0
+    financial_year: Optional[str] = None  # e.g. "2024-25" (default rules if omitted)
+    regime: Optional[str] = None          # "new" or "old"
+
+
+class TaxBatchRequest(BaseModel):
+    """
+    Many tax calculations in one call.
+
+    Give either ``rows`` (one object per person, same fields as
+    TaxCalculationRequest) or ``columns`` (field name -> list of values).
+    ``format`` selects the response layout: "rows" returns one
+    /calculate/tax result per person, "columns" returns a single result
+    whose amounts are lists (much faster for large batches).
+    """
+    rows: Optional[List[TaxCalculationRequest]] = None
+    columns: Optional[Dict[str, List[float]]] = None
+    format: str = "rows"
+    financial_year: Optional[str] = None  # applies to every row
+    regime: Optional[str] = None
 
 
 class ChatbotRequest(BaseModel):
@@ -82,7 +245,200 @@ class ChatbotRequest(BaseModel):
 
 @app.get("/")
 def read_root():
-    return {"message": "SmartTax API is running", "version": "1.0.0"}
+    return {
+        "message": "SmartTax API is running",
+        "version": "1.0.0",
+        "llm": ollama.health()
+    }
+
+
+@app.get("/parse/stats")
+def parse_stats():
+    """Parser worker pool usage and parse cache hit/miss counters"""
+    # Only loaded once an equity upload needed it; until then nothing was detected
+    report_formats = sys.modules.get("app.report_formats")
+    format_detection = (report_formats.stats() if report_formats is not None else
+                        {"entries": 0, "hits": 0, "misses": 0, "hit_rate": 0.0})
+
+    return {
+        "success": True,
+        "data": {
+            "pool": parse_pool.stats(),
+            "cache": parse_cache.stats(),
+            "format_detection": format_detection,
+            "breakdowns": breakdown_store.stats()
+        }
+    }
+
+
+@metrics.REGISTRY.collector
+def collect_app_metrics():
+    """Pool, cache, router and LLM counters kept by their own objects, read per scrape"""
+    pool = parse_pool.stats()
+    yield ("smarttax_parse_pool_workers", "gauge", "Parser worker processes",
+           [({}, pool["workers"])])
+    yield ("smarttax_parse_pool_in_flight", "gauge", "Parse jobs running or queued",
+           [({}, pool["in_flight"])])
+    yield ("smarttax_parse_pool_queued", "gauge", "Parse jobs waiting for a worker",
+           [({}, pool["queued"])])
+    yield ("smarttax_parse_pool_rejected_total", "counter", "Parse jobs rejected (HTTP 429)",
+           [({}, pool["rejected"])])
+    yield ("smarttax_parse_pool_timed_out_total", "counter", "Parse jobs timed out (HTTP 504)",
+           [({}, pool["timed_out"])])
+    yield ("smarttax_parse_pool_recycled_total", "counter",
+           "Times the parser processes were replaced after a timeout or crash",
+           [({}, pool["recycled"])])
+
+    caches = {"parse": parse_cache.stats(), "breakdown": breakdown_store.stats()}
+    answers = response_cache.stats()
+    caches["llm_response"] = {"hits": answers["exact_hits"] + answers["similar_hits"],
+                              "misses": answers["misses"]}
+    # Only loaded once an equity upload needed it
+    if "app.report_formats" in sys.modules:
+        caches["format_detection"] = sys.modules["app.report_formats"].stats()
+    yield ("smarttax_cache_hits_total", "counter", "Cache hits",
+           [({"cache": name}, c["hits"]) for name, c in caches.items()])
+    yield ("smarttax_cache_misses_total", "counter", "Cache misses",
+           [({"cache": name}, c["misses"]) for name, c in caches.items()])
+    yield ("smarttax_parse_cache_disk_hits_total", "counter",
+           "Parse cache hits served from the SQLite tier",
+           [({}, caches["parse"]["disk_hits"])])
+
+    routed = intent_router.stats()
+    yield ("smarttax_chat_routed_total", "counter", "Chat messages by intent router decision",
+           [({"route": "direct"}, routed["answered_directly"]),
+            ({"route": "llm"}, routed["sent_to_llm"])])
+
+    llm = ollama.stats()
+    yield ("smarttax_llm_active", "gauge", "Ollama generations running", [({}, llm["active"])])
+    yield ("smarttax_llm_waiting", "gauge", "Chats waiting for a generation slot",
+           [({}, llm["waiting"])])
+    yield ("smarttax_llm_replies_total", "counter", "Ollama replies received",
+           [({}, llm["replies"])])
+    yield ("smarttax_llm_circuit_open", "gauge", "1 while the LLM circuit breaker is open",
+           [({}, int(llm["circuit"] == "open"))])
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Prometheus text format: request latency per route, parser stage
+    timings, fallback counts, LLM token counts and durations, cache hit
+    and miss counters and parse pool queue depth.
+    """
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (SMARTTAX_METRICS=0)")
+    return PlainTextResponse(metrics.render(),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def require_admin(request: Request):
+    """
+    Raises:
+        HTTPException: 404 if profiling is off, 403 if SMARTTAX_ADMIN_TOKEN
+            is set and not sent as X-Admin-Token
+    """
+    if not profiling.PROFILE_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set SMARTTAX_PROFILE=1)")
+    token = profiling.ADMIN_TOKEN
+    if token and not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request, limit: int = 50, route: Optional[str] = None,
+                        parser: Optional[str] = None, min_ms: float = 0.0):
+    """
+    Stored request profiles, newest first: route, status, duration, why it
+    was kept (sampled / slow) and, for uploads, the parser and the path it
+    took. Filter by route template, parser or minimum duration.
+    """
+    require_admin(request)
+    profiles = await asyncio.to_thread(profile_store.list, max(1, min(limit, 500)),
+                                       route, parser, min_ms)
+    return {"success": True, "data": {"profiles": profiles}}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str, format: str = "collapsed"):
+    """
+    One profile. ``format=collapsed`` (default) is the folded stack text
+    flamegraph.pl, inferno and speedscope turn into a flame graph;
+    ``format=json`` is the stored record.
+    """
+    require_admin(request)
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    try:
+        record = await asyncio.to_thread(profile_store.get, profile_id)
+    except profiling.ProfileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found (it may have been pruned)")
+
+    if format == "json":
+        return {"success": True, "data": record}
+    return PlainTextResponse(profiling.collapsed(record["stacks"]))
+
+
+@app.get("/debug/startup")
+def debug_startup(top: int = 30):
+    """
+    Where start-up time went: milestones since process start, heavy
+    modules loaded, pre-warm timings and (with SMARTTAX_IMPORT_PROFILE=1)
+    the ``top`` slowest imports.
+    """
+    return {"success": True, "data": startup.report(prewarmer, top)}
+
+
+def form16_data(result: dict) -> dict:
+    """Form-16 parser output as returned by /parse/form16"""
+    return {
+        "employer_name": result.get("employer_name", "Unknown"),
+        "salary": result.get("gross_salary", 0.0),
+        "deductions": result.get("tds_paid", 0.0),
+        "gross_salary": result.get("gross_salary", 0.0),
+        "tds_paid": result.get("tds_paid", 0.0)
+    }
+
+
+# Passed through when the parser reports them (tradebook; Zerodha gives intraday):
+# intraday P&L is outside the four buckets, and unmatched sells / missing
+# FMVs mean the buckets are incomplete
+EQUITY_EXTRA_FIELDS = (
+    "intraday_pnl", "open_lots", "unmatched_sell_quantity", "grandfathering_missing_fmv",
+)
+
+
+def equity_data(result: dict, broker: str) -> dict:
+    """Broker report parser output as returned by /parse/equity"""
+    data = {
+        "broker": broker,
+        "stcg": result.get("stcg_after", 0.0),
+        "ltcg": result.get("ltcg_after", 0.0),
+        "stcg_before": result.get("stcg_before", 0.0),
+        "stcg_after": result.get("stcg_after", 0.0),
+        "ltcg_before": result.get("ltcg_before", 0.0),
+        "ltcg_after": result.get("ltcg_after", 0.0)
+    }
+    data.update({name: result[name] for name in EQUITY_EXTRA_FIELDS if name in result})
+    return data
+
+
+def mf_data(result: dict) -> dict:
+    """Mutual fund parser output as returned by /parse/mf"""
+    return {
+        "totalGains": result.get("equity_stcg", 0.0) + result.get("equity_ltcg", 0.0) + 
+                     result.get("debt_stcg", 0.0) + result.get("debt_ltcg", 0.0),
+        "equity_stcg": result.get("equity_stcg", 0.0),
+        "equity_ltcg": result.get("equity_ltcg", 0.0),
+        "debt_stcg": result.get("debt_stcg", 0.0),
+        "debt_ltcg": result.get("debt_ltcg", 0.0),
+        "specified_mf_gain": result.get("specified_mf_gain", 0.0),
+        "redemptions": result.get("redemptions", 0),
+        "unclassified_redemptions": result.get("unclassified_redemptions", 0),
+        "unclassified_gain": result.get("unclassified_gain", 0.0),
+        "unclassified_schemes": result.get("unclassified_schemes", []),
+        "breakdown_id": result.get("breakdown_id")
+    }
 
 
 @app.post("/parse/form16")
@@ -93,91 +449,108 @@ async def parse_form16(file: UploadFile = File(...)):
             raise HTTPException(status_code=400, detail="Only PDF files are supported")
         
         contents = await file.read()
-        pdf_file = io.BytesIO(contents)
-        
-        result = form16_parser.parse(pdf_file)
+        result = await run_parser("form16", contents)
         
         return {
             "success": True,
-            "data": {
-                "employer_name": result.get("employer_name", "Unknown"),
-                "salary": result.get("gross_salary", 0.0),
-                "deductions": result.get("tds_paid", 0.0),
-                "gross_salary": result.get("gross_salary", 0.0),
-                "tds_paid": result.get("tds_paid", 0.0)
-            }
+            "data": form16_data(result)
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error parsing Form-16: {str(e)}")
 
 
+async def run_equity_parser(contents: bytes, broker: Optional[str] = None) -> dict:
+    """
+    Detect the report format, parse with the matching parser and return
+    the /parse/equity data.
+
+    Raises:
+        HTTPException: 400 if the format is not recognised, plus the
+                    run_parser errors
+    """
+    from app.report_formats import UnknownFormatError, detect_equity_format
+
+    # Format detection and the parse cache are both keyed by the file hash
+    digest = await asyncio.to_thread(file_digest, contents)
+    try:
+        report_format = await asyncio.to_thread(detect_equity_format, contents, broker, digest)
+    except UnknownFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await run_parser(report_format.kind, contents, digest)
+    data = equity_data(result, report_format.broker)
+    data["format"] = report_format.kind
+    data["breakdown_id"] = result.get("breakdown_id")
+    return data
+
+
 @app.post("/parse/equity")
-async def parse_equity(file: UploadFile = File(...), broker: str = Form("groww")):
+async def parse_equity(file: UploadFile = File(...), broker: Optional[str] = Form(None)):
     """
-    Parse equity stock trades from broker Excel report.
+    Parse equity capital gains from a broker report.
     
-    Extracts STCG/LTCG data from trade-wise Excel reports.
+    The format is detected from the file itself (sheet names and header
+    rows), so ``broker`` is optional: Zerodha tax P&L, Groww capital gains
+    reports, raw tradebooks (FIFO-matched) and other brokers' P&L sheets
+    with recognisable columns are all accepted.
     Handles date-based tax rate changes (July 23, 2024).
     
     Args:
-        file: Excel file (.xlsx, .xls) with trade data
-        broker: Broker name ("groww" or "zerodha")
+        file: Excel (.xlsx, .xls) or CSV report
+        broker: Optional hint ("groww" or "zerodha"), only used when the
+                format is not recognised
         
     Returns:
         dict: {
             "success": True,
             "data": {
-                "broker": str,
+                "broker": str,         # detected: zerodha/groww/tradebook/other
+                "format": str,         # parser used
                 "stcg_before": float,  # STCG before July 23, 2024
                 "stcg_after": float,   # STCG after July 23, 2024
                 "ltcg_before": float,  # LTCG before July 23, 2024
-                "ltcg_after": float    # LTCG after July 23, 2024
+                "ltcg_after": float,   # LTCG after July 23, 2024
+                "breakdown_id": str,   # trade-level rows: GET /parse/breakdown/{id}
+                # tradebook only (Zerodha reports intraday_pnl too):
+                "intraday_pnl": float, # speculative, not in these buckets
+                "open_lots": int,
+                "unmatched_sell_quantity": float,  # sold but never bought in the file
+                "grandfathering_missing_fmv": int
             }
         }
         
     Raises:
-        HTTPException: 400 if file type invalid, 500 if parsing fails
+        HTTPException: 400 if file type or format invalid, 429 if parser pool
+                    is busy, 504 if parsing times out, 500 if parsing fails
         
     Notes:
-        - Zerodha parser not yet implemented (uses Groww parser as fallback)
         - Date-based split is critical for correct tax calculation
     """
+    from app.tradebook_parser import TradebookFormatError
+
     try:
-        if not file.filename.endswith(('.xlsx', '.xls')):
+        if not file.filename.lower().endswith(('.xlsx', '.xls', '.csv')):
             raise HTTPException(
                 status_code=400, 
-                detail="Only Excel files (.xlsx, .xls) are supported"
+                detail="Only Excel (.xlsx, .xls) or CSV files are supported"
             )
         
         contents = await file.read()
-        excel_file = io.BytesIO(contents)
-        
-        # Note: Zerodha parser not yet implemented
-        # Both brokers currently use Groww parser logic
-        if broker.lower() == "zerodha":
-            # Future: Implement Zerodha-specific parser
-            result = groww_parser.parse(excel_file)
-        else:
-            result = groww_parser.parse(excel_file)
         
         return {
             "success": True,
-            "data": {
-                "broker": broker,
-                "stcg": result.get("stcg_after", 0.0),
-                "ltcg": result.get("ltcg_after", 0.0),
-                "stcg_before": result.get("stcg_before", 0.0),
-                "stcg_after": result.get("stcg_after", 0.0),
-                "ltcg_before": result.get("ltcg_before", 0.0),
-                "ltcg_after": result.get("ltcg_after", 0.0)
-            }
+            "data": await run_equity_parser(contents, broker)
         }
     except HTTPException:
         raise
+    except TradebookFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500, 
-            detail=f"Error parsing {broker} report: {str(e)}"
+            detail=f"Error parsing equity report: {str(e)}"
         )
 
 
@@ -189,29 +562,314 @@ async def parse_groww(file: UploadFile = File(...)):
 
 @app.post("/parse/mf")
 async def parse_mutual_fund(file: UploadFile = File(...)):
-    """Parse Mutual Fund capital gains Excel report"""
+    """
+    Parse a mutual fund capital gains report: a CAMS / KFintech statement
+    (Excel or CSV) or the Groww capital gains Excel.
+    """
     try:
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="Only Excel files are supported")
+        if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
+            raise HTTPException(status_code=400, detail="Only Excel or CSV files are supported")
         
         contents = await file.read()
-        excel_file = io.BytesIO(contents)
-        
-        result = mf_parser.parse(excel_file)
+        result = await run_parser("mf", contents)
         
         return {
+            "success": True,
+            "data": mf_data(result)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error parsing MF report: {str(e)}")
+
+
+@app.post("/parse/tradebook")
+async def parse_tradebook(file: UploadFile = File(...)):
+    """
+    Compute equity capital gains from a raw tradebook (every buy and sell).
+
+    Sells are matched to buys FIFO per ISIN; each matched lot is classified
+    STCG/LTCG by its own holding period and split at the July 23, 2024
+    cut-off. Pre-2018 lots are grandfathered when an FMV file is configured.
+
+    Args:
+        file: Tradebook export (.csv, .xlsx), e.g. Zerodha Console tradebook
+
+    Returns:
+        dict: {
             "success": True,
             "data": {
-                "totalGains": result.get("equity_stcg", 0.0) + result.get("equity_ltcg", 0.0) + 
-                             result.get("debt_stcg", 0.0) + result.get("debt_ltcg", 0.0),
-                "equity_stcg": result.get("equity_stcg", 0.0),
-                "equity_ltcg": result.get("equity_ltcg", 0.0),
-                "debt_stcg": result.get("debt_stcg", 0.0),
-                "debt_ltcg": result.get("debt_ltcg", 0.0)
+                "stcg_before", "stcg_after", "ltcg_before", "ltcg_after": float,
+                "intraday_pnl": float,          # speculative, not in these buckets
+                "matched_lots": int,
+                "open_lots": int,               # still held at the end
+                "unmatched_sell_quantity": float,
+                "grandfathering_missing_fmv": int,
+                ...
             }
         }
+
+    Raises:
+        HTTPException: 400 if file type or layout invalid, 429 if parser pool
+                    is busy, 504 if parsing times out, 500 if parsing fails
+    """
+    from app.tradebook_parser import TradebookFormatError
+
+    try:
+        if not file.filename.lower().endswith(('.csv', '.xlsx')):
+            raise HTTPException(
+                status_code=400,
+                detail="Only CSV or Excel (.xlsx) tradebooks are supported"
+            )
+
+        contents = await file.read()
+        result = await run_parser("tradebook", contents)
+
+        return {
+            "success": True,
+            "data": result
+        }
+    except HTTPException:
+        raise
+    except TradebookFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error parsing MF report: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error parsing tradebook: {str(e)}")
+
+
+@app.get("/parse/breakdown/{breakdown_id}")
+def parse_breakdown(
+    breakdown_id: str,
+    offset: int = 0,
+    limit: int = 100,
+    symbol: Optional[str] = None,
+    bucket: Optional[str] = None,
+    format: str = "json"
+):
+    """
+    Page through the trade-level rows behind a parse result.
+
+    Rows come from the table stored when the file was parsed; nothing is
+    re-parsed. Each row has name, isin, buy_date, sell_date, quantity,
+    cost, proceeds, gain and bucket (stcg_before, ltcg_after, intraday, ...).
+
+    Args:
+        breakdown_id: ``breakdown_id`` from a parse response
+        offset, limit: Page window (limit at most 1000)
+        symbol: Keep rows whose name contains this text, or whose ISIN equals it
+        bucket: Keep rows in this bucket
+        format: "json" (a page) or "csv" (every matching row)
+
+    Returns:
+        dict: {"success": True, "data": {"total", "total_gain", "offset", "limit", "rows"}}
+
+    Raises:
+        HTTPException: 400 on an unknown bucket, 404 if the breakdown is
+                    unknown or expired (upload the file again)
+    """
+    table = breakdown_store.get(breakdown_id)
+    if table is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Breakdown not found or expired; upload the file again"
+        )
+
+    try:
+        if format == "csv":
+            return PlainTextResponse(
+                table.to_csv(table.select(symbol, bucket)),
+                media_type="text/csv",
+                headers={"Content-Disposition": f'attachment; filename="{breakdown_id}.csv"'}
+            )
+        return {"success": True, "data": table.page(offset, limit, symbol, bucket)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def resolve_rules(financial_year: Optional[str], regime: Optional[str]) -> TaxRules:
+    """
+    Look up compiled tax rules for a request.
+
+    Raises:
+        HTTPException: 400 if no rules exist for the year / regime
+    """
+    try:
+        return get_rules(financial_year, regime)
+    except UnknownRulesError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def build_tax_result(v: dict, calculated_at: str, rules: TaxRules = utils.DEFAULT_RULES) -> dict:
+    """
+    Shape computed tax amounts into the /calculate/tax response structure.
+
+    ``v`` maps the flat names produced by utils.calculate_tax_batch to
+    either scalars (one calculation) or lists (columnar batch output).
+    """
+    is_refund = v["net_payable"]
+    if isinstance(is_refund, list):
+        is_refund = [x < 0 for x in is_refund]
+    else:
+        is_refund = is_refund < 0
+
+    return {
+        # === PARSED STOCK GAINS (JSON display) ===
+        "parsedStockGains": {
+            "stcg_before": v["stcg_before"],
+            "stcg_after": v["stcg_after"],
+            "ltcg_before": v["ltcg_before"],
+            "ltcg_after": v["ltcg_after"]
+        },
+
+        # === STOCK TAX COMPUTATION ===
+        "stockTaxComputation": {
+            "stcgTax": v["stcg_tax"],
+            "ltcgTax": v["ltcg_tax"]
+        },
+
+        # === PARSED MUTUAL FUND GAINS (JSON display) ===
+        "parsedMutualFundGains": {
+            "equity_stcg": v["equity_stcg"],
+            "equity_ltcg": v["equity_ltcg"],
+            "debt_stcg": v["debt_stcg"],
+            "debt_ltcg": v["debt_ltcg"]
+        },
+
+        # === EQUITY MUTUAL FUNDS ===
+        "equityMutualFunds": {
+            "stcg": v["equity_stcg"],
+            "ltcg": v["equity_ltcg"],
+            "ltcgExemption": rules.ltcg_exemption,
+            "taxableLtcg": v["equity_mf_taxable_ltcg"],
+            "equityMfTax": v["mf_tax"]
+        },
+
+        # === DEBT MUTUAL FUNDS ===
+        "debtMutualFunds": {
+            "debtStcg": v["debt_stcg"],
+            "debtLtcg": v["debt_ltcg"],
+            "addedToIncome": v["debt_extra_income"]
+        },
+
+        # === FINAL TAX SUMMARY (4 columns) ===
+        "finalTaxSummary": {
+            "salaryPlusDebtMfTax": v["salary_tax"],
+            "stockCapitalGainsTax": v["stock_tax"],
+            "mutualFundEquityTax": v["mf_tax"],
+            "totalIncomeTaxBeforeCess": v["total_income_tax_before_cess"],
+            "cess": v["cess"],
+            "totalTaxLiability": v["total_tax_liability"]
+        },
+
+        # === NET PAYABLE / REFUND ===
+        "netPayable": v["net_payable"],
+        "isRefund": is_refund,
+
+        # === METADATA ===
+        "financialYear": rules.financial_year,
+        "regime": rules.regime,
+        "ruleVersion": rules.rule_version,
+        "calculatedAt": calculated_at
+    }
+
+
+@app.get("/tax/rules")
+def list_tax_rules():
+    """Financial years and regimes available for tax calculation"""
+    return {
+        "success": True,
+        "data": {
+            "default": get_rules().rule_version,
+            "rules": available_rules()
+        }
+    }
+
+
+def compute_tax(request: TaxCalculationRequest, rules: TaxRules) -> dict:
+    """
+    Tax for one set of inputs, in the /calculate/tax response structure.
+
+    Shared by /calculate/tax and /itr/compute.
+    """
+    # ============================================================
+    # STEP 1: Calculate Debt MF Income (added to salary)
+    # ============================================================
+    debt_extra_income = utils.calculate_debt_mf_taxable_income(
+        debt_stcg=request.debt_stcg,
+        debt_ltcg=request.debt_ltcg
+    )
+    
+    # ============================================================
+    # STEP 2: Calculate Salary Tax (includes debt MF)
+    # ============================================================
+    salary_res = utils.calculate_new_regime_tax(
+        gross_salary=request.gross_salary,
+        extra_income=debt_extra_income,
+        rules=rules
+    )
+    salary_tax = salary_res["salary_tax"]
+    
+    # ============================================================
+    # STEP 3: Calculate Equity Stock Tax
+    # ============================================================
+    stock_tax_res = utils.calculate_equity_stock_capital_gains_tax(
+        stcg_before=request.stcg_before,
+        stcg_after=request.stcg_after,
+        ltcg_before=request.ltcg_before,
+        ltcg_after=request.ltcg_after,
+        rules=rules
+    )
+    stock_tax = stock_tax_res["total_capital_gains_tax"]
+    
+    # ============================================================
+    # STEP 4: Calculate Equity MF Tax
+    # ============================================================
+    eq_mf_tax_res = utils.calculate_equity_mf_capital_gains_tax(
+        equity_stcg=request.equity_stcg,
+        equity_ltcg=request.equity_ltcg,
+        rules=rules
+    )
+    mf_tax = eq_mf_tax_res["total_capital_gains_tax"]
+    
+    # ============================================================
+    # STEP 5: Calculate Total Income Tax (before cess)
+    # ============================================================
+    total_income_tax_before_cess = salary_tax + stock_tax + mf_tax
+    
+    # ============================================================
+    # STEP 6: Apply 4% Health & Education Cess on TOTAL tax
+    # ============================================================
+    cess = total_income_tax_before_cess * rules.cess_rate
+    total_tax_liability = total_income_tax_before_cess + cess
+    
+    # ============================================================
+    # STEP 7: Calculate Net Payable / Refund
+    # ============================================================
+    net_payable = total_tax_liability - request.tds_paid
+    
+    # ============================================================
+    # STEP 6: Calculate Exemptions and Taxable Amounts
+    # ============================================================
+    # Equity MF LTCG exemption
+    equity_mf_taxable_ltcg = max(0, request.equity_ltcg - rules.ltcg_exemption)
+    
+    # ============================================================
+    # RETURN: Match Streamlit display structure EXACTLY
+    # ============================================================
+    return build_tax_result({
+        **request.dict(),
+        "debt_extra_income": debt_extra_income,
+        "salary_tax": salary_tax,
+        "stcg_tax": stock_tax_res["stcg_tax"],
+        "ltcg_tax": stock_tax_res["ltcg_tax"],
+        "stock_tax": stock_tax,
+        "mf_tax": mf_tax,
+        "equity_mf_taxable_ltcg": equity_mf_taxable_ltcg,
+        "total_income_tax_before_cess": total_income_tax_before_cess,
+        "cess": cess,
+        "total_tax_liability": total_tax_liability,
+        "net_payable": net_payable,
+    }, datetime.utcnow().isoformat() + "Z", rules)
 
 
 @app.post("/calculate/tax")
@@ -220,151 +878,320 @@ def calculate_tax(request: TaxCalculationRequest):
     Calculate tax EXACTLY as Streamlit does
     Returns same structure and values as Streamlit display
     """
+    rules = resolve_rules(request.financial_year, request.regime)
+
     try:
-        # ============================================================
-        # STEP 1: Calculate Debt MF Income (added to salary)
-        # ============================================================
-        debt_extra_income = utils.calculate_debt_mf_taxable_income(
-            debt_stcg=request.debt_stcg,
-            debt_ltcg=request.debt_ltcg
-        )
-        
-        # ============================================================
-        # STEP 2: Calculate Salary Tax (includes debt MF)
-        # ============================================================
-        salary_res = utils.calculate_new_regime_tax(
-            gross_salary=request.gross_salary,
-            extra_income=debt_extra_income
-        )
-        salary_tax = salary_res["salary_tax"]
-        
-        # ============================================================
-        # STEP 3: Calculate Equity Stock Tax
-        # ============================================================
-        stock_tax_res = utils.calculate_equity_stock_capital_gains_tax(
-            stcg_before=request.stcg_before,
-            stcg_after=request.stcg_after,
-            ltcg_before=request.ltcg_before,
-            ltcg_after=request.ltcg_after
-        )
-        stock_tax = stock_tax_res["total_capital_gains_tax"]
-        
-        # ============================================================
-        # STEP 4: Calculate Equity MF Tax
-        # ============================================================
-        eq_mf_tax_res = utils.calculate_equity_mf_capital_gains_tax(
-            equity_stcg=request.equity_stcg,
-            equity_ltcg=request.equity_ltcg
-        )
-        mf_tax = eq_mf_tax_res["total_capital_gains_tax"]
-        
-        # ============================================================
-        # STEP 5: Calculate Total Income Tax (before cess)
-        # ============================================================
-        total_income_tax_before_cess = salary_tax + stock_tax + mf_tax
-        
-        # ============================================================
-        # STEP 6: Apply 4% Health & Education Cess on TOTAL tax
-        # ============================================================
-        cess = total_income_tax_before_cess * utils.CESS_RATE
-        total_tax_liability = total_income_tax_before_cess + cess
-        
-        # ============================================================
-        # STEP 7: Calculate Net Payable / Refund
-        # ============================================================
-        net_payable = total_tax_liability - request.tds_paid
-        
-        # ============================================================
-        # STEP 6: Calculate Exemptions and Taxable Amounts
-        # ============================================================
-        # Equity MF LTCG exemption
-        equity_mf_ltcg_exemption = utils.LTCG_EXEMPTION
-        equity_mf_taxable_ltcg = max(0, request.equity_ltcg - utils.LTCG_EXEMPTION)
-        
-        # ============================================================
-        # RETURN: Match Streamlit display structure EXACTLY
-        # ============================================================
         return {
             "success": True,
-            "data": {
-                # === PARSED STOCK GAINS (JSON display) ===
-                "parsedStockGains": {
-                    "stcg_before": request.stcg_before,
-                    "stcg_after": request.stcg_after,
-                    "ltcg_before": request.ltcg_before,
-                    "ltcg_after": request.ltcg_after
-                },
-                
-                # === STOCK TAX COMPUTATION ===
-                "stockTaxComputation": {
-                    "stcgTax": stock_tax_res["stcg_tax"],
-                    "ltcgTax": stock_tax_res["ltcg_tax"]
-                },
-                
-                # === PARSED MUTUAL FUND GAINS (JSON display) ===
-                "parsedMutualFundGains": {
-                    "equity_stcg": request.equity_stcg,
-                    "equity_ltcg": request.equity_ltcg,
-                    "debt_stcg": request.debt_stcg,
-                    "debt_ltcg": request.debt_ltcg
-                },
-                
-                # === EQUITY MUTUAL FUNDS ===
-                "equityMutualFunds": {
-                    "stcg": request.equity_stcg,
-                    "ltcg": request.equity_ltcg,
-                    "ltcgExemption": equity_mf_ltcg_exemption,
-                    "taxableLtcg": equity_mf_taxable_ltcg,
-                    "equityMfTax": mf_tax
-                },
-                
-                # === DEBT MUTUAL FUNDS ===
-                "debtMutualFunds": {
-                    "debtStcg": request.debt_stcg,
-                    "debtLtcg": request.debt_ltcg,
-                    "addedToIncome": debt_extra_income
-                },
-                
-                # === FINAL TAX SUMMARY (4 columns) ===
-                "finalTaxSummary": {
-                    "salaryPlusDebtMfTax": salary_tax,
-                    "stockCapitalGainsTax": stock_tax,
-                    "mutualFundEquityTax": mf_tax,
-                    "totalIncomeTaxBeforeCess": total_income_tax_before_cess,
-                    "cess": cess,
-                    "totalTaxLiability": total_tax_liability
-                },
-                
-                # === NET PAYABLE / REFUND ===
-                "netPayable": net_payable,
-                "isRefund": net_payable < 0,
-                
-                # === METADATA ===
-                "calculatedAt": datetime.utcnow().isoformat() + "Z"
-            }
+            "data": compute_tax(request, rules)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating tax: {str(e)}")
 
 
+def batch_tax_response(columns: dict, fmt: str, rules: TaxRules) -> dict:
+    """
+    Run utils.calculate_tax_batch and shape the output.
+
+    Raises:
+        HTTPException: 400 on unknown/mismatched columns or format
+    """
+    if fmt not in ("rows", "columns"):
+        raise HTTPException(status_code=400, detail='format must be "rows" or "columns"')
+
+    try:
+        values = utils.calculate_tax_batch(rules=rules, **columns)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    calculated_at = datetime.utcnow().isoformat() + "Z"
+    count = len(values["gross_salary"])
+    lists = {k: a.tolist() for k, a in values.items()}
+
+    if fmt == "columns":
+        results = build_tax_result(lists, calculated_at, rules)
+    else:
+        keys = list(lists)
+        results = [
+            build_tax_result(dict(zip(keys, row)), calculated_at, rules)
+            for row in zip(*lists.values())
+        ]
+
+    return {
+        "success": True,
+        "data": {
+            "count": count,
+            "format": fmt,
+            "results": results
+        }
+    }
+
+
+@app.post("/calculate/tax/batch")
+def calculate_tax_batch(request: TaxBatchRequest):
+    """
+    Calculate tax for many people at once with the vectorized engine.
+
+    Each result has the same structure and values as /calculate/tax.
+    """
+    if (request.rows is None) == (request.columns is None):
+        raise HTTPException(status_code=400, detail='Provide exactly one of "rows" or "columns"')
+    rules = resolve_rules(request.financial_year, request.regime)
+
+    if request.rows is not None:
+        columns = {
+            name: [getattr(row, name) or 0.0 for row in request.rows]
+            for name in utils.BATCH_INPUT_COLUMNS
+        }
+    else:
+        columns = request.columns
+
+    try:
+        return batch_tax_response(columns, request.format, rules)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating tax: {str(e)}")
+
+
+@app.post("/calculate/tax/batch/csv")
+async def calculate_tax_batch_csv(
+    file: UploadFile = File(...),
+    format: str = Form("columns"),
+    financial_year: Optional[str] = Form(None),
+    regime: Optional[str] = Form(None)
+):
+    """
+    Batch tax calculation from a CSV upload.
+
+    The header row names the input columns (gross_salary, tds_paid,
+    stcg_before, ...); missing columns are treated as zeros.
+    """
+    try:
+        if not file.filename.endswith('.csv'):
+            raise HTTPException(status_code=400, detail="Only CSV files are supported")
+
+        import pandas as pd
+
+        contents = await file.read()
+        df = pd.read_csv(io.BytesIO(contents)).fillna(0.0)
+        columns = {name: df[name].to_numpy(dtype=float) for name in df.columns}
+
+        return batch_tax_response(columns, format, resolve_rules(financial_year, regime))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating tax: {str(e)}")
+
+
+# ============================================================
+# FULL ITR PIPELINE
+# ============================================================
+
+# Upload field -> (parser kind, accepted extensions)
+ITR_DOCUMENTS = {
+    "form16": ("form16", ('.pdf',)),
+    "equity": ("equity", ('.xlsx', '.xls', '.csv')),    # format detected per file
+    "mf": ("mf", ('.xlsx', '.xls', '.csv')),
+}
+
+
+def itr_document_data(document: str, result: dict) -> dict:
+    if document == "form16":
+        return form16_data(result)
+    return mf_data(result)
+
+
+def itr_partial_tax(document: str, data: dict, rules: TaxRules,
+                    gross_salary: Optional[float] = None) -> dict:
+    """
+    Tax component that one document determines on its own (streamed
+    before the final result). Salary tax here excludes debt MF income,
+    which the final result adds. ``gross_salary`` overrides the Form-16
+    value, as in itr_tax_request.
+    """
+    if document == "form16":
+        salary = gross_salary if gross_salary is not None else data["gross_salary"]
+        return utils.calculate_new_regime_tax(salary, rules=rules)
+    if document == "equity":
+        return utils.calculate_equity_stock_capital_gains_tax(
+            data["stcg_before"], data["stcg_after"],
+            data["ltcg_before"], data["ltcg_after"], rules=rules
+        )
+    return utils.calculate_equity_mf_capital_gains_tax(
+        data["equity_stcg"], data["equity_ltcg"], rules=rules
+    )
+
+
+def itr_tax_request(documents: Dict[str, dict], gross_salary: Optional[float],
+                    tds_paid: Optional[float]) -> TaxCalculationRequest:
+    """/calculate/tax inputs from parsed documents; explicit form values win"""
+    form16 = documents.get("form16", {})
+    equity = documents.get("equity", {})
+    mf = documents.get("mf", {})
+    return TaxCalculationRequest(
+        gross_salary=gross_salary if gross_salary is not None else form16.get("gross_salary", 0.0),
+        tds_paid=tds_paid if tds_paid is not None else form16.get("tds_paid", 0.0),
+        stcg_before=equity.get("stcg_before", 0.0),
+        stcg_after=equity.get("stcg_after", 0.0),
+        ltcg_before=equity.get("ltcg_before", 0.0),
+        ltcg_after=equity.get("ltcg_after", 0.0),
+        equity_stcg=mf.get("equity_stcg", 0.0),
+        equity_ltcg=mf.get("equity_ltcg", 0.0),
+        debt_stcg=mf.get("debt_stcg", 0.0),
+        debt_ltcg=mf.get("debt_ltcg", 0.0),
+    )
+
+
+def itr_result(documents: Dict[str, dict], request: TaxCalculationRequest, rules: TaxRules) -> dict:
+    return {
+        "itrType": "ITR-2" if ("equity" in documents or "mf" in documents) else "ITR-1",
+        "documents": documents,
+        "calculation": compute_tax(request, rules)
+    }
+
+
+def ndjson_event(data: dict) -> str:
+    return json.dumps(data) + "\n"
+
+
+@app.post("/itr/compute")
+async def compute_itr(
+    form16: Optional[UploadFile] = File(None),
+    equity: Optional[UploadFile] = File(None),
+    mf: Optional[UploadFile] = File(None),
+    broker: Optional[str] = Form(None),
+    gross_salary: Optional[float] = Form(None),
+    tds_paid: Optional[float] = Form(None),
+    financial_year: Optional[str] = Form(None),
+    regime: Optional[str] = Form(None),
+    stream: bool = Form(False)
+):
+    """
+    Parse every uploaded document and calculate tax in one call.
+
+    Replaces /parse/form16 + /parse/equity + /parse/mf + /calculate/tax.
+    All documents are optional; they are parsed concurrently in the worker
+    pool and the parsed amounts go straight into the /calculate/tax
+    computation. ``gross_salary`` / ``tds_paid`` override (or replace) the
+    Form-16 values.
+
+    Returns:
+        {"success": True, "data": {"itrType", "documents", "calculation"}}
+
+        With ``stream=true`` the response is NDJSON instead, one event per
+        line as work finishes:
+        {"event": "parsed", "document": ..., "data": ..., "tax": ...},
+        then {"event": "result", "data": ...} (or {"event": "error", ...}).
+
+    Raises:
+        HTTPException: 400 on wrong file types, 429/504 from the parser pool,
+                    500 if parsing fails
+    """
+    rules = resolve_rules(financial_year, regime)
+    uploads = {"form16": form16, "equity": equity, "mf": mf}
+
+    contents = {}
+    for document, upload in uploads.items():
+        if upload is None or not upload.filename:
+            continue
+        kind, extensions = ITR_DOCUMENTS[document]
+        if not upload.filename.lower().endswith(extensions):
+            raise HTTPException(
+                status_code=400,
+                detail=f"{document}: only {', '.join(extensions)} files are supported"
+            )
+        contents[document] = await upload.read()
+
+    async def parse(document: str):
+        if document == "equity":
+            return document, await run_equity_parser(contents[document], broker)
+        result = await run_parser(ITR_DOCUMENTS[document][0], contents[document])
+        return document, itr_document_data(document, result)
+
+    tasks = [asyncio.ensure_future(parse(document)) for document in contents]
+
+    if not stream:
+        try:
+            documents = dict(await asyncio.gather(*tasks))
+            request = itr_tax_request(documents, gross_salary, tds_paid)
+            return {"success": True, "data": itr_result(documents, request, rules)}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error computing ITR: {str(e)}")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def events():
+        documents = {}
+        try:
+            for finished in asyncio.as_completed(tasks):
+                document, data = await finished
+                documents[document] = data
+                yield ndjson_event({
+                    "event": "parsed",
+                    "document": document,
+                    "data": data,
+                    "tax": itr_partial_tax(document, data, rules, gross_salary)
+                })
+            request = itr_tax_request(documents, gross_salary, tds_paid)
+            yield ndjson_event({"event": "result", "data": itr_result(documents, request, rules)})
+        except HTTPException as e:
+            yield ndjson_event({"event": "error", "status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            yield ndjson_event({"event": "error", "status": 500, "detail": f"Error computing ITR: {str(e)}"})
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def chat_session_id(http_request: Request, response: Response) -> str:
+    """
+    Session ID from the X-Session-ID header or session cookie.
+
+    A new ID is issued when the client sent none; it is returned in both the
+    cookie and the X-Session-ID response header.
+    """
+    session_id = (
+        http_request.headers.get(SESSION_HEADER)
+        or http_request.cookies.get(SESSION_COOKIE)
+    )
+    if not session_id:
+        session_id = new_session_id()
+        response.set_cookie(SESSION_COOKIE, session_id, httponly=True, samesite="lax")
+    response.headers[SESSION_HEADER] = session_id
+    return session_id
+
+
 @app.post("/chatbot/message")
-def chatbot_message(request: ChatbotRequest):
+async def chatbot_message(request: ChatbotRequest, http_request: Request, response: Response):
     """
     Tax advisor chatbot endpoint
     Accepts user message and context, returns AI-generated response
     """
     try:
+        session_id = chat_session_id(http_request, response)
+        # The SQLite backend blocks (up to its busy timeout); keep it off the loop
+        chatbot = await asyncio.to_thread(chat_sessions.load, session_id)
+
         # Update chatbot context if provided
         if request.user_context:
             chatbot.set_user_context(request.user_context)
         
         # Generate response
-        response = chatbot.generate_response(request.message, use_ollama=True)
+        reply = await chatbot.agenerate_response(request.message, ollama, response_cache)
+        await asyncio.to_thread(chat_sessions.save, session_id, chatbot)
         
         return {
             "success": True,
             "data": {
-                "message": response,
+                "message": reply,
+                "session_id": session_id,
+                "timings": chatbot.last_timings,
                 "timestamp": datetime.utcnow().isoformat() + "Z"
             }
         }
@@ -372,14 +1199,70 @@ def chatbot_message(request: ChatbotRequest):
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
 
 
+def sse_event(data: dict) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/chatbot/stream")
+async def chatbot_stream(request: ChatbotRequest, http_request: Request):
+    """
+    Tax advisor chatbot with the reply streamed as server-sent events.
+
+    Each event is ``data: {"token": "..."}``; the last one is
+    ``data: {"done": true, "session_id": ..., "timings": ..., "timestamp": ...}``
+    (timings are Ollama's prompt/eval token counts and durations). If the
+    client disconnects mid-reply, generation is cancelled and the exchange
+    is not saved to the session. If Ollama fails mid-reply, the last event
+    is ``data: {"error": ..., "truncated": true}`` and the exchange is not
+    saved either.
+    """
+    async def events():
+        replies = chatbot.astream_response(request.message, ollama, response_cache)
+        try:
+            async for token in replies:
+                if await http_request.is_disconnected():
+                    return
+                yield sse_event({"token": token})
+        except OllamaError as e:
+            yield sse_event({"error": f"The reply was interrupted: {str(e)}", "truncated": True})
+            return
+        except Exception as e:
+            yield sse_event({"error": f"Chatbot error: {str(e)}"})
+            return
+        finally:
+            # Closes the upstream Ollama request if we stopped early
+            await replies.aclose()
+
+        await asyncio.to_thread(chat_sessions.save, session_id, chatbot)
+        yield sse_event({
+            "done": True,
+            "session_id": session_id,
+            "timings": chatbot.last_timings,
+            "timestamp": datetime.utcnow().isoformat() + "Z"
+        })
+
+    # events() only runs once the response starts streaming
+    response = StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
+    )
+    session_id = chat_session_id(http_request, response)
+    chatbot = await asyncio.to_thread(chat_sessions.load, session_id)
+    if request.user_context:
+        chatbot.set_user_context(request.user_context)
+    return response
+
+
 @app.get("/chatbot/history")
-def get_chatbot_history():
+async def get_chatbot_history(http_request: Request, response: Response):
     """Get chatbot conversation history"""
     try:
+        session_id = chat_session_id(http_request, response)
+        chatbot = await asyncio.to_thread(chat_sessions.load, session_id)
         return {
             "success": True,
             "data": {
-                "history": chatbot.get_conversation_history()
+                "history": chatbot.get_conversation_history(),
+                "session_id": session_id
             }
         }
     except Exception as e:
@@ -387,10 +1270,10 @@ def get_chatbot_history():
 
 
 @app.post("/chatbot/clear")
-def clear_chatbot_history():
+async def clear_chatbot_history(http_request: Request, response: Response):
     """Clear chatbot conversation history"""
     try:
-        chatbot.clear_history()
+        await asyncio.to_thread(chat_sessions.delete, chat_session_id(http_request, response))
         return {
             "success": True,
             "message": "Conversation history cleared"
@@ -399,6 +1282,23 @@ def clear_chatbot_history():
         raise HTTPException(status_code=500, detail=f"Error clearing history: {str(e)}")
 
 
+@app.get("/chatbot/sessions/stats")
+def chatbot_session_stats():
+    """Chat session store usage, LLM slot usage, cache hits and intent routing"""
+    return {
+        "success": True,
+        "data": {
+            **chat_sessions.stats(),
+            "llm": ollama.stats(),
+            "response_cache": response_cache.stats(),
+            "intent_router": intent_router.stats()
+        }
+    }
+
+
+startup.mark("app_imported")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
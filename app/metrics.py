@@ -0,0 +1,353 @@
+"""
+Metrics: Prometheus Text Exposition and Per-Stage Parse Timing
+
+A small in-process metrics registry (counters and histograms, plus
+collector callbacks read at scrape time) rendered in the Prometheus text
+format by GET /metrics, and a timing layer for the parsers.
+
+Parsers run in worker processes, so they cannot update this process's
+registry directly. Instead ``run_parse`` opens a trace around each job;
+parser code marks its stages (``with metrics.stage("ocr_page")``) and the
+fallback paths it takes (``metrics.fallback("form16", "ocr")``) on the
+active trace, and the trace travels back with the parse result (under
+TRACE_KEY), where ``record_trace`` adds it to the registry. Outside a
+trace, ``stage`` costs one context variable lookup and records nothing.
+
+Under gunicorn every API worker has its own registry; a scrape of the
+shared port sees one worker's counters.
+
+Configuration (environment variables):
+    SMARTTAX_METRICS: Set to 0 to disable request timing, parse traces
+        and GET /metrics (default: 1)
+
+Author: SmartTax Team
+"""
+
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("SMARTTAX_METRICS", "1") != "0"
+
+# Key under which a parse result carries its trace out of the worker
+TRACE_KEY = "_trace"
+
+# Seconds; covers a health check (~1 ms) up to a slow OCR parse
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (labels, value) pairs of one metric, as returned by collectors
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> Iterator[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total))
+                            for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {round(total, 6)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class Registry:
+    """Named metrics plus collectors that report other objects' stats at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]):
+        """
+        Register ``collect``, called on every scrape; it yields
+        ``(name, type, help, samples)`` with type "counter" or "gauge".
+        Usable as a decorator.
+        """
+        with self._lock:
+            self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+
+        for collect in collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    names = tuple(labels)
+                    values = tuple(labels[n] for n in names)
+                    lines.append(f"{name}{_format_labels(names, values)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "smarttax_http_request_duration_seconds", "Request latency by route",
+    ("method", "route", "status"))
+PARSE_REQUESTS = REGISTRY.counter(
+    "smarttax_parse_requests_total", "Parse requests by parser and outcome",
+    ("parser", "outcome"))
+PARSE_SECONDS = REGISTRY.histogram(
+    "smarttax_parse_seconds", "Time a parse job ran in its worker", ("parser",))
+PARSE_WAIT_SECONDS = REGISTRY.histogram(
+    "smarttax_parse_wait_seconds",
+    "Time a parse job spent queued for and travelling to / from a worker", ("parser",))
+STAGE_SECONDS = REGISTRY.histogram(
+    "smarttax_parser_stage_seconds", "Time spent in each parser stage", ("parser", "stage"))
+FALLBACKS = REGISTRY.counter(
+    "smarttax_fallbacks_total", "Fallback paths taken", ("component", "path"))
+LLM_TOKENS = REGISTRY.counter(
+    "smarttax_llm_tokens_total", "Tokens evaluated by Ollama", ("phase",))
+LLM_SECONDS = REGISTRY.histogram(
+    "smarttax_llm_duration_seconds", "Ollama time per reply, as reported by Ollama",
+    ("phase",))
+
+
+# ============================================================
+# PARSE TRACES
+# ============================================================
+
+class Trace:
+    """Stage timings and fallbacks of one parse job"""
+
+    def __init__(self):
+        # list.append is atomic, so threads started by the parser (OCR) may record too
+        self.stages: List[Tuple[str, float]] = []
+        self.fallbacks: List[Tuple[str, str]] = []
+        self.seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {"seconds": self.seconds, "stages": self.stages, "fallbacks": self.fallbacks}
+
+
+_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("smarttax_trace",
+                                                                       default=None)
+
+
+@contextmanager
+def trace(enabled: bool = METRICS_ENABLED) -> Iterator[Optional[Trace]]:
+    """Collect stages and fallbacks recorded in this context (None if disabled)"""
+    if not enabled:
+        yield None
+        return
+
+    current = Trace()
+    token = _trace.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        current.seconds = time.perf_counter() - start
+        _trace.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as parser stage ``name`` of the active trace"""
+    current = _trace.get()
+    if current is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.stages.append((name, time.perf_counter() - start))
+
+
+def fallback(component: str, path: str):
+    """Count a fallback path; on the active trace if there is one"""
+    current = _trace.get()
+    if current is not None:
+        current.fallbacks.append((component, path))
+    elif METRICS_ENABLED:
+        FALLBACKS.inc(component=component, path=path)
+
+
+def in_context(fn: Callable) -> Callable:
+    """
+    ``fn`` bound to the caller's context, for submitting to a thread pool
+    (threads do not inherit context variables, so stages they record
+    would otherwise be lost).
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def record_trace(parser: str, data: Optional[dict], elapsed: float):
+    """Add a trace returned by a worker to the registry; ``elapsed`` is the caller's wait"""
+    if not data:
+        return
+    PARSE_SECONDS.observe(data["seconds"], parser=parser)
+    PARSE_WAIT_SECONDS.observe(max(0.0, elapsed - data["seconds"]), parser=parser)
+    for name, seconds in data["stages"]:
+        STAGE_SECONDS.observe(seconds, parser=parser, stage=name)
+    for component, path in data["fallbacks"]:
+        FALLBACKS.inc(component=component, path=path)
+
+
+# ============================================================
+# HTTP MIDDLEWARE
+# ============================================================
+
+_route_paths: Dict[Callable, str] = {}
+
+
+def route_template(scope) -> str:
+    """
+    Path template of the route that handled ``scope`` (after the app ran),
+    e.g. ``/parse/breakdown/{breakdown_id}``; "unmatched" if none did
+    """
+    route = scope.get("route")
+    if route is not None:
+        return getattr(route, "path", "unmatched")
+    # Older Starlette only leaves the endpoint in the scope
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _route_paths:
+        app = scope.get("app")
+        for candidate in getattr(getattr(app, "router", None), "routes", ()):
+            if getattr(candidate, "endpoint", None) is endpoint:
+                _route_paths[endpoint] = candidate.path
+                break
+        else:
+            _route_paths[endpoint] = "unmatched"
+    return _route_paths[endpoint]
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording each request's latency by route template
+    (not the raw path, so IDs do not create new series)
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"],
+                                 route=route_template(scope), status=status)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,285 @@
+"""
+Mutual Fund Capital Gains Statement Parser (Transaction Level)
+
+Reads redemption-level capital gains statements: CAMS / KFintech
+consolidated statements (Excel or CSV export, one block per AMC) and the
+Groww mutual fund capital gains detail sheet. Every sheet is scanned for
+header rows (matched against COLUMN_ALIASES), so repeated headers, AMC
+title rows and blank separator lines between blocks are all fine. Scheme
+title rows ("HDFC Flexi Cap Fund - Growth (INF179K01UT0)") name the scheme
+for the redemptions below them when those rows leave it blank.
+
+Each redemption is then classified in bulk:
+
+- Scheme category (equity / debt / other) from app.scheme_index, once per
+  distinct scheme
+- Term, from the statement's own short/long term columns when it has
+  them (a redemption with both amounts is split between the two
+  buckets), else by holding period: equity long term after 12 months; other
+  funds after 36 months (24 months for redemptions from 23 Jul 2024)
+- Specified mutual funds (Section 50AA): debt units bought from
+  1 Apr 2023 are always short term; so are "other" units bought from
+  1 Apr 2023 and redeemed before 1 Apr 2025, when the definition changed
+
+Output uses the same keys as the summary reader (equity_stcg/ltcg,
+debt_stcg/ltcg; "other" funds are reported with debt) plus
+``specified_mf_gain`` and counts. Gains are taken from the statement's
+gain columns when present (already grandfathered), else proceeds - cost.
+Redemptions of schemes the index cannot classify are left out of the
+buckets and reported in ``unclassified_redemptions``,
+``unclassified_gain`` and ``unclassified_schemes`` (their breakdown rows
+use the ``unclassified`` bucket), so the user can check them instead of
+having equity gains silently taxed as debt.
+
+Author: SmartTax Team
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from app import metrics
+from app.breakdown import BUCKET_CODES, Breakdown
+from app.column_mapped_parser import match_columns
+from app.excel_reader import iter_sheets
+from app.scheme_index import DEBT, EQUITY, OTHER, UNKNOWN, classify_column
+from app.tradebook_parser import long_term_after, parse_numbers, parse_times
+
+# Section 50AA applies to units bought on or after this date
+SPECIFIED_MF_FROM = np.datetime64("2023-04-01")
+
+# From FY 2025-26 only >65% debt funds are specified mutual funds
+SPECIFIED_MF_REDEFINED = np.datetime64("2025-04-01")
+
+# Non-equity funds redeemed from this date are long term after 24 months
+SHORTER_HOLDING_FROM = np.datetime64("2024-07-23")
+
+EQUITY_HOLDING_MONTHS = 12
+OTHER_HOLDING_MONTHS = 36
+OTHER_HOLDING_MONTHS_AFTER = 24
+
+# Unclassified scheme names listed in the result
+MAX_UNCLASSIFIED_SCHEMES = 20
+
+# Canonical column -> header names, most specific first
+COLUMN_ALIASES = {
+    "scheme": ("scheme name", "name of the scheme", "scheme_name", "fund name",
+               "scheme", "mutual fund", "fund"),
+    "isin": ("isin", "isin no", "isin code"),
+    "amfi_code": ("amfi code", "amfi scheme code", "amfi", "scheme code"),
+    "category": ("asset class", "asset category", "scheme category",
+                 "fund category", "category", "fund type", "scheme type", "asset type"),
+    "sell_date": ("redemption date", "redeem date", "date of redemption",
+                  "redeemed on", "sale date", "sell date", "date of sale", "date"),
+    "buy_date": ("purchase date", "date of purchase", "buy date", "acquisition date",
+                 "purchased on", "investment date", "date_1"),
+    "units": ("redeemed units", "redemption units", "units redeemed", "matched quantity",
+              "redeemed quantity", "redunits",
+              "red units", "units", "quantity"),
+    "cost": ("purchase value", "purchase amount", "purchase cost", "cost of acquisition",
+             "acquisition cost", "invested value", "invested amount", "buy value", "cost"),
+    "proceeds": ("redemption value", "redemption amount", "redeem value", "sale value",
+                 "sale consideration", "sell value", "amount"),
+    "gain": ("capital gain", "capital gains", "gain/loss", "gain / loss", "realised gain",
+             "realized gain", "total gain", "gain", "p&l", "profit/loss"),
+    "stcg": ("short term", "stcg", "short term gain", "short term capital gain", "short-term"),
+    "ltcg": ("long term without index", "long term", "ltcg", "long term gain",
+             "long term capital gain", "long-term"),
+}
+
+# Cheap pre-check before a full header match on every row
+_HEADER_WORDS = frozenset(alias for names in COLUMN_ALIASES.values() for alias in names)
+
+_ISIN = re.compile(r"\bINF[A-Z0-9]{9}\b")
+
+
+def resolve_header(row: Sequence[Any]) -> Optional[Dict[str, int]]:
+    """Column indices if ``row`` is a redemption table header, else None"""
+    cells = {str(v).strip().lower() for v in row if v is not None}
+    if len(cells & _HEADER_WORDS) < 3:
+        return None
+    columns = match_columns(row, COLUMN_ALIASES)
+    has_gain = ("gain" in columns or "stcg" in columns or "ltcg" in columns
+                or {"cost", "proceeds"} <= columns.keys())
+    if {"scheme", "sell_date", "buy_date"} <= columns.keys() and has_gain:
+        return columns
+    return None
+
+
+def _text(value: Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def _cell(row: Sequence[Any], idx: int) -> Any:
+    """``row[idx]``, with blank CSV cells as None like Excel's empty cells"""
+    value = row[idx] if idx < len(row) else None
+    return None if isinstance(value, str) and not value.strip() else value
+
+
+class MFStatementParser:
+    """Transaction-level MF capital gains (see module docstring)"""
+
+    def parse(self, file) -> dict:
+        with metrics.stage("section_scan"):
+            data = self.read(file)
+        with metrics.stage("compute"):
+            return self.compute(data)
+
+    def parse_with_breakdown(self, file):
+        with metrics.stage("section_scan"):
+            data = self.read(file)
+        parts = []
+        with metrics.stage("compute"):
+            result = self.compute(data, breakdown=parts)
+        return result, Breakdown.concat(parts)
+
+    def read(self, file) -> Dict[str, List[Any]]:
+        """Redemption rows from every sheet, as canonical columns (all present)"""
+        data: Dict[str, List[Any]] = {name: [] for name in COLUMN_ALIASES}
+        for _, rows in iter_sheets(file):
+            self.read_rows(rows, data)
+        return data
+
+    def read_rows(self, rows: Iterable[Sequence[Any]], data: Dict[str, List[Any]]):
+        columns: Optional[Dict[str, int]] = None
+        scheme = isin = ""
+
+        for row in rows:
+            header = resolve_header(row)
+            if header is not None:
+                columns = header
+                scheme = isin = ""
+                continue
+            if columns is None:
+                continue
+
+            values = {name: _cell(row, idx) for name, idx in columns.items()}
+            if values["sell_date"] is None and values["buy_date"] is None:
+                # Scheme title row (or AMC name / total / blank): keep its scheme
+                title = next((_text(v) for v in row if _text(v)), "")
+                if title and not title.lower().startswith("total"):
+                    match = _ISIN.search(title)
+                    isin = match.group(0) if match else ""
+                    scheme = re.sub(r"\s*\(\s*" + isin + r"\s*\)", "", title) if isin else title
+                continue
+
+            if not _text(values.get("scheme")):
+                values["scheme"] = scheme
+                if not _text(values.get("isin")):
+                    values["isin"] = isin
+            for name in COLUMN_ALIASES:
+                data[name].append(values.get(name))
+
+    def compute(self, data: Dict[str, List[Any]], breakdown: Optional[list] = None) -> dict:
+        """Bucket totals; with a ``breakdown`` list, also append one row per redemption"""
+        sell = parse_times(data["sell_date"]).astype("datetime64[D]")
+        buy = parse_times(data["buy_date"]).astype("datetime64[D]")
+        valid = ~np.isnat(sell) & ~np.isnat(buy)
+
+        cost = parse_numbers(data["cost"])
+        proceeds = parse_numbers(data["proceeds"])
+        stcg = parse_numbers(data["stcg"])
+        ltcg = parse_numbers(data["ltcg"])
+        has_gain = np.array([v is not None for v in data["gain"]], dtype=bool)
+        has_split = np.array([s is not None or l is not None
+                              for s, l in zip(data["stcg"], data["ltcg"])], dtype=bool)
+        gain = np.where(has_gain, parse_numbers(data["gain"]),
+                        np.where(has_split, stcg + ltcg, proceeds - cost))
+
+        category = classify_column(data["scheme"], data["isin"], data["category"],
+                                   data["amfi_code"])
+        is_equity = category == EQUITY
+        is_debt = (category == DEBT) | (category == OTHER)
+        unclassified = valid & (category == UNKNOWN)
+
+        # Holding period rules
+        other_months = np.where(sell >= SHORTER_HOLDING_FROM,
+                                OTHER_HOLDING_MONTHS_AFTER, OTHER_HOLDING_MONTHS)
+        held_long = np.where(
+            is_equity,
+            sell > long_term_after(buy, EQUITY_HOLDING_MONTHS),
+            np.where(other_months == OTHER_HOLDING_MONTHS_AFTER,
+                     sell > long_term_after(buy, OTHER_HOLDING_MONTHS_AFTER),
+                     sell > long_term_after(buy, OTHER_HOLDING_MONTHS)),
+        )
+        bought_recently = buy >= SPECIFIED_MF_FROM
+        specified = bought_recently & (
+            (category == DEBT) | ((category == OTHER) & (sell < SPECIFIED_MF_REDEFINED))
+        )
+
+        # The statement's own split wins where it has one; a redemption
+        # covering lots on both sides of the holding period has both
+        # amounts, each going to its own bucket
+        split_known = has_split & ((stcg != 0) | (ltcg != 0))
+        short_gain = np.where(split_known, stcg, np.where(held_long, 0.0, gain))
+        long_gain = np.where(split_known, ltcg, np.where(held_long, gain, 0.0))
+        short_gain = np.where(specified, short_gain + long_gain, short_gain)
+        long_gain = np.where(specified, 0.0, long_gain)
+        is_long = (long_gain != 0) & (short_gain == 0)
+
+        result = {
+            "equity_stcg": round(float(short_gain[valid & is_equity].sum()), 2),
+            "equity_ltcg": round(float(long_gain[valid & is_equity].sum()), 2),
+            "debt_stcg": round(float(short_gain[valid & is_debt].sum()), 2),
+            "debt_ltcg": round(float(long_gain[valid & is_debt].sum()), 2),
+        }
+        schemes = np.asarray(data["scheme"], dtype=object)
+        result.update({
+            "specified_mf_gain": round(float(gain[valid & specified].sum()), 2),
+            "redemptions": int(valid.sum()),
+            "schemes": len({_text(s) for s in schemes[valid]}),
+            "skipped_rows": int((~valid).sum()),
+            "unclassified_redemptions": int(unclassified.sum()),
+            "unclassified_gain": round(float((short_gain + long_gain)[unclassified].sum()), 2),
+            "unclassified_schemes": sorted({_text(s) for s in schemes[unclassified]})[
+                :MAX_UNCLASSIFIED_SCHEMES],
+        })
+
+        if breakdown is not None:
+            short_code = np.where(is_equity, BUCKET_CODES["equity_stcg"],
+                                  BUCKET_CODES["debt_stcg"]).astype(np.int8)
+            long_code = np.where(is_equity, BUCKET_CODES["equity_ltcg"],
+                                 BUCKET_CODES["debt_ltcg"]).astype(np.int8)
+            short_code[unclassified] = long_code[unclassified] = BUCKET_CODES["unclassified"]
+            units = parse_numbers(data["units"])
+            isins = np.asarray(data["isin"], dtype=object)
+            row_gain = short_gain + long_gain
+            row_cost = np.where(has_gain | has_split, proceeds - row_gain, cost)
+
+            # A split redemption becomes two rows, its units, cost and
+            # proceeds shared pro rata by gain so each row reconciles
+            # (proceeds - cost = gain). With a gain and a loss there is no
+            # meaningful share; those two rows carry only their gains.
+            both = valid & (long_gain != 0) & (short_gain != 0)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                short_share = np.where(both & (short_gain * long_gain > 0),
+                                       short_gain / row_gain, np.nan)
+            share = np.where(both, short_share, 1.0)
+            breakdown.append(Breakdown.from_columns(
+                int(valid.sum()),
+                np.where(is_long, long_code, short_code)[valid],
+                name=schemes[valid],
+                isin=isins[valid],
+                buy_date=buy[valid],
+                sell_date=sell[valid],
+                quantity=(units * share)[valid],
+                cost=(row_cost * share)[valid],
+                proceeds=(proceeds * share)[valid],
+                gain=np.where(is_long, long_gain, short_gain)[valid],
+            ))
+            if both.any():
+                long_share = 1.0 - short_share[both]
+                breakdown.append(Breakdown.from_columns(
+                    int(both.sum()),
+                    long_code[both],
+                    name=schemes[both],
+                    isin=isins[both],
+                    buy_date=buy[both],
+                    sell_date=sell[both],
+                    quantity=units[both] * long_share,
+                    cost=row_cost[both] * long_share,
+                    proceeds=proceeds[both] * long_share,
+                    gain=long_gain[both],
+                ))
+        return result
@@ -1,15 +1,54 @@
 import pandas as pd
 
+from app import metrics
+from app.breakdown import Breakdown
+from app.excel_reader import can_stream, cell, iter_sheet_rows
+from app.mf_statement_parser import MFStatementParser
+from app.scheme_index import EQUITY, category_from_label, category_from_name
+
 
 class MutualFundCapitalGainsParser:
     """
-    Parser for Groww Mutual Fund Capital Gains SUMMARY sheet
-    (exactly matching rows 11–13 in your Excel)
+    Parser for mutual fund capital gains reports.
+
+    Redemption-level statements (CAMS / KFintech CAS, Groww detail sheet)
+    are classified per redemption by MFStatementParser. Files without a
+    redemption table fall back to the Groww Capital Gains SUMMARY sheet
+    (exactly matching rows 11–13 in your Excel).
     """
 
     def parse(self, file):
+        return self.parse_with_breakdown(file)[0]
+
+    def parse_with_breakdown(self, file):
+        statement = MFStatementParser()
+        with metrics.stage("section_scan"):
+            data = statement.read(file)
+        if data["sell_date"]:
+            parts = []
+            with metrics.stage("compute"):
+                result = statement.compute(data, breakdown=parts)
+            return result, Breakdown.concat(parts)
+
+        metrics.fallback("mf", "summary")
+        file.seek(0)
+        with metrics.stage("summary_scan"):
+            return self.parse_summary(file), Breakdown.from_columns(0, 0)
+
+    def parse_summary(self, file):
+        if can_stream(file):
+            return self.parse_rows(iter_sheet_rows(file))
+
         df = pd.read_excel(file, header=None)
+        return self.parse_rows(df.itertuples(index=False, name=None))
 
+    def parse_rows(self, rows):
+        """
+        Read the summary table from an iterator of sheet rows.
+
+        Stops reading as soon as the table ends, so with the streaming
+        reader the rest of the workbook is never loaded.
+        """
         result = {
             "equity_stcg": 0.0,
             "equity_ltcg": 0.0,
@@ -17,48 +56,60 @@ class MutualFundCapitalGainsParser:
             "debt_ltcg": 0.0,
         }
 
-        header_row_index = None
+        rows = iter(rows)
 
         # --------------------------------------------------
         # 1. Find the header row: "Asset Class / Category"
         # --------------------------------------------------
-        for i, row in df.iterrows():
-            cell = str(row[2]).strip().lower()  # column C
-            if cell == "asset class / category":
-                header_row_index = i
+        for row in rows:
+            header = str(cell(row, 2)).strip().lower()  # column C
+            if header == "asset class / category":
                 break
-
-        if header_row_index is None:
+        else:
             # Header not found → return zeros safely
             return result
 
         # --------------------------------------------------
         # 2. Parse rows BELOW header (actual data rows)
         # --------------------------------------------------
-        for _, row in df.iloc[header_row_index + 1:].iterrows():
-            label = str(row[2]).strip().lower()  # Column C
+        for row in rows:
+            label = cell(row, 2)  # Column C
 
             # Stop if table ends
+            if label is None or pd.isna(label):
+                break
+            label = str(label).strip().lower()
             if not label or label == "nan":
                 break
 
-            stcg = self._parse_amount(row[3])  # Column D
-            ltcg = self._parse_amount(row[4])  # Column E
+            # "Total", "Grand Total", "Sub-total (Debt)" repeat other rows
+            if "total" in label:
+                continue
+
+            # Hybrid / "Debt - Others" / FoF rows go by their tax category;
+            # FoF / overseas are taxed like debt. Rows the label does not
+            # classify are skipped rather than guessed.
+            category = category_from_label(label) or category_from_name(label)
+            if category is None:
+                continue
+
+            stcg = self._parse_amount(cell(row, 3))  # Column D
+            ltcg = self._parse_amount(cell(row, 4))  # Column E
 
             # ---------------- EQUITY ----------------
-            if label == "equity":
+            if category == EQUITY:
                 result["equity_stcg"] += stcg
                 result["equity_ltcg"] += ltcg
 
             # ---------------- DEBT ----------------
-            elif "debt" in label:
+            else:
                 result["debt_stcg"] += stcg
                 result["debt_ltcg"] += ltcg
 
         return result
 
     def _parse_amount(self, val):
-        if pd.isna(val):
+        if val is None or pd.isna(val):
             return 0.0
 
         try:
@@ -0,0 +1,362 @@
+"""
+Async Ollama Client
+
+One shared ``httpx.AsyncClient`` per process talks to the local Ollama
+server, so chat requests reuse pooled keep-alive connections instead of
+opening a new one per message. Generations can be awaited whole or
+streamed token by token as Ollama emits them (NDJSON), and a concurrency
+limiter in front of the model keeps a burst of chats from piling onto a
+single local LLM.
+
+Closing a streaming response (e.g. because the HTTP client disconnected)
+closes the upstream connection, which makes Ollama stop generating.
+
+Requests ask Ollama to keep the model loaded (``keep_alive``) so its
+prompt cache survives between turns; Ollama then only evaluates the part
+of the prompt that changed since the previous request. The timing fields
+of each reply (prompt_eval_count/duration etc.) are collected so the
+effect is visible per turn, in aggregate and in GET /metrics.
+
+A circuit breaker (app/circuit_breaker.py) tracks the failure rate of
+calls. Once Ollama is found dead, chats fail over to the rule-based
+answers immediately instead of each waiting for a timeout. A background
+health check polls ``/api/tags``, keeping the breaker open while Ollama
+is unreachable and letting a probe through as soon as it is back.
+
+Configuration (environment variables):
+    SMARTTAX_OLLAMA_URL: Ollama base URL (default: http://localhost:11434)
+    SMARTTAX_OLLAMA_MODEL: Model name (default: phi3:mini)
+    SMARTTAX_OLLAMA_TIMEOUT: Seconds to wait for the next chunk (default: 30)
+    SMARTTAX_OLLAMA_CONCURRENCY: Generations running at once (default: 2)
+    SMARTTAX_OLLAMA_QUEUE_TIMEOUT: Seconds a chat may wait for a free slot
+        before failing over (default: 10)
+    SMARTTAX_OLLAMA_KEEP_ALIVE: How long Ollama keeps the model (and its
+        prompt cache) loaded after a request (default: 30m)
+    SMARTTAX_LLM_FAILURE_RATE: Failure rate that opens the breaker (default: 0.5)
+    SMARTTAX_LLM_MIN_CALLS: Calls needed before the rate counts (default: 4)
+    SMARTTAX_LLM_OPEN_SECONDS: Seconds the breaker stays open before
+        probing (default: 30)
+    SMARTTAX_LLM_HEALTH_INTERVAL: Seconds between /api/tags checks
+        (default: 15, 0 disables)
+
+Author: SmartTax Team
+"""
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from app import metrics
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+OLLAMA_URL = os.getenv("SMARTTAX_OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("SMARTTAX_OLLAMA_MODEL", "phi3:mini")
+OLLAMA_TIMEOUT = float(os.getenv("SMARTTAX_OLLAMA_TIMEOUT", "30"))
+OLLAMA_CONCURRENCY = int(os.getenv("SMARTTAX_OLLAMA_CONCURRENCY", "2"))
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("SMARTTAX_OLLAMA_QUEUE_TIMEOUT", "10"))
+OLLAMA_KEEP_ALIVE = os.getenv("SMARTTAX_OLLAMA_KEEP_ALIVE", "30m")
+LLM_FAILURE_RATE = float(os.getenv("SMARTTAX_LLM_FAILURE_RATE", "0.5"))
+LLM_MIN_CALLS = int(os.getenv("SMARTTAX_LLM_MIN_CALLS", "4"))
+LLM_OPEN_SECONDS = float(os.getenv("SMARTTAX_LLM_OPEN_SECONDS", "30"))
+LLM_HEALTH_INTERVAL = float(os.getenv("SMARTTAX_LLM_HEALTH_INTERVAL", "15"))
+
+# Sampling options used for every chat
+GENERATION_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.9,
+    "num_predict": 500,
+}
+
+
+def reply_timings(chunk: dict) -> Dict[str, float]:
+    """Token counts and milliseconds from Ollama's final reply chunk"""
+    def ms(field: str) -> float:
+        return round(chunk.get(field, 0) / 1e6, 2)
+
+    return {
+        "prompt_tokens": chunk.get("prompt_eval_count", 0),
+        "prompt_eval_ms": ms("prompt_eval_duration"),
+        "eval_tokens": chunk.get("eval_count", 0),
+        "eval_ms": ms("eval_duration"),
+        "load_ms": ms("load_duration"),
+        "total_ms": ms("total_duration"),
+    }
+
+
+class OllamaError(Exception):
+    """Raised when Ollama is unreachable or returns an error"""
+
+
+class OllamaBusyError(OllamaError):
+    """Raised when no generation slot frees up within the queue timeout"""
+
+
+class OllamaUnavailableError(OllamaError):
+    """Raised without calling Ollama while the circuit breaker is open"""
+
+
+class OllamaClient:
+    """
+    Pooled async client for Ollama's /api/chat with a concurrency limit.
+
+    Create one per process; call ``aclose`` on shutdown.
+    """
+
+    def __init__(
+        self,
+        base_url: str = OLLAMA_URL,
+        model: str = OLLAMA_MODEL,
+        timeout: float = OLLAMA_TIMEOUT,
+        max_concurrency: int = OLLAMA_CONCURRENCY,
+        queue_timeout: float = OLLAMA_QUEUE_TIMEOUT,
+        health_interval: float = LLM_HEALTH_INTERVAL,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self.health_interval = health_interval
+        self.breaker = CircuitBreaker(
+            failure_rate=LLM_FAILURE_RATE,
+            min_calls=LLM_MIN_CALLS,
+            open_seconds=LLM_OPEN_SECONDS,
+        )
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._health: Dict[str, object] = {"checked_at": None}
+        self._active = 0
+        self._waiting = 0
+        self._replies = 0
+        self._totals = {"prompt_tokens": 0, "prompt_eval_ms": 0.0,
+                        "eval_tokens": 0, "eval_ms": 0.0}
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                # Short connect timeout: a dead server should fail fast
+                timeout=httpx.Timeout(self.timeout, connect=2.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 2,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+            )
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    def _payload(self, messages: List[Dict[str, str]], stream: bool) -> dict:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "options": GENERATION_OPTIONS,
+        }
+
+    async def _acquire(self):
+        """
+        Take a circuit breaker call and a generation slot.
+
+        Raises:
+            OllamaUnavailableError: Breaker open
+            OllamaBusyError: No slot within the queue timeout
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            raise OllamaUnavailableError(f"Ollama unavailable ({e})")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.breaker.release()
+            raise OllamaBusyError(
+                f"{self.max_concurrency} generations already running"
+            )
+        finally:
+            self._waiting -= 1
+        self._active += 1
+
+    def _release(self):
+        self._active -= 1
+        self._slots.release()
+
+    def _record(self, chunk: dict, timings: Optional[dict]):
+        measured = reply_timings(chunk)
+        self._replies += 1
+        for field in self._totals:
+            self._totals[field] += measured[field]
+        metrics.LLM_TOKENS.inc(measured["prompt_tokens"], phase="prompt")
+        metrics.LLM_TOKENS.inc(measured["eval_tokens"], phase="eval")
+        for phase in ("prompt_eval", "eval", "load", "total"):
+            metrics.LLM_SECONDS.observe(measured[f"{phase}_ms"] / 1000, phase=phase)
+        if timings is not None:
+            timings.update(measured)
+
+    async def chat(self, messages: List[Dict[str, str]], timings: Optional[dict] = None) -> str:
+        """
+        Whole reply for ``messages``.
+
+        If ``timings`` is given it is filled with the reply's token counts
+        and durations (see reply_timings).
+
+        Raises:
+            OllamaBusyError: No generation slot within the queue timeout
+            OllamaError: Connection failure or non-200 response
+        """
+        client = self._http()
+        await self._acquire()
+        try:
+            response = await client.post("/api/chat", json=self._payload(messages, False))
+        except httpx.HTTPError as e:
+            self.breaker.record_failure(str(e) or type(e).__name__)
+            raise OllamaError(str(e)) from e
+        except BaseException:
+            self.breaker.release()
+            raise
+        finally:
+            self._release()
+
+        if response.status_code != 200:
+            self.breaker.record_failure(f"HTTP {response.status_code}")
+            raise OllamaError(f"Ollama returned HTTP {response.status_code}")
+        self.breaker.record_success()
+        result = response.json()
+        self._record(result, timings)
+        return result.get("message", {}).get("content", "")
+
+    async def stream_chat(
+        self, messages: List[Dict[str, str]], timings: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield reply text chunks as Ollama produces them.
+
+        ``timings`` is filled as in chat() once the reply is complete.
+
+        Closing the iterator early closes the upstream request, so Ollama
+        stops generating.
+
+        Raises:
+            OllamaBusyError: No generation slot within the queue timeout
+            OllamaError: Connection failure or non-200 response
+        """
+        client = self._http()
+        await self._acquire()
+        settled = False
+        try:
+            async with client.stream(
+                "POST", "/api/chat", json=self._payload(messages, True)
+            ) as response:
+                if response.status_code != 200:
+                    raise OllamaError(f"Ollama returned HTTP {response.status_code}")
+
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise OllamaError(chunk["error"])
+                    if not settled:
+                        # First chunk arrived: the backend is up
+                        self.breaker.record_success()
+                        settled = True
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        yield token
+                    if chunk.get("done"):
+                        self._record(chunk, timings)
+                        break
+        except httpx.HTTPError as e:
+            if not settled:
+                self.breaker.record_failure(str(e) or type(e).__name__)
+                settled = True
+            raise OllamaError(str(e)) from e
+        except OllamaError as e:
+            if not settled:
+                self.breaker.record_failure(str(e))
+                settled = True
+            raise
+        finally:
+            if not settled:
+                # Cancelled before any reply (client went away)
+                self.breaker.release()
+            self._release()
+
+    # ============================================================
+    # HEALTH CHECK
+    # ============================================================
+
+    async def check_health(self) -> dict:
+        """
+        Ask Ollama for its model list (/api/tags) and update the breaker:
+        unreachable -> open, reachable -> let a probe through.
+        """
+        client = self._http()
+        health = {"reachable": False, "model_available": False}
+        try:
+            response = await client.get("/api/tags", timeout=2.0)
+            health["reachable"] = response.status_code == 200
+            if health["reachable"]:
+                names = {m.get("name") for m in response.json().get("models", [])}
+                health["model_available"] = (
+                    self.model in names or f"{self.model}:latest" in names
+                )
+        except (httpx.HTTPError, ValueError) as e:
+            health["error"] = str(e) or type(e).__name__
+
+        if health["reachable"]:
+            self.breaker.probe()
+        else:
+            self.breaker.force_open(health.get("error", "health check failed"))
+
+        health["checked_at"] = datetime.utcnow().isoformat() + "Z"
+        self._health = health
+        return health
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    def start_health_check(self):
+        """Start the background /api/tags poller (call from a running loop)"""
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def health(self) -> dict:
+        """Breaker state and the last health check result"""
+        return {"circuit": self.breaker.stats(), **self._health}
+
+    def stats(self) -> dict:
+        replies = self._replies or 1
+        return {
+            "url": self.base_url,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "waiting": self._waiting,
+            "keep_alive": OLLAMA_KEEP_ALIVE,
+            "replies": self._replies,
+            "avg_prompt_tokens": round(self._totals["prompt_tokens"] / replies, 1),
+            "avg_prompt_eval_ms": round(self._totals["prompt_eval_ms"] / replies, 2),
+            "avg_eval_tokens": round(self._totals["eval_tokens"] / replies, 1),
+            "avg_eval_ms": round(self._totals["eval_ms"] / replies, 2),
+            "circuit": self.breaker.state,
+        }
@@ -0,0 +1,199 @@
+"""
+Content-Addressed Parse Result Cache
+
+Users re-upload the same Form-16 and broker statements many times while
+iterating in the frontend. Parse results only depend on the file bytes and
+the parser code, so they are cached under ``sha256(bytes)`` plus the parser
+name and version, and a repeat upload skips pdfplumber/OCR/pandas entirely.
+
+Two tiers:
+- Memory: LRU dict capped at ``max_entries`` results
+- Disk (optional): SQLite table (WAL) with TTL eviction, shared by every
+  process that points at the same file and surviving restarts. Each
+  process opens its own connection, also after a fork (gunicorn
+  --preload), since SQLite connections must not cross fork().
+
+Configuration (environment variables):
+    SMARTTAX_PARSE_CACHE_SIZE: In-memory entries (default: 256, 0 disables)
+    SMARTTAX_PARSE_CACHE_DB: SQLite file for the disk tier (default: unset,
+        disk tier disabled)
+    SMARTTAX_PARSE_CACHE_TTL: Disk entry lifetime in seconds (default: 7 days)
+
+Author: SmartTax Team
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+PARSE_CACHE_SIZE = int(os.getenv("SMARTTAX_PARSE_CACHE_SIZE", "256"))
+PARSE_CACHE_DB = os.getenv("SMARTTAX_PARSE_CACHE_DB") or None
+PARSE_CACHE_TTL = float(os.getenv("SMARTTAX_PARSE_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+def file_digest(contents: bytes) -> str:
+    """SHA-256 of an upload; hash once and pass it on when several caches need it"""
+    return hashlib.sha256(contents).hexdigest()
+
+
+def cache_key(kind: str, version: str, contents: bytes, digest: Optional[str] = None) -> str:
+    """Key for ``contents`` (whose ``file_digest`` may be given) parsed by ``kind`` at ``version``"""
+    return f"{kind}:{version}:{digest or file_digest(contents)}"
+
+
+class ParseCache:
+    """
+    Two-tier (memory LRU + optional SQLite) cache of parse results.
+
+    Values are JSON-serialisable result dicts; callers always receive a
+    fresh copy so mutating a returned result cannot corrupt the cache.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = PARSE_CACHE_SIZE,
+        db_path: Optional[str] = PARSE_CACHE_DB,
+        ttl: float = PARSE_CACHE_TTL,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.db_path = db_path
+        self.ttl = ttl
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Held for SQLite calls only, so memory hits never wait on the disk
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid: Optional[int] = None
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+        if self.db_path:
+            self.purge_expired()
+
+    def _database(self) -> Optional[sqlite3.Connection]:
+        """This process's connection to the disk tier (None if disabled)"""
+        if self.db_path and self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db_pid = os.getpid()
+        return self._db
+
+    # ============================================================
+    # LOOKUP / STORE
+    # ============================================================
+
+    # get / put may block on SQLite (up to its 10 s busy timeout), so async
+    # callers run them in a thread
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached result for ``key``, or None on a miss"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return json.loads(value)
+
+        with self._db_lock:
+            value = self._disk_get(key)
+
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._memory_put(key, value)
+            self._hits += 1
+            self._disk_hits += 1
+        return json.loads(value)
+
+    def put(self, key: str, result: dict):
+        """Store ``result`` under ``key`` in every enabled tier"""
+        value = json.dumps(result)
+        with self._lock:
+            self._memory_put(key, value)
+        with self._db_lock:
+            db = self._database()
+            if db is not None:
+                db.execute(
+                    "INSERT OR REPLACE INTO parse_cache (key, value, created) VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+                db.commit()
+
+    def _memory_put(self, key: str, value: str):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        db = self._database()
+        if db is None:
+            return None
+
+        row = db.execute(
+            "SELECT value, created FROM parse_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created = row
+        if time.time() - created > self.ttl:
+            db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+            db.commit()
+            return None
+        return value
+
+    # ============================================================
+    # MAINTENANCE
+    # ============================================================
+
+    def purge_expired(self) -> int:
+        """Delete disk entries older than the TTL; returns rows removed"""
+        with self._db_lock:
+            db = self._database()
+            if db is None:
+                return 0
+            cur = db.execute(
+                "DELETE FROM parse_cache WHERE created < ?", (time.time() - self.ttl,)
+            )
+            db.commit()
+            return cur.rowcount
+
+    def clear(self):
+        """Drop every cached result in both tiers"""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            db = self._database()
+            if db is not None:
+                db.execute("DELETE FROM parse_cache")
+                db.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_capacity": self.max_entries,
+                "disk_enabled": bool(self.db_path),
+            }
@@ -0,0 +1,443 @@
+"""
+Request Profiling: Sampled Flame Graphs for Slow Requests
+
+Opt-in (SMARTTAX_PROFILE=1) middleware that profiles requests with a
+statistical sampler: one background thread reads every thread's Python
+stack (``sys._current_frames``) every SMARTTAX_PROFILE_INTERVAL_MS while
+profiled requests are in flight, and counts the folded stacks. Nothing
+is traced per call, so the cost does not depend on how much Python a
+request runs.
+
+A profile is kept when the request was picked at random
+(SMARTTAX_PROFILE_SAMPLE_RATE) or took longer than
+SMARTTAX_PROFILE_SLOW_MS; every other profile is dropped when the
+request ends.
+
+Parsing runs in worker processes, where the API process's sampler cannot
+see it. For a profiled request the worker samples its own threads
+(including the OCR threads) for the duration of the job and returns the
+stacks with the result (under PROFILE_KEY); they are merged into the
+request's profile under a "parse worker (<parser>)" frame.
+
+Profiles are tagged with the route and, for parse requests, the parser and
+the path it took ("tables", "regex" or "ocr" for Form-16, fallbacks such
+as "pandas" or "summary" for Excel reports, "cache" for cache hits). They
+are written as JSON to a bounded directory, shared by gunicorn workers,
+where the oldest files are deleted beyond SMARTTAX_PROFILE_MAX_FILES.
+GET /admin/profiles lists them; GET /admin/profiles/{id} returns the
+folded stacks, which flamegraph.pl, inferno and speedscope render as a
+flame graph.
+
+Samples of other requests running in the same API process at the same
+time are included too, so a profile is cleanest when the process is not
+busy with other work. Threads that are only waiting (an idle event loop,
+thread pool workers with nothing to do) are counted as idle samples and
+left out of the stacks.
+
+Configuration (environment variables):
+    SMARTTAX_PROFILE: Set to 1 to enable profiling (default: 0)
+    SMARTTAX_PROFILE_SAMPLE_RATE: Fraction of requests always kept (default: 0.01)
+    SMARTTAX_PROFILE_SLOW_MS: Keep profiles of requests slower than this;
+        0 keeps only sampled ones (default: 2000)
+    SMARTTAX_PROFILE_INTERVAL_MS: Sampling interval (default: 10)
+    SMARTTAX_PROFILE_DIR: Directory for stored profiles (default:
+        <temp dir>/smarttax_profiles)
+    SMARTTAX_PROFILE_MAX_FILES: Profiles kept on disk (default: 200)
+    SMARTTAX_ADMIN_TOKEN: If set, /admin endpoints require it in the
+        X-Admin-Token header (default: unset, open like /debug/startup)
+
+Author: SmartTax Team
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.metrics import route_template
+
+PROFILE_ENABLED = os.getenv("SMARTTAX_PROFILE", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("SMARTTAX_PROFILE_SAMPLE_RATE", "0.01"))
+PROFILE_SLOW_MS = float(os.getenv("SMARTTAX_PROFILE_SLOW_MS", "2000"))
+PROFILE_INTERVAL_MS = float(os.getenv("SMARTTAX_PROFILE_INTERVAL_MS", "10"))
+PROFILE_DIR = os.getenv("SMARTTAX_PROFILE_DIR",
+                        os.path.join(tempfile.gettempdir(), "smarttax_profiles"))
+PROFILE_MAX_FILES = int(os.getenv("SMARTTAX_PROFILE_MAX_FILES", "200"))
+ADMIN_TOKEN = os.getenv("SMARTTAX_ADMIN_TOKEN")
+
+# Key under which a parse result carries the worker's stacks
+PROFILE_KEY = "_profile"
+
+# Distinct stacks kept per profile; further new stacks are counted as "[truncated]"
+MAX_STACKS = 5000
+MAX_DEPTH = 128
+
+# Requests never profiled: the admin endpoints themselves and scrapes
+EXCLUDED_PREFIXES = ("/admin/profiles", "/metrics")
+
+# Innermost frames of a thread that is only waiting: (file name, function)
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("connection.py", "wait"),      # multiprocessing result / wakeup pipes
+    ("connection.py", "_poll"),
+    ("thread.py", "_worker"),       # ThreadPoolExecutor thread in SimpleQueue.get
+}
+
+# Outermost frame kept: a parse worker process is forked from whichever API
+# thread submitted the first job, and its stack still shows that thread's frames
+_ROOT_FRAMES = {("process.py", "_process_worker")}
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class ProfileNotFoundError(Exception):
+    """Raised when a profile ID is unknown or has been pruned"""
+
+
+# ============================================================
+# SAMPLER
+# ============================================================
+
+_labels: Dict[object, str] = {}
+
+
+def _label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+        label = f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def _is_idle(frame) -> bool:
+    """Whether the thread is only waiting (see _IDLE_FRAMES)"""
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _fold(frame) -> Tuple[str, bool]:
+    """
+    ``root;...;leaf`` labels of a stack, and whether it was cut at a
+    _ROOT_FRAMES frame
+    """
+    labels = []
+    rooted = False
+    while frame is not None and len(labels) < MAX_DEPTH:
+        code = frame.f_code
+        labels.append(_label(code))
+        if (os.path.basename(code.co_filename), code.co_name) in _ROOT_FRAMES:
+            rooted = True
+            break
+        frame = frame.f_back
+    return ";".join(reversed(labels)), rooted
+
+
+class Profile:
+    """Folded stack counts of one request (or one parse job in a worker)"""
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.created = datetime.utcnow().isoformat() + "Z"
+        self.tags: Dict[str, str] = {}
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self._lock = threading.Lock()
+
+    def add(self, stacks: List[str], idle: int):
+        with self._lock:
+            self.samples += 1
+            self.idle_samples += idle
+            for stack in stacks:
+                if stack in self.stacks or len(self.stacks) < MAX_STACKS:
+                    self.stacks[stack] += 1
+                else:
+                    self.stacks["[truncated]"] += 1
+
+    def merge(self, stacks: Dict[str, int], prefix: str):
+        """Add stacks sampled elsewhere (a parse worker) under a ``prefix`` frame"""
+        with self._lock:
+            for stack, count in stacks.items():
+                self.stacks[f"{prefix};{stack}"] += count
+
+    def tag(self, **tags: str):
+        with self._lock:
+            self.tags.update(tags)
+
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """Brendan Gregg's folded format: one ``frame;frame;frame count`` line per stack"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+class Sampler:
+    """
+    One thread per process that samples every other thread's stack while
+    at least one profile is active, and stops when none is.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = max(0.001, interval_ms / 1000)
+        self._active: List[Profile] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="smarttax-profiler",
+                                                daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: Profile):
+        with self._lock:
+            self._active.remove(profile)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+
+            frames = sys._current_frames()
+            names = None
+            stacks = []
+            idle = 0
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if _is_idle(frame):
+                    idle += 1
+                    continue
+                stack, rooted = _fold(frame)
+                if rooted:
+                    stacks.append(stack)
+                    continue
+                if names is None:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stacks.append(f"{names.get(ident, 'thread')};{stack}")
+            del frames, frame   # do not keep the sampled frames alive while sleeping
+
+            for profile in active:
+                profile.add(stacks, idle)
+            time.sleep(self.interval)
+
+
+# Created lazily, so a process that never profiles never starts a thread
+_sampler: Optional[Sampler] = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler() -> Sampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = Sampler()
+        return _sampler
+
+
+def _reset_after_fork():
+    # A parse worker forked while a request was being profiled inherits the
+    # sampler's state, but not its thread
+    global _sampler, _sampler_lock
+    _sampler = None
+    _sampler_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+@contextmanager
+def sample(profile: Optional[Profile]) -> Iterator[Optional[Profile]]:
+    """Sample this process's threads into ``profile`` while the block runs (no-op for None)"""
+    if profile is None:
+        yield None
+        return
+
+    sampler = _get_sampler()
+    sampler.add(profile)
+    try:
+        yield profile
+    finally:
+        sampler.remove(profile)
+
+
+_current: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar(
+    "smarttax_profile", default=None)
+
+
+def current() -> Optional[Profile]:
+    """The profile of the request being handled, if it is profiled"""
+    return _current.get()
+
+
+def parser_path(kind: str, trace: Optional[dict]) -> str:
+    """Which way a parse went, from the fallbacks on its trace"""
+    if not trace:
+        return "unknown"
+    paths = [path for _, path in trace["fallbacks"]]
+    if kind == "form16":
+        if "ocr" in paths:
+            return "ocr"
+        return "regex" if "regex" in paths else "tables"
+    return "+".join(paths) or "default"
+
+
+# ============================================================
+# STORE
+# ============================================================
+
+class ProfileStore:
+    """Profiles as JSON files in a directory, oldest deleted beyond ``max_files``"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max(1, max_files)
+
+    def _path(self, profile_id: str) -> str:
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def save(self, record: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(record["id"])
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+        self._prune()
+
+    def _files(self) -> List[Tuple[float, str]]:
+        """(mtime, path) of every stored profile, newest first"""
+        try:
+            with os.scandir(self.directory) as entries:
+                files = [(e.stat().st_mtime, e.path) for e in entries
+                         if e.name.endswith(".json")]
+        except OSError:
+            return []
+        return sorted(files, reverse=True)
+
+    def _prune(self):
+        for _, path in self._files()[self.max_files:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass    # already removed by another worker
+
+    def list(self, limit: int = 50, route: Optional[str] = None,
+             parser: Optional[str] = None, min_ms: float = 0.0) -> List[dict]:
+        """Newest first, without the stacks"""
+        found = []
+        for _, path in self._files():
+            try:
+                with open(path) as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue    # pruned or half-written
+            if route and record["route"] != route:
+                continue
+            if parser and record["tags"].get("parser") != parser:
+                continue
+            if record["duration_ms"] < min_ms:
+                continue
+            found.append({k: v for k, v in record.items() if k != "stacks"})
+            if len(found) >= limit:
+                break
+        return found
+
+    def get(self, profile_id: str) -> dict:
+        """
+        Raises:
+            ProfileNotFoundError: Unknown or pruned ID
+        """
+        if not _PROFILE_ID.match(profile_id):
+            raise ProfileNotFoundError(profile_id)
+        try:
+            with open(self._path(profile_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise ProfileNotFoundError(profile_id)
+
+
+# ============================================================
+# MIDDLEWARE
+# ============================================================
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles requests and stores the ones that were
+    sampled or slow (see module docstring)
+    """
+
+    def __init__(self, app, store: Optional[ProfileStore] = None,
+                 sample_rate: float = PROFILE_SAMPLE_RATE, slow_ms: float = PROFILE_SLOW_MS):
+        self.app = app
+        self.store = store or ProfileStore()
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXCLUDED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        sampled = random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        token = _current.set(profile)
+        start = time.perf_counter()
+        try:
+            with sample(profile):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            duration_ms = (time.perf_counter() - start) * 1000
+
+        if sampled or duration_ms >= self.slow_ms:
+            # The response has been sent; only this task waits for the write
+            await asyncio.to_thread(self.store.save, {
+                "id": profile.id,
+                "created": profile.created,
+                "method": profile.method,
+                "path": profile.path,
+                "route": route_template(scope),
+                "status": status,
+                "duration_ms": round(duration_ms, 1),
+                "reason": "sampled" if sampled else "slow",
+                "tags": profile.tags,
+                "interval_ms": PROFILE_INTERVAL_MS,
+                "samples": profile.samples,
+                "idle_samples": profile.idle_samples,
+                "stacks": dict(profile.stacks.most_common()),
+            })
@@ -0,0 +1,195 @@
+"""
+Equity Report Format Detection
+
+Decides which parser an uploaded equity report needs, so users do not
+have to pick their broker (and get empty results when they pick wrong).
+
+Detection reads only a sample: the sheet names and the first SNIFF_ROWS
+rows of each sheet, via openpyxl's read-only mode (pandas with ``nrows``
+for legacy .xls, the csv module for CSV). Each registered format checks
+the sample for its sheet names or header signature; the first match in
+EQUITY_FORMATS wins, so specific layouts come before generic ones:
+
+    zerodha    "Tradewise Exits" sheet / "Equity - Short Term" sections
+    groww      "Short Term Trades" / "Long Term Trades" sections
+    tradebook  raw buys and sells (FIFO engine)
+    generic    any table with P&L, sell date and term or buy date columns
+
+Results are cached by file SHA-256, so a re-upload is not sniffed again.
+
+Configuration (environment variables):
+    SMARTTAX_FORMAT_CACHE_SIZE: Detection results kept in memory
+        (default: 1024)
+
+Author: SmartTax Team
+"""
+
+import csv
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence
+
+from app import column_mapped_parser, tradebook_parser, zerodha_parser
+from app.excel_reader import iter_sheets
+
+FORMAT_CACHE_SIZE = int(os.getenv("SMARTTAX_FORMAT_CACHE_SIZE", "1024"))
+
+# Rows read per sheet, and sheets read per workbook, when sniffing
+SNIFF_ROWS = 100
+SNIFF_SHEETS = 10
+
+# Bytes of a CSV file decoded when sniffing
+SNIFF_CSV_BYTES = 64 * 1024
+
+_XLSX_MAGIC = b"PK\x03\x04"
+_XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+Sample = Dict[str, List[Sequence[Any]]]   # sheet name -> first rows, in sheet order
+
+
+class UnknownFormatError(ValueError):
+    """Raised when an equity report matches no registered format"""
+
+
+class EquityFormat(NamedTuple):
+    kind: str                           # worker_pool parser kind
+    broker: str                         # broker name reported to the client
+    matches: Callable[[Sample], bool]
+
+
+# ============================================================
+# SIGNATURES
+# ============================================================
+
+def _first_sheet(sample: Sample) -> List[Sequence[Any]]:
+    return next(iter(sample.values()), [])
+
+
+def _is_zerodha(sample: Sample) -> bool:
+    if any(name.strip().lower().startswith(zerodha_parser.TRADEWISE_SHEET_PREFIX)
+           for name in sample):
+        return True
+    return any(zerodha_parser.SECTION_BUCKETS.get(zerodha_parser.section_title(row) or "")
+               for rows in sample.values() for row in rows)
+
+
+def _is_groww(sample: Sample) -> bool:
+    for row in _first_sheet(sample):
+        first = str(row[0]).lower() if row else ""
+        if "short term trades" in first or "long term trades" in first:
+            return True
+    return False
+
+
+def _is_tradebook(sample: Sample) -> bool:
+    return any(tradebook_parser.resolve_header(row) for row in _first_sheet(sample))
+
+
+def _is_column_mapped(sample: Sample) -> bool:
+    return any(column_mapped_parser.resolve_header(row)
+               for rows in sample.values() for row in rows)
+
+
+# Checked in order; add new brokers before "generic"
+EQUITY_FORMATS: List[EquityFormat] = [
+    EquityFormat("zerodha", "zerodha", _is_zerodha),
+    EquityFormat("groww", "groww", _is_groww),
+    EquityFormat("tradebook", "tradebook", _is_tradebook),
+    EquityFormat("generic", "other", _is_column_mapped),
+]
+
+# Parser used when the caller names a broker but the file is not recognised
+BROKER_DEFAULTS = {
+    "groww": "groww",
+    "zerodha": "zerodha",
+}
+
+
+# ============================================================
+# SAMPLING
+# ============================================================
+
+def sample_file(contents: bytes) -> Sample:
+    """Sheet names and first rows of an .xlsx/.xls/.csv file ({} if unreadable)"""
+    if contents[:4] in (_XLSX_MAGIC, _XLS_MAGIC):
+        sample: Sample = {}
+        try:
+            for name, rows in islice(iter_sheets(io.BytesIO(contents), SNIFF_ROWS), SNIFF_SHEETS):
+                sample[name] = list(rows)
+        except (zipfile.BadZipFile, ValueError, KeyError, OSError):
+            pass
+        return sample
+
+    text = contents[:SNIFF_CSV_BYTES].decode("utf-8-sig", errors="replace")
+    try:
+        return {"": list(islice(csv.reader(io.StringIO(text)), SNIFF_ROWS))}
+    except csv.Error:
+        return {}
+
+
+# ============================================================
+# DETECTION
+# ============================================================
+
+_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def _detect_kind(contents: bytes, digest: Optional[str] = None) -> Optional[str]:
+    digest = digest or hashlib.sha256(contents).hexdigest()
+    with _cache_lock:
+        if digest in _cache:
+            _cache.move_to_end(digest)
+            _stats["hits"] += 1
+            return _cache[digest]
+        _stats["misses"] += 1
+
+    sample = sample_file(contents)
+    kind = next((fmt.kind for fmt in EQUITY_FORMATS if fmt.matches(sample)), None)
+
+    with _cache_lock:
+        _cache[digest] = kind
+        while len(_cache) > FORMAT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return kind
+
+
+def detect_equity_format(contents: bytes, broker: Optional[str] = None,
+                         digest: Optional[str] = None) -> EquityFormat:
+    """
+    Format of an equity report, from its contents.
+
+    ``broker`` is only a fallback for files no signature matches; a file
+    that is recognised is parsed as what it is. ``digest`` is the file's
+    SHA-256 when the caller already has it (detections are cached by it).
+
+    Raises:
+        UnknownFormatError: Unrecognised file and no known ``broker`` given
+    """
+    kind = _detect_kind(contents, digest)
+    if kind is None and broker:
+        kind = BROKER_DEFAULTS.get(broker.strip().lower())
+    if kind is None:
+        raise UnknownFormatError(
+            "Could not recognise the report format. Upload a Zerodha tax P&L, "
+            "Groww capital gains report or tradebook, or a sheet with P&L, "
+            "sell date and buy date (or short/long term) columns."
+        )
+    return next(fmt for fmt in EQUITY_FORMATS if fmt.kind == kind)
+
+
+def stats() -> dict:
+    with _cache_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            "entries": len(_cache),
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,253 @@
+"""
+Chatbot Response Cache
+
+Most chatbot traffic is the same handful of questions ("what is LTCG",
+"how is cess computed", "how can I save tax"). Answers from the LLM are
+cached so a repeat question is served without another generation.
+
+Lookup is two-step:
+1. Exact match on the normalized question (lowercase, punctuation and
+   filler words removed, common suffixes stripped)
+2. Similarity match: TF-IDF weighted word and word-pair vectors (hashed
+   into a fixed number of dimensions, computed locally with NumPy) with
+   cosine similarity above a threshold
+
+Answers are scoped by the tax rule version and, whenever the user has tax
+data in their context (salary, gains, a calculation), by a hash of that
+context: the LLM sees those numbers in its prompt, so any answer may
+quote them ("what is the net payable?" needs no "my"). Only users without
+tax data share one scope. Follow-ups that refer back to the conversation
+("what about that?") are never cached.
+
+Configuration (environment variables):
+    SMARTTAX_CHAT_CACHE_SIZE: Answers kept (default: 512, 0 disables)
+    SMARTTAX_CHAT_CACHE_THRESHOLD: Cosine similarity needed for a
+        similarity hit (default: 0.8)
+
+Author: SmartTax Team
+"""
+
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+CHAT_CACHE_SIZE = int(os.getenv("SMARTTAX_CHAT_CACHE_SIZE", "512"))
+CHAT_CACHE_THRESHOLD = float(os.getenv("SMARTTAX_CHAT_CACHE_THRESHOLD", "0.8"))
+
+# Hashed feature dimensions for question vectors
+VECTOR_DIM = 2048
+
+SHARED_SCOPE = "shared"
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Dropped before matching; they carry no meaning for a tax question
+_FILLER = frozenset("""
+a an the is are was were be been do does did can could would will shall
+should may might please tell me explain what whats how hi hello hey about
+to of for on in and or my i im our we us you your it its this that
+under with much
+""".split())
+
+# Stripped so "taxed" / "taxes" and "computed" / "computation" match
+_SUFFIXES = ("ations", "ation", "ings", "ing", "ed", "es", "s")
+
+# The question only makes sense with the previous turns
+_REFERS_BACK = frozenset("it its this that those these them above previous earlier same".split())
+
+
+def _words(question: str) -> List[str]:
+    return _WORD.findall(question.lower())
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize_question(question: str) -> str:
+    """Exact-match key: stemmed lowercase words without punctuation or filler"""
+    return " ".join(_stem(w) for w in _words(question) if w not in _FILLER)
+
+
+def is_cacheable(question: str) -> bool:
+    """False for follow-ups that refer back to earlier turns"""
+    words = _words(question)
+    return bool(words) and not any(w in _REFERS_BACK for w in words)
+
+
+def _features(normalized: str) -> np.ndarray:
+    """Sublinear term counts of words and adjacent word pairs (hashed)"""
+    words = normalized.split()
+    terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for term in terms:
+        vector[zlib.crc32(term.encode("utf-8")) % VECTOR_DIM] += 1.0
+    np.log1p(vector, out=vector)
+    return vector
+
+
+class _Entry(NamedTuple):
+    scope: str
+    answer: str
+    slot: int
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache of chatbot answers with exact and similarity lookup.
+
+    Call ``scope_for`` to get the scope of a question, then ``get`` /
+    ``put`` with it.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CHAT_CACHE_SIZE,
+        threshold: float = CHAT_CACHE_THRESHOLD,
+    ):
+        self.max_entries = max(0, max_entries)
+        self.threshold = threshold
+
+        # Entries keyed by (scope, normalized question), LRU order
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        # Question vectors by slot, with each slot's scope for masking
+        self._vectors = np.zeros((self.max_entries, VECTOR_DIM), dtype=np.float32)
+        self._slot_scopes = np.full(self.max_entries, None, dtype=object)
+        self._slot_keys: List[Optional[tuple]] = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        # Document frequency of each feature over cached questions (for IDF)
+        self._doc_freq = np.zeros(VECTOR_DIM, dtype=np.float32)
+        self._lock = threading.Lock()
+
+        self._exact_hits = 0
+        self._similar_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def scope_for(question: str, rule_version: str, context_hash: str,
+                  has_tax_data: bool) -> Optional[str]:
+        """
+        Cache scope for ``question``, or None if it must not be cached.
+        ``has_tax_data``: the prompt carries the user's own numbers.
+        """
+        if not is_cacheable(question):
+            return None
+        if has_tax_data:
+            return f"{rule_version}/{context_hash}"
+        return f"{rule_version}/{SHARED_SCOPE}"
+
+    # ============================================================
+    # LOOKUP / STORE
+    # ============================================================
+
+    def get(self, question: str, scope: str) -> Optional[str]:
+        """Cached answer for ``question`` in ``scope``, or None"""
+        if self.max_entries == 0:
+            return None
+
+        normalized = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get((scope, normalized))
+            if entry is not None:
+                self._entries.move_to_end((scope, normalized))
+                self._exact_hits += 1
+                return entry.answer
+
+            slot = self._most_similar(_features(normalized), scope)
+            if slot is not None:
+                key = self._slot_keys[slot]
+                self._entries.move_to_end(key)
+                self._similar_hits += 1
+                return self._entries[key].answer
+
+            self._misses += 1
+            return None
+
+    def put(self, question: str, scope: str, answer: str):
+        """Cache ``answer`` for ``question`` in ``scope``"""
+        if self.max_entries == 0 or not answer:
+            return
+
+        normalized = normalize_question(question)
+        key = (scope, normalized)
+        with self._lock:
+            if key in self._entries:
+                entry = self._entries[key]
+                self._entries[key] = entry._replace(answer=answer)
+                self._entries.move_to_end(key)
+                return
+
+            if not self._free_slots:
+                self._evict(next(iter(self._entries)))
+                self._evictions += 1
+
+            slot = self._free_slots.pop()
+            vector = _features(normalized)
+            self._vectors[slot] = vector
+            self._slot_scopes[slot] = scope
+            self._slot_keys[slot] = key
+            self._doc_freq += vector > 0
+            self._entries[key] = _Entry(scope, answer, slot)
+
+    def _evict(self, key: tuple):
+        entry = self._entries.pop(key)
+        self._doc_freq -= self._vectors[entry.slot] > 0
+        self._vectors[entry.slot] = 0.0
+        self._slot_scopes[entry.slot] = None
+        self._slot_keys[entry.slot] = None
+        self._free_slots.append(entry.slot)
+
+    def _most_similar(self, query: np.ndarray, scope: str) -> Optional[int]:
+        """Slot of the closest cached question in ``scope`` above the threshold"""
+        slots = np.flatnonzero(self._slot_scopes == scope)
+        if slots.size == 0 or not query.any():
+            return None
+
+        n = len(self._entries)
+        idf = np.log((1.0 + n) / (1.0 + self._doc_freq)) + 1.0
+        q = query * idf
+        q /= np.linalg.norm(q)
+
+        candidates = self._vectors[slots] * idf
+        norms = np.linalg.norm(candidates, axis=1)
+        norms[norms == 0] = 1.0
+        scores = candidates @ q / norms
+
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return int(slots[best])
+
+    # ============================================================
+    # MAINTENANCE
+    # ============================================================
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = self._exact_hits + self._similar_hits
+            lookups = hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "capacity": self.max_entries,
+                "threshold": self.threshold,
+                "exact_hits": self._exact_hits,
+                "similar_hits": self._similar_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,238 @@
+"""
+Mutual Fund Scheme Index
+
+Capital gains on a mutual fund redemption depend on the scheme's tax
+category, which statements rarely spell out:
+
+    equity   equity-oriented (>= 65% domestic equity: equity, ELSS, index
+             funds/ETFs, arbitrage, aggressive hybrid, equity savings)
+    debt     debt-oriented (liquid, gilt, bond, conservative hybrid, ...);
+             units bought on or after 1 Apr 2023 are "specified mutual
+             funds" (Section 50AA) and always short term
+    other    neither (gold/silver, overseas and fund-of-funds)
+    unknown  none of the sources below decides it; never guessed, so
+             callers report these schemes instead of taxing them
+
+Categories are looked up in this order:
+1. The prebuilt index (SMARTTAX_SCHEME_INDEX), by ISIN or AMFI code. Build
+   it from AMFI's NAV file, whose section headers give every scheme's
+   SEBI category:
+
+       python -m app.scheme_index NAVAll.txt > schemes.csv
+
+2. The statement's own asset class / category column, when it has one
+3. Keywords in the scheme name. Many older equity schemes carry no
+   keyword at all ("HDFC Top 100", "UTI Mastershare"), which is why the
+   index should be configured in production.
+
+Each distinct scheme is classified once per process and cached.
+
+Configuration (environment variables):
+    SMARTTAX_SCHEME_INDEX: CSV of ``isin,amfi_code,category,scheme_name``
+        (default: unset, keyword rules only)
+
+Author: SmartTax Team
+"""
+
+import csv
+import os
+import re
+import sys
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+SCHEME_INDEX_FILE = os.getenv("SMARTTAX_SCHEME_INDEX") or None
+
+EQUITY = "equity"
+DEBT = "debt"
+OTHER = "other"
+UNKNOWN = "unknown"
+CATEGORIES = (EQUITY, DEBT, OTHER)
+
+# Classifications kept per process (distinct scheme/ISIN/category triples)
+CLASSIFY_CACHE_SIZE = 8192
+
+# Name keywords, checked in this order; the first family that matches wins.
+# A None family leaves the scheme unclassified: "global" / "world" name
+# overseas FoFs and domestic equity funds (SBI Magnum Global) alike.
+_NAME_RULES = (
+    (EQUITY, r"equity\s*(?:&|and)\s*debt|hybrid equity|equity hybrid|aggressive hybrid|"
+             r"arbitrage|equity savings|balanced advantage"),
+    (OTHER, r"gold|silver|international|overseas|nasdaq|s&p\s*500|"
+            r"nyse|us\s+(?:equity|bluechip|opportunities)|greater china|japan|"
+            r"emerging market|europe|asean|hang seng|fund of funds?|\bfof\b"),
+    (None, r"global|world"),
+    (DEBT, r"liquid|overnight|money market|gilt|g-?sec|\bsdl\b|bond|debt|"
+           r"credit risk|banking\s*(?:&|and)\s*psu|psu debt|duration|floater|"
+           r"floating rate|treasury|income|fixed maturity|\bfmp\b|"
+           r"target maturity|constant maturity|conservative hybrid|crisil ibx|"
+           r"savings fund|interval fund"),
+    (EQUITY, r"equit(?:y|ies)|elss|tax\s*saver|long term advantage|cap\b|large|mid|small|"
+             r"multi\s*cap|flexi|focused|value|contra|dividend yield|bluechip|"
+             r"index|nifty|sensex|arbitrage|aggressive hybrid|balanced advantage|"
+             r"dynamic asset allocation|sectoral|thematic|infrastructure|banking|"
+             r"financial services|pharma|healthcare|technology|digital|consumption|"
+             r"\bmnc\b|\besg\b|momentum|quality|alpha|\betf\b|opportunities|"
+             r"business cycle|manufacturing|innovation|special situations"),
+)
+_NAME_PATTERNS = [(category, re.compile(pattern)) for category, pattern in _NAME_RULES]
+
+# AMFI NAV file section header, e.g. "Open Ended Schemes(Debt Scheme - Gilt Fund)"
+_AMFI_SECTION = re.compile(r"schemes?\s*\((.+)\)\s*$", re.IGNORECASE)
+
+
+# ============================================================
+# CATEGORY RULES
+# ============================================================
+
+def category_from_label(label: str) -> Optional[str]:
+    """
+    Category from a statement's asset class column or an AMFI SEBI category
+    ("Equity", "Debt - Others", "Hybrid Scheme - Arbitrage Fund", ...).
+    None when the label does not decide it.
+    """
+    text = str(label or "").strip().lower()
+    if not text or text in ("nan", "none"):
+        return None
+    if "non-equity" in text or "non equity" in text:
+        return DEBT
+    if "fof" in text or "fund of fund" in text or "overseas" in text or "gold" in text:
+        return OTHER
+    if "hybrid" in text or "solution oriented" in text or "other scheme" in text:
+        # Only these hybrids keep 65% in equity (with hedged positions)
+        if re.search(r"aggressive|arbitrage|equity savings|balanced advantage|dynamic asset", text):
+            return EQUITY
+        if re.search(r"conservative", text):
+            return DEBT
+        return None
+    if "equity" in text or "elss" in text:
+        return EQUITY
+    if "debt" in text or "liquid" in text or "income" in text or "gilt" in text:
+        return DEBT
+    return None
+
+
+def category_from_name(name: str) -> Optional[str]:
+    """Category from scheme name keywords; None when they do not decide it"""
+    text = str(name or "").lower()
+    for category, pattern in _NAME_PATTERNS:
+        if pattern.search(text):
+            return category
+    return None
+
+
+# ============================================================
+# PREBUILT INDEX
+# ============================================================
+
+def iter_amfi_index(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    """
+    Index rows from an AMFI NAVAll.txt file: every scheme line
+    (``code;isin_growth;isin_reinvest;name;nav;date``) with the SEBI
+    category of the section it appears under.
+    """
+    section = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        parts = line.split(";")
+        if len(parts) < 4:
+            match = _AMFI_SECTION.search(line)
+            if match:
+                section = match.group(1)
+            continue
+        code, isin_a, isin_b, name = (p.strip() for p in parts[:4])
+        if not code.isdigit():
+            continue    # column header line
+        category = category_from_label(section) or category_from_name(name) or UNKNOWN
+        for isin in {isin_a, isin_b} - {"", "-"}:
+            yield {"isin": isin, "amfi_code": code, "category": category, "scheme_name": name}
+        if not (isin_a.strip("-") or isin_b.strip("-")):
+            yield {"isin": "", "amfi_code": code, "category": category, "scheme_name": name}
+
+
+@lru_cache(maxsize=1)
+def load_index(path: Optional[str] = SCHEME_INDEX_FILE) -> Dict[str, str]:
+    """ISIN / AMFI code -> category from a prebuilt index CSV ({} if no file)"""
+    index: Dict[str, str] = {}
+    if not path:
+        return index
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            category = (row.get("category") or "").strip().lower()
+            if category not in CATEGORIES:
+                continue
+            for key in ("isin", "amfi_code"):
+                value = (row.get(key) or "").strip().upper()
+                if value:
+                    index[value] = category
+    return index
+
+
+# ============================================================
+# CLASSIFICATION
+# ============================================================
+
+_cache: Dict[tuple, str] = {}
+_cache_lock = threading.Lock()
+
+
+def classify(name: str, isin: str = "", label: str = "", code: str = "") -> str:
+    """Category of one scheme (see module docstring for the lookup order)"""
+    key = (name, isin, label, code)
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    index = load_index()
+    category = (
+        index.get(str(isin).strip().upper())
+        or index.get(str(code).strip().upper())
+        or category_from_label(label)
+        or category_from_name(name)
+        or UNKNOWN
+    )
+
+    with _cache_lock:
+        if len(_cache) >= CLASSIFY_CACHE_SIZE:
+            _cache.clear()
+        _cache[key] = category
+    return category
+
+
+def classify_column(names: Sequence, isins: Optional[Sequence] = None,
+                    labels: Optional[Sequence] = None,
+                    codes: Optional[Sequence] = None) -> np.ndarray:
+    """
+    Category per row (object array), classifying each distinct
+    (name, isin, label, code) combination once.
+    """
+    n = len(names)
+    columns = [names] + [c if c is not None else [""] * n for c in (isins, labels, codes)]
+    keys = [tuple("" if v is None else str(v) for v in row) for row in zip(*columns)]
+
+    distinct: Dict[tuple, int] = {}
+    codes_out = np.fromiter((distinct.setdefault(k, len(distinct)) for k in keys),
+                            dtype=np.int64, count=n)
+    categories: List[str] = [classify(*k) for k in distinct]
+    return np.asarray(categories, dtype=object)[codes_out] if n else np.zeros(0, dtype=object)
+
+
+def main(argv: Sequence[str]) -> int:
+    if len(argv) != 1:
+        print("usage: python -m app.scheme_index NAVAll.txt > schemes.csv", file=sys.stderr)
+        return 2
+    writer = csv.DictWriter(sys.stdout, fieldnames=["isin", "amfi_code", "category", "scheme_name"])
+    writer.writeheader()
+    with open(argv[0], encoding="utf-8", errors="replace") as f:
+        writer.writerows(iter_amfi_index(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,253 @@
+"""
+Cold Start Instrumentation and Parser Pre-warming
+
+Parser dependencies (pandas, openpyxl, pdfplumber, PyMuPDF, Tesseract
+bindings) take seconds to import on small instances, so app.main only
+imports them on first use of an endpoint. To keep that first upload fast
+too, ``Prewarmer`` imports them in a background thread shortly after
+startup and warms the parser worker processes, while the app is already
+answering requests.
+
+``GET /debug/startup`` reports where start-up time went:
+
+- Milestones since the process started (app imported, startup complete;
+  "preloaded" when the gunicorn master built shared state before forking)
+- Which heavy modules are loaded, and what pre-warming each one cost
+- With SMARTTAX_IMPORT_PROFILE=1, a per-module import table in the style
+  of ``python -X importtime`` (self and cumulative time). The profiler is
+  installed by app/__init__.py, so every import made by the app is
+  covered; it adds a few microseconds per import and is off by default.
+
+Configuration (environment variables):
+    SMARTTAX_PREWARM: Set to 0 to disable background pre-warming
+        (default: 1)
+    SMARTTAX_PREWARM_DELAY: Seconds to wait after startup before
+        pre-warming, so health checks are not contended (default: 1.0)
+    SMARTTAX_IMPORT_PROFILE: Set to 1 to time every module import
+        (default: 0)
+
+Author: SmartTax Team
+"""
+
+import gc
+import importlib
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+PREWARM_ENABLED = os.getenv("SMARTTAX_PREWARM", "1") != "0"
+PREWARM_DELAY = float(os.getenv("SMARTTAX_PREWARM_DELAY", "1.0"))
+IMPORT_PROFILE_ENABLED = os.getenv("SMARTTAX_IMPORT_PROFILE", "0") == "1"
+
+# Third-party modules that dominate cold start, reported by /debug/startup
+HEAVY_MODULES = ("numpy", "pandas", "openpyxl", "pdfplumber", "fitz", "pytesseract", "PIL")
+
+# Imported by the pre-warm thread in the API process, in this order
+# (format detection and the breakdown store run in the API process itself)
+PREWARM_MODULES = ("pandas", "openpyxl", "app.breakdown", "app.report_formats",
+                   "app.mf_statement_parser")
+
+
+def _process_start_time() -> float:
+    """Wall-clock time the process started (Linux /proc), else now"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        started_ago = uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.time() - max(0.0, started_ago)
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+
+PROCESS_START = _process_start_time()
+
+_marks: Dict[str, float] = {}
+
+
+def mark(name: str):
+    """Record a start-up milestone (first call per name wins)"""
+    _marks.setdefault(name, round((time.time() - PROCESS_START) * 1000, 1))
+
+
+# ============================================================
+# IMPORT PROFILER
+# ============================================================
+
+class ImportProfiler:
+    """
+    Meta path finder that times module execution, like -X importtime.
+
+    It finds nothing itself: it asks the remaining finders for the spec
+    and wraps the loader's ``exec_module`` on the loader instance.
+    """
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def install(self):
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+
+        loader = spec.loader
+        # Built-in and frozen importers are classes; their imports are cheap
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            try:
+                loader.exec_module = self._timed(loader.exec_module, name)
+            except AttributeError:
+                pass
+        return spec
+
+    def _timed(self, exec_module, name: str):
+        def timed_exec_module(module):
+            stack = self._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)           # time spent in nested imports
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += total
+                with self._lock:
+                    self.records.append({
+                        "module": name,
+                        "self_us": int((total - nested) * 1e6),
+                        "cumulative_us": int(total * 1e6),
+                        "depth": len(stack),
+                        "thread": threading.current_thread().name,
+                    })
+        return timed_exec_module
+
+    def report(self, top: int = 30) -> dict:
+        with self._lock:
+            records = list(self.records)
+        return {
+            "modules": len(records),
+            "total_ms": round(sum(r["self_us"] for r in records) / 1000, 1),
+            "slowest": sorted(records, key=lambda r: r["cumulative_us"], reverse=True)[:top],
+        }
+
+
+_profiler: Optional[ImportProfiler] = None
+
+
+def install_import_profiler():
+    """Start timing imports if SMARTTAX_IMPORT_PROFILE=1 (idempotent)"""
+    global _profiler
+    if IMPORT_PROFILE_ENABLED and _profiler is None:
+        _profiler = ImportProfiler()
+        _profiler.install()
+
+
+# ============================================================
+# PRE-WARMING
+# ============================================================
+
+class Prewarmer:
+    """Background import of parser dependencies and worker processes"""
+
+    def __init__(self, enabled: bool = PREWARM_ENABLED, delay: float = PREWARM_DELAY):
+        self.enabled = enabled
+        self.delay = delay
+        self.state = "disabled" if not enabled else "pending"
+        self.modules: Dict[str, float] = {}     # module -> ms to import
+        self.workers: Dict[str, float] = {}     # parser kind -> ms in a worker
+        self.error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, parse_pool):
+        """Pre-warm in a daemon thread after ``delay`` seconds (idempotent)"""
+        if not self.enabled or self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._run, args=(parse_pool,), name="smarttax-prewarm", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, parse_pool):
+        time.sleep(self.delay)
+        self.state = "running"
+        try:
+            for name in PREWARM_MODULES:
+                start = time.perf_counter()
+                importlib.import_module(name)
+                self.modules[name] = round((time.perf_counter() - start) * 1000, 1)
+            self.workers = parse_pool.warm()
+            self.state = "done"
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            self.state = "failed"
+        mark("prewarm_" + self.state)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "delay_s": self.delay,
+            "state": self.state,
+            "modules_ms": dict(self.modules),
+            "workers_ms": dict(self.workers),
+            "error": self.error,
+        }
+
+
+# ============================================================
+# PRE-FORK (MULTI-WORKER)
+# ============================================================
+
+def preload() -> float:
+    """
+    Build shared state in the gunicorn master before the workers fork
+    (see gunicorn.conf.py): parser modules and objects, and the compiled
+    tax rules for every year. Workers inherit it copy-on-write; objects
+    are moved out of the garbage collector's reach (``gc.freeze``) so
+    collections in the workers do not write to, and so copy, those pages.
+
+    Returns milliseconds taken.
+    """
+    from app.tax_rules import available_rules
+    from app.worker_pool import PARSER_VERSIONS, warm_parsers
+
+    start = time.perf_counter()
+    for name in PREWARM_MODULES:
+        importlib.import_module(name)
+    warm_parsers(tuple(PARSER_VERSIONS))
+    available_rules()       # loads and compiles every rule file
+    gc.collect()
+    gc.freeze()
+    mark("preloaded")
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def report(prewarmer: Optional[Prewarmer] = None, top: int = 30) -> dict:
+    """Start-up report served by GET /debug/startup"""
+    return {
+        "uptime_s": round(time.time() - PROCESS_START, 1),
+        "milestones_ms": dict(_marks),
+        "heavy_modules_loaded": {name: name in sys.modules for name in HEAVY_MODULES},
+        "prewarm": prewarmer.stats() if prewarmer is not None else None,
+        "imports": _profiler.report(top) if _profiler is not None else None,
+    }
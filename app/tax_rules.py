@@ -0,0 +1,319 @@
+"""
+Versioned Tax Rule Registry
+
+Every rate, limit and slab schedule used by the calculators, parsers and
+chatbot comes from the data files in ``app/rules/`` (one JSON file per
+financial year, holding both the new and old regime). They are loaded and
+compiled once, at first use, into immutable TaxRules objects with
+precompiled SlabTables, so a single process can serve several years and
+regimes by passing a different TaxRules around instead of branching on
+every call.
+
+Data file layout (``app/rules/fy<YYYY-YY>.json``):
+    financial_year, version, cess_rate,
+    capital_gains: cut_off_date (or null), ltcg_exemption and equity /
+        equity MF rates before and after the cut-off,
+    regimes: {"new": {...}, "old": {...}} with standard_deduction,
+        rebate_87a_limit, rebate_87a_max (null = full rebate) and slabs
+        as [upper_limit, rate] pairs (last upper_limit null = no limit)
+
+Bump ``version`` in a file whenever its numbers change; it is part of
+TaxRules.rule_version, which caches use in their keys.
+
+Configuration (environment variables):
+    SMARTTAX_RULES_DIR: Directory of rule files (default: app/rules)
+    SMARTTAX_DEFAULT_FY: Financial year used when none is requested
+        (default: 2024-25)
+    SMARTTAX_DEFAULT_REGIME: "new" or "old" (default: new)
+
+Author: SmartTax Team
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_right
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+RULES_DIR = os.getenv(
+    "SMARTTAX_RULES_DIR", os.path.join(os.path.dirname(__file__), "rules")
+)
+DEFAULT_FY = os.getenv("SMARTTAX_DEFAULT_FY", "2024-25")
+DEFAULT_REGIME = os.getenv("SMARTTAX_DEFAULT_REGIME", "new")
+
+
+class UnknownRulesError(ValueError):
+    """Raised when no rules exist for the requested year / regime"""
+
+
+# ============================================================
+# SLAB TABLES
+# ============================================================
+
+class SlabTable(NamedTuple):
+    """
+    A progressive slab schedule compiled for constant-time-ish lookups.
+
+    ``lowers[i]`` is the lower bound of slab i, ``rates[i]`` its rate and
+    ``cum_tax[i]`` the total tax on all income below ``lowers[i]``. Tax on
+    any income is then one bisect plus one multiply-add.
+
+    The cumulative tax is summed slab by slab in the same order as the
+    original loop, so results are identical to it bit for bit.
+    Build tables with compile_slabs(); they are immutable and shared.
+    """
+    lowers: Tuple[float, ...]
+    rates: Tuple[float, ...]
+    cum_tax: Tuple[float, ...]
+
+    def tax(self, income: float) -> float:
+        """Slab tax on ``income`` (before rebate and cess)"""
+        if income <= 0:
+            return 0.0
+        i = bisect_right(self.lowers, income) - 1
+        return self.cum_tax[i] + (income - self.lowers[i]) * self.rates[i]
+
+    def tax_array(self, income: np.ndarray) -> np.ndarray:
+        """Slab tax for a whole array of incomes"""
+        lowers = np.asarray(self.lowers)
+        idx = np.clip(np.searchsorted(lowers, income, side="right") - 1, 0, len(lowers) - 1)
+        tax = np.asarray(self.cum_tax)[idx] + (income - lowers[idx]) * np.asarray(self.rates)[idx]
+        return np.where(income > 0, tax, 0.0)
+
+
+@lru_cache(maxsize=None)
+def _compile_slabs(slabs: Tuple[Tuple[float, float], ...]) -> SlabTable:
+    lowers, rates, cum_tax = [], [], []
+    prev_limit, tax = 0.0, 0.0
+
+    for limit, rate in slabs:
+        lowers.append(prev_limit)
+        rates.append(rate)
+        cum_tax.append(tax)
+        tax += (limit - prev_limit) * rate
+        prev_limit = limit
+
+    return SlabTable(tuple(lowers), tuple(rates), tuple(cum_tax))
+
+
+def compile_slabs(slabs: Iterable[Tuple[float, float]]) -> SlabTable:
+    """
+    Compile ``(upper_limit, rate)`` slabs (ascending, last limit inf) into
+    a SlabTable. Identical schedules return the same shared instance.
+    """
+    return _compile_slabs(tuple((float(limit), float(rate)) for limit, rate in slabs))
+
+
+# ============================================================
+# COMPILED RULES
+# ============================================================
+
+class TaxRules(NamedTuple):
+    """All rates and limits for one financial year and regime"""
+    financial_year: str
+    regime: str
+    version: int
+
+    # Salary / slab tax
+    standard_deduction: float
+    rebate_87a_limit: float
+    rebate_87a_max: Optional[float]   # None = full rebate
+    slabs: Tuple[Tuple[float, float], ...]
+    slab_table: SlabTable
+    cess_rate: float
+
+    # Capital gains
+    cut_off_date: Optional[date]      # None = one rate for the whole year
+    ltcg_exemption: float
+    equity_stcg_rate_before: float
+    equity_stcg_rate_after: float
+    equity_ltcg_rate_before: float
+    equity_ltcg_rate_after: float
+    equity_mf_stcg_rate: float
+    equity_mf_ltcg_rate: float
+
+    @property
+    def rule_version(self) -> str:
+        """Stable identifier, e.g. "FY2024-25/new/v1" """
+        return f"FY{self.financial_year}/{self.regime}/v{self.version}"
+
+    def apply_rebate(self, taxable_income: float, tax: float) -> float:
+        """Section 87A rebate on slab tax"""
+        if taxable_income > self.rebate_87a_limit:
+            return tax
+        if self.rebate_87a_max is None:
+            return 0.0
+        return max(0.0, tax - self.rebate_87a_max)
+
+
+def _compile_file(data: dict) -> List[TaxRules]:
+    """Compile one parsed rule file into a TaxRules per regime"""
+    cg = data["capital_gains"]
+    cut_off = cg.get("cut_off_date")
+
+    rules = []
+    for regime, r in data["regimes"].items():
+        slabs = tuple(
+            (float("inf") if limit is None else limit, rate)
+            for limit, rate in r["slabs"]
+        )
+        rules.append(TaxRules(
+            financial_year=data["financial_year"],
+            regime=regime,
+            version=data.get("version", 1),
+            standard_deduction=r["standard_deduction"],
+            rebate_87a_limit=r["rebate_87a_limit"],
+            rebate_87a_max=r.get("rebate_87a_max"),
+            slabs=slabs,
+            slab_table=compile_slabs(slabs),
+            cess_rate=data["cess_rate"],
+            cut_off_date=date.fromisoformat(cut_off) if cut_off else None,
+            ltcg_exemption=cg["ltcg_exemption"],
+            equity_stcg_rate_before=cg["equity_stcg_rate_before"],
+            equity_stcg_rate_after=cg["equity_stcg_rate_after"],
+            equity_ltcg_rate_before=cg["equity_ltcg_rate_before"],
+            equity_ltcg_rate_after=cg["equity_ltcg_rate_after"],
+            equity_mf_stcg_rate=cg["equity_mf_stcg_rate"],
+            equity_mf_ltcg_rate=cg["equity_mf_ltcg_rate"],
+        ))
+    return rules
+
+
+# ============================================================
+# REGISTRY
+# ============================================================
+
+_REGISTRY: Optional[Dict[Tuple[str, str], TaxRules]] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def load_rules(directory: str = RULES_DIR) -> Dict[Tuple[str, str], TaxRules]:
+    """Read and compile every ``*.json`` rule file in ``directory``"""
+    registry = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".json"):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            for rules in _compile_file(json.load(f)):
+                registry[(rules.financial_year, rules.regime)] = rules
+    return registry
+
+
+def _registry() -> Dict[Tuple[str, str], TaxRules]:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = load_rules()
+    return _REGISTRY
+
+
+def get_rules(financial_year: Optional[str] = None, regime: Optional[str] = None) -> TaxRules:
+    """
+    Compiled rules for a financial year ("2024-25") and regime ("new"/"old").
+
+    Either argument may be None to use the configured default.
+
+    Raises:
+        UnknownRulesError: No rule file covers the requested combination
+    """
+    fy = financial_year or DEFAULT_FY
+    reg = (regime or DEFAULT_REGIME).lower()
+    if fy.upper().startswith("FY"):
+        fy = fy[2:].strip()
+
+    try:
+        return _registry()[(fy, reg)]
+    except KeyError:
+        raise UnknownRulesError(f"No tax rules for FY {fy} ({reg} regime)")
+
+
+def available_rules() -> List[dict]:
+    """Financial years and regimes that can be requested"""
+    return [
+        {"financial_year": fy, "regime": regime, "rule_version": rules.rule_version}
+        for (fy, regime), rules in sorted(_registry().items())
+    ]
+
+
+# ============================================================
+# HUMAN-READABLE RULES (CHATBOT PROMPT / ANSWERS)
+# ============================================================
+
+def format_inr(amount: float) -> str:
+    """Indian digit grouping: 1200000 -> "₹12,00,000" """
+    digits = str(int(round(amount)))
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        if head:
+            groups.insert(0, head)
+        digits = ",".join(groups) + "," + tail
+    return f"₹{digits}"
+
+
+def format_rate(rate: float) -> str:
+    """0.125 -> "12.5%" """
+    return f"{rate * 100:g}%"
+
+
+def cut_off_label(rules: TaxRules) -> str:
+    """Cut-off date as used in rate descriptions, e.g. "23 July" """
+    return f"{rules.cut_off_date.day} {rules.cut_off_date:%B}"
+
+
+def describe_rules(rules: TaxRules) -> str:
+    """The rules and slab schedule as plain text for the chatbot prompt"""
+    regime = f"{rules.regime.title()} Regime"
+
+    if rules.rebate_87a_max is None:
+        rebate = f"Full tax rebate if taxable income ≤ {format_inr(rules.rebate_87a_limit)}"
+    else:
+        rebate = (
+            f"Rebate up to {format_inr(rules.rebate_87a_max)} "
+            f"if taxable income ≤ {format_inr(rules.rebate_87a_limit)}"
+        )
+
+    if rules.cut_off_date:
+        label = cut_off_label(rules)
+        stcg = (f"- Equity STCG (before {label}): {format_rate(rules.equity_stcg_rate_before)}, "
+                f"(after): {format_rate(rules.equity_stcg_rate_after)}")
+        ltcg = (f"- Equity LTCG (before {label}): {format_rate(rules.equity_ltcg_rate_before)}, "
+                f"(after): {format_rate(rules.equity_ltcg_rate_after)}")
+    else:
+        stcg = f"- Equity STCG: {format_rate(rules.equity_stcg_rate_after)}"
+        ltcg = f"- Equity LTCG: {format_rate(rules.equity_ltcg_rate_after)}"
+
+    lines = [
+        f"Tax Rules (FY {rules.financial_year} {regime}):",
+        f"- Standard Deduction: {format_inr(rules.standard_deduction)}",
+        f"- Section 87A Rebate: {rebate}",
+        f"- LTCG Exemption: {format_inr(rules.ltcg_exemption)} on equity/equity MF",
+        f"- Health & Education Cess: {format_rate(rules.cess_rate)} on total income tax",
+        stcg,
+        ltcg,
+        f"- Equity MF STCG: {format_rate(rules.equity_mf_stcg_rate)}, "
+        f"LTCG: {format_rate(rules.equity_mf_ltcg_rate)}",
+        "- Debt MF gains: Added to income, taxed as per slab",
+        "",
+        f"Tax Slabs ({regime}):",
+    ]
+
+    prev_limit = 0
+    for limit, rate in rules.slabs:
+        if prev_limit == 0:
+            lines.append(f"- Up to {format_inr(limit)}: {format_rate(rate)}")
+        elif limit == float("inf"):
+            lines.append(f"- Above {format_inr(prev_limit)}: {format_rate(rate)}")
+        else:
+            lines.append(f"- {format_inr(prev_limit + 1)} - {format_inr(limit)}: {format_rate(rate)}")
+        prev_limit = limit
+
+    return "\n".join(lines)
@@ -0,0 +1,606 @@
+"""
+Tradebook Capital Gains Engine (FIFO Lot Matching)
+
+Broker P&L reports already contain realised gains; a tradebook only has
+the raw buys and sells. This module computes the gains itself:
+
+1. Read the tradebook (Zerodha tradebook CSV, Groww order history
+   .xlsx/.csv, or any sheet with ISIN/symbol, date, buy/sell, quantity
+   and price columns) into flat NumPy arrays
+2. Sort trades by scrip (ISIN, else symbol) and execution time. As
+   brokers do, a scrip's buys and sells on the same day are first netted
+   against each other as intraday trades (speculative income, not capital
+   gains), whatever the holdings before that day. Only the rest is
+   delivery: a remaining sell is matched against the oldest open buy lots
+   of the scrip (FIFO), and remaining buys become new lots. Each scrip's
+   open lots live in plain parallel lists with a head index, so matching
+   is a tight loop with no per-lot objects
+3. Classify the matched lots in bulk: long term if held more than 12
+   months, sold before/after the rules' cut-off date; intraday lots
+   (bought and sold the same day) are set aside
+4. Apply grandfathering to long-term lots bought on or before
+   31 Jan 2018: cost = max(actual cost, min(FMV on 31 Jan 2018, sale
+   value)), using FMVs from SMARTTAX_FMV_FILE
+
+Output has the same four buckets as GrowwCapitalGainsParser
+(stcg_before, stcg_after, ltcg_before, ltcg_after) plus matching stats.
+Brokerage and other charges are not in tradebooks and are not deducted.
+
+Configuration (environment variables):
+    SMARTTAX_FMV_FILE: CSV of ``isin,fmv`` (31 Jan 2018 closing price) used
+        for grandfathering (default: unset; pre-2018 lots then use their
+        actual cost and are counted in ``grandfathering_missing_fmv``)
+
+Author: SmartTax Team
+"""
+
+import csv
+import io
+import os
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app import metrics
+from app.breakdown import BUCKET_CODES, Breakdown, bucket_codes
+from app.excel_reader import can_stream, iter_sheet_rows
+from app.groww_parser import parse_amount_column
+from app.tax_rules import get_rules
+
+FMV_FILE = os.getenv("SMARTTAX_FMV_FILE") or None
+
+# Lots bought on or before this date are grandfathered (Section 112A)
+GRANDFATHERING_DATE = np.datetime64("2018-01-31")
+
+# Equity held for more than this many months is long term
+LTCG_HOLDING_MONTHS = 12
+
+# Header rows are looked for in the first rows only
+HEADER_SCAN_ROWS = 50
+
+# Quantities below this are treated as fully consumed (float noise)
+_EPS = 1e-9
+
+# Canonical column -> header names used by supported brokers
+COLUMN_ALIASES = {
+    "isin": ("isin",),
+    "symbol": ("symbol", "stock name", "scrip", "scrip name", "name", "tradingsymbol"),
+    "time": ("order_execution_time", "execution date and time", "trade time",
+             "order execution time", "trade_date", "trade date", "date"),
+    "date": ("trade_date", "trade date", "execution date and time", "date"),
+    "side": ("trade_type", "trade type", "type", "buy/sell", "transaction type", "side"),
+    "quantity": ("quantity", "qty", "qty."),
+    "price": ("price", "trade price", "rate"),
+    "value": ("value", "amount", "trade value"),
+    "status": ("order status", "status"),
+}
+
+# Zerodha writes ISO dates; everything else is day-first (12-05-2024)
+_ISO_DATE = re.compile(r"^\s*\d{4}-\d{2}-\d{2}")
+
+_ISIN = re.compile(r"^IN[A-Z0-9]{10}$")
+
+# Order statuses that mean the trade happened
+_EXECUTED = {"executed", "complete", "completed", "traded", "success", ""}
+
+
+class TradebookFormatError(ValueError):
+    """Raised when no usable tradebook header is found"""
+
+
+class Trades(NamedTuple):
+    """Executed trades as parallel arrays"""
+    scrips: List[str]          # scrip names, indexed by ``scrip``
+    symbols: List[str]         # trading symbol per scrip ("" if unknown)
+    scrip: np.ndarray          # int code per trade
+    day: np.ndarray            # datetime64[D]
+    order: np.ndarray          # int64 execution time; ties keep row order
+    is_buy: np.ndarray         # bool
+    quantity: np.ndarray       # float64
+    price: np.ndarray          # float64
+
+
+class Lots(NamedTuple):
+    """Matched (buy lot, sell) pairs as parallel arrays"""
+    scrip: np.ndarray
+    buy_day: np.ndarray
+    sell_day: np.ndarray
+    quantity: np.ndarray
+    buy_price: np.ndarray
+    sell_price: np.ndarray
+
+
+# ============================================================
+# READING
+# ============================================================
+
+def resolve_header(row: Sequence[Any]) -> Optional[Dict[str, int]]:
+    """Column index per canonical name, or None if ``row`` is not a header"""
+    headers = [str(h).strip().lower() if h is not None else "" for h in row]
+    columns = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in headers:
+                columns[name] = headers.index(alias)
+                break
+
+    if "time" in columns and columns["time"] == columns.get("date"):
+        del columns["time"]
+
+    has_scrip = "isin" in columns or "symbol" in columns
+    has_price = "price" in columns or "value" in columns
+    if has_scrip and has_price and {"side", "quantity", "date"} <= columns.keys():
+        return columns
+    return None
+
+
+def _rows(file) -> Iterable[Sequence[Any]]:
+    if can_stream(file):
+        return iter_sheet_rows(file)
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    return csv.reader(text)
+
+
+def read_columns(rows: Iterable[Sequence[Any]]) -> Dict[str, list]:
+    """
+    Find the header row and collect the tradebook columns below it.
+
+    Raises:
+        TradebookFormatError: No header row in the first HEADER_SCAN_ROWS rows
+    """
+    columns = None
+    data: Dict[str, list] = {}
+
+    for i, row in enumerate(rows):
+        if columns is None:
+            columns = resolve_header(row)
+            if columns is None and i >= HEADER_SCAN_ROWS:
+                break
+            if columns is not None:
+                data = {name: [] for name in columns}
+            continue
+
+        for name, idx in columns.items():
+            data[name].append(row[idx] if idx < len(row) else None)
+
+    if columns is None:
+        raise TradebookFormatError(
+            "No tradebook header found (need ISIN or symbol, date, buy/sell, quantity and price)"
+        )
+    return data
+
+
+def _to_datetime64(values, **kwargs) -> np.ndarray:
+    parsed = pd.DatetimeIndex(pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", **kwargs))
+    if parsed.tz is not None:
+        parsed = parsed.tz_localize(None)
+    return parsed.to_numpy(dtype="datetime64[ns]")
+
+
+def parse_times(values: list) -> np.ndarray:
+    """
+    datetime64[ns] per value (NaT if unparseable).
+
+    Distinct values are parsed once, in bulk: date/datetime cells as they
+    are, ISO strings as ISO, other strings day-first with the format
+    inferred from the first one; values that format misses are retried
+    one by one.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = np.asarray(uniques, dtype=object)
+    parsed = np.full(len(uniques) + 1, np.datetime64("NaT"), dtype="datetime64[ns]")
+
+    is_str = np.array([isinstance(v, str) for v in uniques], dtype=bool)
+    is_iso = np.array([bool(_ISO_DATE.match(v)) if isinstance(v, str) else False for v in uniques],
+                      dtype=bool)
+
+    for mask, kwargs in (
+        (~is_str, {}),
+        (is_iso, {"format": "ISO8601"}),
+        (is_str & ~is_iso, {"dayfirst": True}),
+    ):
+        idx = np.flatnonzero(mask)
+        if len(idx):
+            parsed[idx] = _to_datetime64(uniques[idx], **kwargs)
+
+    for j in np.flatnonzero(np.isnat(parsed[:-1])):
+        val = uniques[j]
+        iso = isinstance(val, str) and _ISO_DATE.match(val)
+        parsed[j] = _to_datetime64([val], dayfirst=not iso)[0]
+
+    # Missing cells have code -1, which indexes the trailing NaT slot
+    return parsed[codes]
+
+
+def _labels(values: list) -> np.ndarray:
+    """Stripped lowercase text per value ("" for empty cells), via distinct values"""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    labels = np.array([str(v).strip().lower() for v in uniques] + [""], dtype=object)
+    return labels[codes]
+
+
+def parse_numbers(values: list) -> np.ndarray:
+    """
+    Float per value. Plain numbers are converted in bulk; anything else
+    ("1,234.50", "(12)") goes through the Groww amount parser.
+    """
+    col = pd.Series(values, dtype=object)
+    numbers = pd.to_numeric(col, errors="coerce").astype(float).to_numpy()
+    retry = np.isnan(numbers) & col.notna().to_numpy()
+    if retry.any():
+        numbers[retry] = parse_amount_column(col[retry])
+    return np.nan_to_num(numbers)
+
+
+def _scrip_names(values: list) -> np.ndarray:
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    names = np.array([str(v).strip() for v in uniques] + [""], dtype=object)
+    return names[codes]
+
+
+def build_trades(data: Dict[str, list]) -> Trades:
+    """Turn read_columns output into Trades, dropping unusable rows"""
+    n = len(data["quantity"])
+
+    side = _labels(data["side"])
+    is_buy = np.char.startswith(side.astype(str), "b")
+    is_sell = np.char.startswith(side.astype(str), "s")
+
+    quantity = np.abs(parse_numbers(data["quantity"]))
+    if "price" in data:
+        price = parse_numbers(data["price"])
+    else:
+        value = parse_numbers(data["value"])
+        price = np.divide(np.abs(value), quantity, out=np.zeros(n), where=quantity > 0)
+
+    days = parse_times(data["date"])
+    if "time" in data:
+        # The trade date gives the day; the execution time only orders trades
+        times = parse_times(data["time"])
+        times = np.where(np.isnat(times), days, times)
+    else:
+        times = days
+
+    keep = (is_buy | is_sell) & (quantity > 0) & ~np.isnat(days)
+    if "status" in data:
+        keep &= np.isin(_labels(data["status"]), list(_EXECUTED))
+
+    names = _scrip_names(data["isin"] if "isin" in data else data["symbol"])
+    if "isin" in data and "symbol" in data:
+        names = np.where(names == "", _scrip_names(data["symbol"]), names)
+    keep &= names != ""
+
+    codes, scrips = pd.factorize(names[keep])
+    if "symbol" in data:
+        # factorize numbers scrips in order of first appearance
+        first = np.unique(codes, return_index=True)[1]
+        symbols = _scrip_names(data["symbol"])[keep][first].tolist()
+    else:
+        symbols = [""] * len(scrips)
+
+    return Trades(
+        scrips=list(scrips),
+        symbols=symbols,
+        scrip=codes.astype(np.int64),
+        day=days[keep].astype("datetime64[D]"),
+        order=times[keep].astype(np.int64),
+        is_buy=is_buy[keep],
+        quantity=quantity[keep],
+        price=price[keep],
+    )
+
+
+def read_tradebook(file) -> Trades:
+    """Trades from a tradebook file (.xlsx or .csv, as a binary file object)"""
+    with metrics.stage("read"):
+        data = read_columns(_rows(file))
+    with metrics.stage("build_trades"):
+        return build_trades(data)
+
+
+def load_fmv(path: Optional[str] = FMV_FILE) -> Dict[str, float]:
+    """ISIN -> 31 Jan 2018 FMV from an ``isin,fmv`` CSV ({} if no file)"""
+    if not path:
+        return {}
+    fmv = {}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) < 2:
+                continue
+            try:
+                fmv[row[0].strip()] = float(row[1].replace(",", ""))
+            except ValueError:
+                continue    # header or malformed row
+    return fmv
+
+
+# ============================================================
+# FIFO MATCHING
+# ============================================================
+
+class MatchResult(NamedTuple):
+    lots: Lots
+    unmatched_sell_quantity: float
+    open_lots: int
+
+
+def match_fifo(trades: Trades) -> MatchResult:
+    """
+    Match every sell against buys of the same scrip.
+
+    A day's sells are matched against that day's buys first (FIFO within
+    the day; these lots are intraday), then against the oldest open lots.
+    That day's buys left over are appended to the open lots afterwards.
+    Sells with no buys left (short sales, or holdings bought before the
+    tradebook starts) are counted in ``unmatched_sell_quantity``.
+    """
+    idx = np.lexsort((trades.order, trades.scrip))
+    scrip_sorted = trades.scrip[idx]
+    day_sorted = trades.day[idx].astype(np.int64)
+    buy_sorted = trades.is_buy[idx]
+
+    # Days on which a scrip was both bought and sold; only their trades
+    # need the intraday netting below, the rest is plain FIFO
+    n = len(idx)
+    starts = np.flatnonzero(np.r_[True, (scrip_sorted[1:] != scrip_sorted[:-1])
+                                  | (day_sorted[1:] != day_sorted[:-1])]) if n else np.zeros(0, int)
+    sizes = np.diff(np.r_[starts, n])
+    day_buys = np.add.reduceat(buy_sorted.astype(np.int64), starts) if n else np.zeros(0, int)
+    mixed_day = (day_buys > 0) & (day_buys < sizes)
+    mixed = np.repeat(mixed_day, sizes).tolist()
+    day_end = np.repeat(starts + sizes, sizes).tolist()
+
+    scrip = scrip_sorted.tolist()
+    day = day_sorted.tolist()
+    is_buy = buy_sorted.tolist()
+    quantity = trades.quantity[idx].tolist()
+    price = trades.price[idx].tolist()
+
+    out_scrip, out_buy_day, out_sell_day = [], [], []
+    out_qty, out_buy_price, out_sell_price = [], [], []
+    unmatched = 0.0
+    open_lots = 0
+
+    # Open lots of the current scrip: parallel lists consumed from ``head``
+    lot_qty: List[float] = []
+    lot_price: List[float] = []
+    lot_day: List[int] = []
+    head = 0
+    current = None
+
+    def take_lots(qty, prices, days, first, sell_day, sell_price, remaining):
+        """Match ``remaining`` against lots from index ``first``; returns both updated"""
+        while remaining > _EPS and first < len(qty):
+            take = min(remaining, qty[first])
+            out_scrip.append(current)
+            out_buy_day.append(days[first])
+            out_sell_day.append(sell_day)
+            out_qty.append(take)
+            out_buy_price.append(prices[first])
+            out_sell_price.append(sell_price)
+
+            remaining -= take
+            qty[first] -= take
+            if qty[first] <= _EPS:
+                first += 1
+        return first, remaining
+
+    i = 0
+    while i < n:
+        if scrip[i] != current:
+            open_lots += len(lot_qty) - head
+            lot_qty, lot_price, lot_day = [], [], []
+            head = 0
+            current = scrip[i]
+
+        if mixed[i]:
+            # The day's sells take the day's buys first (intraday), then
+            # older lots; the day's buys left over are appended as new lots
+            end = day_end[i]
+            day_k = [k for k in range(i, end) if is_buy[k]]
+            day_qty = [quantity[k] for k in day_k]
+            day_price = [price[k] for k in day_k]
+            day_days = [day[i]] * len(day_k)
+            day_head = 0
+
+            for k in range(i, end):
+                if is_buy[k]:
+                    continue
+                day_head, remaining = take_lots(day_qty, day_price, day_days, day_head,
+                                                day[k], price[k], quantity[k])
+                head, remaining = take_lots(lot_qty, lot_price, lot_day, head,
+                                            day[k], price[k], remaining)
+                if remaining > _EPS:
+                    unmatched += remaining
+
+            for k in range(day_head, len(day_qty)):
+                if day_qty[k] > _EPS:
+                    lot_qty.append(day_qty[k])
+                    lot_price.append(day_price[k])
+                    lot_day.append(day_days[k])
+            i = end
+
+        elif is_buy[i]:
+            lot_qty.append(quantity[i])
+            lot_price.append(price[i])
+            lot_day.append(day[i])
+            i += 1
+            continue
+
+        else:
+            remaining = quantity[i]
+            while remaining > _EPS and head < len(lot_qty):
+                take = min(remaining, lot_qty[head])
+                out_scrip.append(current)
+                out_buy_day.append(lot_day[head])
+                out_sell_day.append(day[i])
+                out_qty.append(take)
+                out_buy_price.append(lot_price[head])
+                out_sell_price.append(price[i])
+
+                remaining -= take
+                lot_qty[head] -= take
+                if lot_qty[head] <= _EPS:
+                    head += 1
+
+            if remaining > _EPS:
+                unmatched += remaining
+            i += 1
+
+        # Drop consumed lots once they dominate the queue
+        if head > 64 and head * 2 > len(lot_qty):
+            del lot_qty[:head], lot_price[:head], lot_day[:head]
+            head = 0
+
+    open_lots += len(lot_qty) - head
+
+    lots = Lots(
+        scrip=np.array(out_scrip, dtype=np.int64),
+        buy_day=np.array(out_buy_day, dtype=np.int64).astype("datetime64[D]"),
+        sell_day=np.array(out_sell_day, dtype=np.int64).astype("datetime64[D]"),
+        quantity=np.array(out_qty, dtype=np.float64),
+        buy_price=np.array(out_buy_price, dtype=np.float64),
+        sell_price=np.array(out_sell_price, dtype=np.float64),
+    )
+    return MatchResult(lots, unmatched, open_lots)
+
+
+# ============================================================
+# CLASSIFICATION
+# ============================================================
+
+def long_term_after(buy_day: np.ndarray, months: int = LTCG_HOLDING_MONTHS) -> np.ndarray:
+    """
+    Last day that still counts as short term for each buy date
+    (same day ``months`` later, clamped to the end of that month).
+    """
+    month = buy_day.astype("datetime64[M]")
+    offset = buy_day - month.astype("datetime64[D]")
+    same_day = (month + months).astype("datetime64[D]") + offset
+    month_end = (month + months + 1).astype("datetime64[D]") - 1
+    return np.minimum(same_day, month_end)
+
+
+class LotGains(NamedTuple):
+    gain: np.ndarray
+    long_term: np.ndarray
+    before_cut_off: np.ndarray
+    intraday: np.ndarray
+    grandfathered: np.ndarray
+    missing_fmv: np.ndarray
+
+
+def classify_lots(lots: Lots, scrips: List[str], cut_off: date,
+                  fmv: Optional[Dict[str, float]] = None) -> LotGains:
+    """Gain and bucket flags for every matched lot"""
+    fmv = fmv or {}
+
+    sale = lots.quantity * lots.sell_price
+    cost = lots.quantity * lots.buy_price
+
+    intraday = lots.buy_day == lots.sell_day
+    long_term = lots.sell_day > long_term_after(lots.buy_day)
+    before_cut_off = lots.sell_day < np.datetime64(cut_off)
+
+    eligible = long_term & (lots.buy_day <= GRANDFATHERING_DATE)
+    scrip_fmv = np.array([fmv.get(s, np.nan) for s in scrips], dtype=np.float64)
+    lot_fmv = scrip_fmv[lots.scrip] if len(scrips) else np.zeros(0)
+    has_fmv = eligible & ~np.isnan(lot_fmv)
+
+    fmv_value = np.where(has_fmv, lots.quantity * np.nan_to_num(lot_fmv), 0.0)
+    grandfathered_cost = np.maximum(cost, np.minimum(fmv_value, sale))
+    cost = np.where(has_fmv, grandfathered_cost, cost)
+
+    return LotGains(
+        gain=sale - cost,
+        long_term=long_term,
+        before_cut_off=before_cut_off,
+        intraday=intraday,
+        grandfathered=has_fmv,
+        missing_fmv=eligible & ~has_fmv,
+    )
+
+
+# ============================================================
+# PARSER
+# ============================================================
+
+def lot_breakdown(trades: Trades, lots: Lots, gains: "LotGains") -> Breakdown:
+    """Breakdown with one row per matched lot; cost is after grandfathering"""
+    scrips = np.asarray(trades.scrips, dtype=object)[lots.scrip]
+    symbols = np.asarray(trades.symbols, dtype=object)[lots.scrip]
+    is_isin = np.array([bool(_ISIN.match(s)) for s in trades.scrips], dtype=bool)[lots.scrip]
+
+    bucket = bucket_codes(gains.long_term, gains.before_cut_off)
+    bucket[gains.intraday] = BUCKET_CODES["intraday"]
+    proceeds = lots.quantity * lots.sell_price
+
+    return Breakdown.from_columns(
+        len(lots.quantity),
+        bucket,
+        name=np.where(symbols != "", symbols, scrips),
+        isin=np.where(is_isin, scrips, ""),
+        buy_date=lots.buy_day,
+        sell_date=lots.sell_day,
+        quantity=lots.quantity,
+        cost=proceeds - gains.gain,
+        proceeds=proceeds,
+        gain=gains.gain,
+    )
+
+
+class TradebookCapitalGainsParser:
+    """
+    Capital gains from a raw tradebook by FIFO lot matching.
+
+    ``rules`` selects the cut-off date for the before/after split (years
+    without one report every lot as "before", like the Groww parser);
+    ``fmv`` maps ISIN to its 31 Jan 2018 FMV (default: SMARTTAX_FMV_FILE).
+    """
+
+    def __init__(self, rules=None, fmv: Optional[Dict[str, float]] = None):
+        self.cut_off = (rules or get_rules()).cut_off_date or date.max
+        self.fmv = load_fmv() if fmv is None else fmv
+
+    def parse(self, file) -> dict:
+        return self.compute(read_tradebook(file))
+
+    def parse_with_breakdown(self, file):
+        """Same as parse, plus one Breakdown row per matched lot"""
+        parts = []
+        result = self.compute(read_tradebook(file), breakdown=parts)
+        return result, parts[0]
+
+    def compute(self, trades: Trades, breakdown: Optional[list] = None) -> dict:
+        with metrics.stage("fifo_match"):
+            matched = match_fifo(trades)
+        with metrics.stage("classify"):
+            gains = classify_lots(matched.lots, trades.scrips, self.cut_off, self.fmv)
+        if breakdown is not None:
+            with metrics.stage("breakdown"):
+                breakdown.append(lot_breakdown(trades, matched.lots, gains))
+
+        capital = ~gains.intraday
+        result = {}
+        for name, mask in (
+            ("stcg_before", capital & ~gains.long_term & gains.before_cut_off),
+            ("stcg_after", capital & ~gains.long_term & ~gains.before_cut_off),
+            ("ltcg_before", capital & gains.long_term & gains.before_cut_off),
+            ("ltcg_after", capital & gains.long_term & ~gains.before_cut_off),
+        ):
+            result[name] = round(float(gains.gain[mask].sum()), 2)
+
+        result.update({
+            "intraday_pnl": round(float(gains.gain[gains.intraday].sum()), 2),
+            "trades": int(len(trades.scrip)),
+            "scrips": len(trades.scrips),
+            "matched_lots": int(len(matched.lots.quantity)),
+            "open_lots": matched.open_lots,
+            "unmatched_sell_quantity": round(matched.unmatched_sell_quantity, 6),
+            "grandfathered_lots": int(gains.grandfathered.sum()),
+            "grandfathering_missing_fmv": int(gains.missing_fmv.sum()),
+        })
+        return result
@@ -10,52 +10,66 @@ This module provides core tax calculation functions for:
 All calculations follow Indian Income Tax Act provisions for FY 2024-25.
 Tax rates changed on July 23, 2024 - functions handle both pre and post-change rates.
 
-Constants:
+Rates and limits come from the versioned rule registry (app/tax_rules.py);
+every calculator takes an optional ``rules`` argument and defaults to
+FY 2024-25, New Regime.
+
+Constants (default rules):
     CUT_OFF_DATE: July 23, 2024 - date when tax rates changed
     STANDARD_DEDUCTION: ₹75,000 for salaried individuals
     LTCG_EXEMPTION: ₹1,25,000 annual exemption on equity LTCG
     CESS_RATE: 4% Health & Education Cess on total income tax
     NEW_REGIME_SLABS: Progressive tax slabs for new regime
+    NEW_REGIME_TABLE: NEW_REGIME_SLABS compiled into a SlabTable
 
 Author: SmartTax Team
 Last Updated: 2024
 """
 
-from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from app.tax_rules import SlabTable, TaxRules, compile_slabs, get_rules
 
 # ============================================================
-# TAX CONSTANTS (FY 2024–25 | New Regime | ITR-2 Aligned)
+# TAX CONSTANTS (DEFAULT RULES: FY 2024–25 | New Regime | ITR-2 Aligned)
 # ============================================================
+# Kept for existing callers; the values come from the default rule set in
+# app/rules/. Pass ``rules=get_rules(fy, regime)`` to any calculator to use
+# a different financial year or regime.
+
+DEFAULT_RULES = get_rules()
 
 # Critical date: Tax rates changed on July 23, 2024
-CUT_OFF_DATE = date(2024, 7, 23)
+CUT_OFF_DATE = DEFAULT_RULES.cut_off_date
 
 # Standard deduction for salaried individuals (New Regime)
-STANDARD_DEDUCTION = 75_000
+STANDARD_DEDUCTION = DEFAULT_RULES.standard_deduction
 
 # Annual LTCG exemption on equity shares and equity mutual funds
-LTCG_EXEMPTION = 125_000
+LTCG_EXEMPTION = DEFAULT_RULES.ltcg_exemption
 
 # Health & Education Cess applied on total income tax
-CESS_RATE = 0.04
+CESS_RATE = DEFAULT_RULES.cess_rate
 
 # New Tax Regime slab rates (no deductions except standard deduction)
 # Format: (upper_limit, rate)
-NEW_REGIME_SLABS = [
-    (400_000, 0.00),    # Up to ₹4L: 0%
-    (800_000, 0.05),    # ₹4L - ₹8L: 5%
-    (1_200_000, 0.10),  # ₹8L - ₹12L: 10%
-    (1_600_000, 0.15),  # ₹12L - ₹16L: 15%
-    (2_000_000, 0.20),  # ₹16L - ₹20L: 20%
-    (2_400_000, 0.25),  # ₹20L - ₹24L: 25%
-    (float("inf"), 0.30),  # Above ₹24L: 30%
-]
+NEW_REGIME_SLABS = list(DEFAULT_RULES.slabs)
+
+# Section 87A: no salary tax if taxable income is at most this amount
+REBATE_87A_LIMIT = DEFAULT_RULES.rebate_87a_limit
 
 # ============================================================
-# INTERNAL HELPER — SLAB TAX ENGINE
+# SLAB TAX ENGINE (COMPILED SLAB TABLES)
 # ============================================================
+# SlabTable / compile_slabs live in app.tax_rules and are re-exported here
+
+# Compiled once at import
+NEW_REGIME_TABLE = DEFAULT_RULES.slab_table
+
 
-def _calculate_slab_tax(income: float) -> float:
+def _calculate_slab_tax(income: float, rules: Optional[TaxRules] = None) -> float:
     """
     Calculate tax using progressive slab rates (New Tax Regime).
     
@@ -75,43 +89,36 @@ def _calculate_slab_tax(income: float) -> float:
         - Next ₹2L at 10% = ₹20,000
         - Total = ₹40,000
     """
-    tax = 0.0
-    prev_limit = 0.0
-
-    for limit, rate in NEW_REGIME_SLABS:
-        if income <= prev_limit:
-            break
-
-        taxable_part = min(income, limit) - prev_limit
-        tax += taxable_part * rate
-        prev_limit = limit
-
-    return tax
+    return (rules or DEFAULT_RULES).slab_table.tax(income)
 
 
 # ============================================================
 # 1. SALARY TAX (NEW REGIME)
 # ============================================================
 
-def calculate_new_regime_tax(gross_salary: float, extra_income: float = 0.0):
+def calculate_new_regime_tax(
+    gross_salary: float,
+    extra_income: float = 0.0,
+    rules: Optional[TaxRules] = None
+):
     """
-    Calculates tax under New Regime.
+    Calculates tax under New Regime (or the regime of ``rules``).
     extra_income is used ONLY for:
     - Debt Mutual Funds (post Apr 2023)
     
     Returns tax WITHOUT cess (cess is applied on total tax liability)
     """
+    rules = rules or DEFAULT_RULES
 
     taxable_income = max(
         0.0,
-        gross_salary - STANDARD_DEDUCTION + extra_income
+        gross_salary - rules.standard_deduction + extra_income
     )
 
-    tax = _calculate_slab_tax(taxable_income)
+    tax = rules.slab_table.tax(taxable_income)
 
-    # Section 87A rebate (new regime)
-    if taxable_income <= 1_200_000:
-        tax = 0.0
+    # Section 87A rebate
+    tax = rules.apply_rebate(taxable_income, tax)
 
     return {
         "gross_salary": round(gross_salary, 2),
@@ -129,32 +136,34 @@ def calculate_equity_stock_capital_gains_tax(
     stcg_before: float,
     stcg_after: float,
     ltcg_before: float,
-    ltcg_after: float
+    ltcg_after: float,
+    rules: Optional[TaxRules] = None
 ):
     """
     Equity Shares (Section 111A & 112A)
     """
+    rules = rules or DEFAULT_RULES
 
     # ---------- STCG ----------
     stcg_tax = 0.0
     if stcg_before > 0:
-        stcg_tax += stcg_before * 0.15
+        stcg_tax += stcg_before * rules.equity_stcg_rate_before
     if stcg_after > 0:
-        stcg_tax += stcg_after * 0.20
+        stcg_tax += stcg_after * rules.equity_stcg_rate_after
 
     # ---------- LTCG ----------
     total_ltcg = ltcg_before + ltcg_after
     ltcg_tax = 0.0
 
-    if total_ltcg > LTCG_EXEMPTION:
-        taxable_ltcg = total_ltcg - LTCG_EXEMPTION
+    if total_ltcg > rules.ltcg_exemption:
+        taxable_ltcg = total_ltcg - rules.ltcg_exemption
 
         # Proportionate taxation (before / after 23 July)
         ratio_before = ltcg_before / total_ltcg if total_ltcg else 0.0
         ratio_after = ltcg_after / total_ltcg if total_ltcg else 0.0
 
-        ltcg_tax += taxable_ltcg * ratio_before * 0.10
-        ltcg_tax += taxable_ltcg * ratio_after * 0.125
+        ltcg_tax += taxable_ltcg * ratio_before * rules.equity_ltcg_rate_before
+        ltcg_tax += taxable_ltcg * ratio_after * rules.equity_ltcg_rate_after
 
     return {
         "stcg_tax": round(stcg_tax, 2),
@@ -169,18 +178,20 @@ def calculate_equity_stock_capital_gains_tax(
 
 def calculate_equity_mf_capital_gains_tax(
     equity_stcg: float,
-    equity_ltcg: float
+    equity_ltcg: float,
+    rules: Optional[TaxRules] = None
 ):
     """
     Equity Mutual Funds / Equity ETFs
     """
+    rules = rules or DEFAULT_RULES
 
-    # STCG — flat 20%
-    stcg_tax = max(0.0, equity_stcg) * 0.20
+    # STCG — flat rate (20% in FY 2024-25)
+    stcg_tax = max(0.0, equity_stcg) * rules.equity_mf_stcg_rate
 
-    # LTCG — exemption + flat 12.5%
-    taxable_ltcg = max(0.0, equity_ltcg - LTCG_EXEMPTION)
-    ltcg_tax = taxable_ltcg * 0.125
+    # LTCG — exemption + flat rate (12.5% in FY 2024-25)
+    taxable_ltcg = max(0.0, equity_ltcg - rules.ltcg_exemption)
+    ltcg_tax = taxable_ltcg * rules.equity_mf_ltcg_rate
 
     return {
         "stcg_tax": round(stcg_tax, 2),
@@ -211,3 +222,145 @@ def calculate_debt_mf_taxable_income(
         taxable_income += debt_ltcg
 
     return round(taxable_income, 2)
+
+
+# ============================================================
+# 5. BATCH CALCULATION (VECTORIZED)
+# ============================================================
+
+# Columns accepted by calculate_tax_batch (missing ones default to 0)
+BATCH_INPUT_COLUMNS = (
+    "gross_salary", "tds_paid",
+    "stcg_before", "stcg_after", "ltcg_before", "ltcg_after",
+    "equity_stcg", "equity_ltcg", "debt_stcg", "debt_ltcg",
+)
+
+
+def _round2_array(values: np.ndarray) -> np.ndarray:
+    """
+    ``round(x, 2)`` for every element, matching Python exactly.
+
+    np.round works on the scaled binary value, so at half-paisa ties it can
+    disagree with Python's correctly rounded result. For elements close to a
+    tie, the exact sign of ``200 * x - (2k + 1)`` is recovered with an
+    error-free (Dekker) product and the tie is broken half-to-even, as
+    Python does.
+    """
+    result = np.round(values, 2)
+    scaled = values * 100
+    near = np.abs(scaled - np.floor(scaled) - 0.5) <= 1e-9 * (np.abs(scaled) + 1.0)
+    if not near.any():
+        return result
+
+    x = values[near]
+    k = np.floor(x * 100)
+
+    # x * 200 == p + e exactly (Veltkamp split of x; 200 needs no split)
+    p = x * 200.0
+    c = 134217729.0 * x
+    x_hi = c - (c - x)
+    x_lo = x - x_hi
+    e = (x_hi * 200.0 - p) + x_lo * 200.0
+
+    d = p - (2 * k + 1)
+    sign = np.where(d != 0, np.sign(d), np.sign(e))
+    round_up = (sign > 0) | ((sign == 0) & (k % 2 == 1))
+
+    result[near] = np.where(round_up, k + 1, k) / 100
+    return result
+
+
+def calculate_tax_batch(rules: Optional[TaxRules] = None, **columns) -> dict:
+    """
+    Vectorized version of the /calculate/tax pipeline for many rows at once.
+
+    All rows use the same ``rules`` (default: FY 2024-25, New Regime).
+
+    Each keyword is one of BATCH_INPUT_COLUMNS and holds an equal-length
+    sequence; missing columns are treated as zeros. Every step mirrors the
+    scalar functions above, including where they round.
+
+    Returns:
+        dict of NumPy arrays, one per intermediate and final amount
+    """
+    rules = rules or DEFAULT_RULES
+
+    unknown = set(columns) - set(BATCH_INPUT_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+
+    arrays = {k: np.asarray(v, dtype=float) for k, v in columns.items()}
+    lengths = {len(a) for a in arrays.values()}
+    if len(lengths) > 1:
+        raise ValueError("All columns must have the same length")
+    n = lengths.pop() if lengths else 0
+
+    zeros = np.zeros(n)
+    col = {k: arrays.get(k, zeros) for k in BATCH_INPUT_COLUMNS}
+
+    # ---------- Debt MF income (added to salary) ----------
+    debt_extra_income = _round2_array(
+        np.where(col["debt_stcg"] > 0, col["debt_stcg"], 0.0)
+        + np.where(col["debt_ltcg"] > 0, col["debt_ltcg"], 0.0)
+    )
+
+    # ---------- Salary tax ----------
+    taxable_income = np.maximum(
+        0.0, col["gross_salary"] - rules.standard_deduction + debt_extra_income
+    )
+    salary_tax = rules.slab_table.tax_array(taxable_income)
+    if rules.rebate_87a_max is None:
+        rebated = 0.0
+    else:
+        rebated = np.maximum(0.0, salary_tax - rules.rebate_87a_max)
+    salary_tax = _round2_array(
+        np.where(taxable_income <= rules.rebate_87a_limit, rebated, salary_tax)
+    )
+
+    # ---------- Equity stocks ----------
+    stcg_before, stcg_after = col["stcg_before"], col["stcg_after"]
+    ltcg_before, ltcg_after = col["ltcg_before"], col["ltcg_after"]
+
+    stcg_tax = (
+        np.where(stcg_before > 0, stcg_before * rules.equity_stcg_rate_before, 0.0)
+        + np.where(stcg_after > 0, stcg_after * rules.equity_stcg_rate_after, 0.0)
+    )
+
+    total_ltcg = ltcg_before + ltcg_after
+    has_ltcg_tax = total_ltcg > rules.ltcg_exemption
+    safe_total = np.where(total_ltcg != 0, total_ltcg, 1.0)
+    taxable_ltcg = total_ltcg - rules.ltcg_exemption
+    ltcg_tax = np.where(
+        has_ltcg_tax,
+        taxable_ltcg * (ltcg_before / safe_total) * rules.equity_ltcg_rate_before
+        + taxable_ltcg * (ltcg_after / safe_total) * rules.equity_ltcg_rate_after,
+        0.0,
+    )
+    stock_tax = _round2_array(stcg_tax + ltcg_tax)
+
+    # ---------- Equity MF ----------
+    mf_stcg_tax = np.maximum(0.0, col["equity_stcg"]) * rules.equity_mf_stcg_rate
+    equity_mf_taxable_ltcg = np.maximum(0.0, col["equity_ltcg"] - rules.ltcg_exemption)
+    mf_ltcg_tax = equity_mf_taxable_ltcg * rules.equity_mf_ltcg_rate
+    mf_tax = _round2_array(mf_stcg_tax + mf_ltcg_tax)
+
+    # ---------- Totals ----------
+    total_income_tax_before_cess = salary_tax + stock_tax + mf_tax
+    cess = total_income_tax_before_cess * rules.cess_rate
+    total_tax_liability = total_income_tax_before_cess + cess
+    net_payable = total_tax_liability - col["tds_paid"]
+
+    return {
+        **col,
+        "debt_extra_income": debt_extra_income,
+        "salary_tax": salary_tax,
+        "stcg_tax": _round2_array(stcg_tax),
+        "ltcg_tax": _round2_array(ltcg_tax),
+        "stock_tax": stock_tax,
+        "mf_tax": mf_tax,
+        "equity_mf_taxable_ltcg": equity_mf_taxable_ltcg,
+        "total_income_tax_before_cess": total_income_tax_before_cess,
+        "cess": cess,
+        "total_tax_liability": total_tax_liability,
+        "net_payable": net_payable,
+    }
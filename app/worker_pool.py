@@ -0,0 +1,315 @@
+"""
+Bounded Worker Pool for Document Parsing
+
+Form-16 (pdfplumber / Tesseract OCR) and broker Excel parsing are CPU-bound
+and can take seconds per upload. Running them inside an ``async`` endpoint
+blocks the uvicorn event loop, so this module dispatches parse jobs to a
+process pool instead.
+
+The pool is bounded:
+- At most ``max_workers`` jobs run at once (one per process)
+- At most ``queue_depth`` further jobs may wait for a free process
+- Anything beyond that is rejected immediately (backpressure -> HTTP 429)
+- Each job has a timeout (-> HTTP 504). A worker process cannot be
+  interrupted mid-job, so the process pool is then replaced: new jobs go
+  to fresh processes straight away and the old processes are killed.
+  Other jobs that were on the old pool are run again on the new one.
+
+Configuration (environment variables):
+    SMARTTAX_PARSE_WORKERS: Number of worker processes (default: CPU count).
+        Set to 0 to run parsers in the event loop's thread pool instead.
+    SMARTTAX_PARSE_QUEUE_DEPTH: Jobs allowed to wait for a worker (default: 8)
+    SMARTTAX_PARSE_TIMEOUT: Per-job timeout in seconds (default: 60)
+
+Author: SmartTax Team
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from app import metrics, profiling
+from app.breakdown import BREAKDOWN_KEY
+
+PARSE_WORKERS = int(os.getenv("SMARTTAX_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARSE_QUEUE_DEPTH = int(os.getenv("SMARTTAX_PARSE_QUEUE_DEPTH", "8"))
+PARSE_TIMEOUT = float(os.getenv("SMARTTAX_PARSE_TIMEOUT", "60"))
+
+
+class PoolSaturatedError(Exception):
+    """Raised when every worker is busy and the wait queue is full"""
+
+
+class ParseTimeoutError(Exception):
+    """Raised when a parse job does not finish within the timeout"""
+
+
+# ============================================================
+# WORKER-SIDE ENTRY POINT
+# ============================================================
+
+# Bump a parser's version whenever its output for the same file can change,
+# so cached results from the old code are not served
+PARSER_VERSIONS = {
+    "form16": "3",
+    "groww": "3",
+    "mf": "6",
+    "tradebook": "3",
+    "zerodha": "2",
+    "generic": "2",
+}
+
+
+def _file_digest(path: Optional[str]) -> str:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()[:12]
+    except (OSError, TypeError):
+        return "none"
+
+
+# Tradebook results also depend on the grandfathering FMV file
+PARSER_VERSIONS["tradebook"] += "-" + _file_digest(os.getenv("SMARTTAX_FMV_FILE"))
+# ... and mutual fund results on the scheme index
+PARSER_VERSIONS["mf"] += "-" + _file_digest(os.getenv("SMARTTAX_SCHEME_INDEX"))
+
+# Parser instances, created once per worker process on first use
+_PARSERS: Dict[str, Any] = {}
+
+
+def _get_parser(kind: str):
+    """Return the parser for ``kind``, creating it on first use in this process"""
+    parser = _PARSERS.get(kind)
+    if parser is not None:
+        return parser
+
+    if kind == "form16":
+        from app.form16_parser import Form16Parser
+        parser = Form16Parser()
+    elif kind == "groww":
+        from app.groww_parser import GrowwCapitalGainsParser
+        parser = GrowwCapitalGainsParser()
+    elif kind == "mf":
+        from app.mutual_fund_parser import MutualFundCapitalGainsParser
+        parser = MutualFundCapitalGainsParser()
+    elif kind == "tradebook":
+        from app.tradebook_parser import TradebookCapitalGainsParser
+        parser = TradebookCapitalGainsParser()
+    elif kind == "zerodha":
+        from app.zerodha_parser import ZerodhaTaxPnlParser
+        parser = ZerodhaTaxPnlParser()
+    elif kind == "generic":
+        from app.column_mapped_parser import ColumnMappedCapitalGainsParser
+        parser = ColumnMappedCapitalGainsParser()
+    else:
+        raise ValueError(f"Unknown parser: {kind}")
+
+    _PARSERS[kind] = parser
+    return parser
+
+
+def run_parse(kind: str, contents: bytes, profile: bool = False) -> dict:
+    """
+    Parse raw file bytes with the named parser.
+
+    Parsers that can produce a trade-level Breakdown return it under
+    BREAKDOWN_KEY, and the job's stage timings are returned under
+    metrics.TRACE_KEY. With ``profile``, this process's threads are sampled
+    during the job and the folded stacks returned under
+    profiling.PROFILE_KEY. The caller must take all three out before
+    caching the result.
+
+    Module-level so it can be pickled and executed in a worker process.
+    """
+    job_profile = profiling.Profile() if profile else None
+    with metrics.trace(metrics.METRICS_ENABLED or profile) as trace, \
+            profiling.sample(job_profile):
+        parser = _get_parser(kind)
+        if hasattr(parser, "parse_with_breakdown"):
+            result, table = parser.parse_with_breakdown(io.BytesIO(contents))
+            result[BREAKDOWN_KEY] = table
+        else:
+            result = parser.parse(io.BytesIO(contents))
+    if trace is not None:
+        result[metrics.TRACE_KEY] = trace.as_dict()
+    if job_profile is not None:
+        result[profiling.PROFILE_KEY] = dict(job_profile.stacks)
+    return result
+
+
+def warm_parsers(kinds) -> Dict[str, float]:
+    """
+    Import and construct the named parsers ahead of the first upload.
+
+    Returns milliseconds per kind. Module-level so it can run in a worker.
+    """
+    timings = {}
+    for kind in kinds:
+        start = time.perf_counter()
+        _get_parser(kind)
+        timings[kind] = round((time.perf_counter() - start) * 1000, 1)
+    return timings
+
+
+# ============================================================
+# POOL
+# ============================================================
+
+class ParseWorkerPool:
+    """
+    Process pool with a queue-depth limit and per-job timeouts.
+
+    ``submit`` is awaited from request handlers; the event loop only waits
+    on the job's future and stays free to serve other requests.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PARSE_WORKERS,
+        queue_depth: int = PARSE_QUEUE_DEPTH,
+        timeout: float = PARSE_TIMEOUT,
+    ):
+        self.max_workers = max(0, max_workers)
+        self.queue_depth = max(0, queue_depth)
+        self.timeout = timeout
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._recycled = 0
+
+    @property
+    def capacity(self) -> int:
+        """Maximum number of running + waiting jobs"""
+        return max(1, self.max_workers) + self.queue_depth
+
+    def start(self) -> Optional[ProcessPoolExecutor]:
+        """Create the process pool (idempotent); returns it, None without workers"""
+        with self._lock:
+            if self.max_workers > 0 and self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def warm(self) -> Dict[str, float]:
+        """
+        Load every parser in each worker process (in this process when
+        running without workers). Blocks; returns the slowest load per kind.
+        """
+        kinds = tuple(PARSER_VERSIONS)
+        executor = self.start()
+        if executor is None:
+            return warm_parsers(kinds)
+
+        futures = [executor.submit(warm_parsers, kinds) for _ in range(self.max_workers)]
+        timings: Dict[str, float] = {}
+        for future in futures:
+            for kind, ms in future.result(timeout=self.timeout).items():
+                timings[kind] = max(ms, timings.get(kind, 0.0))
+        return timings
+
+    def shutdown(self):
+        """Stop the process pool, cancelling jobs that have not started"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """
+        Replace ``executor`` with a fresh pool (created on the next submit)
+        and kill its processes, including the one stuck on a timed-out job
+        """
+        with self._lock:
+            if self._executor is not executor:
+                return    # already replaced
+            self._executor = None
+            self._recycled += 1
+
+        # Killing a worker marks the pool broken, failing its remaining jobs
+        # with BrokenProcessPool; submit() runs those again on the new pool
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, future=None):
+        if future is not None and not future.cancelled():
+            future.exception()    # seen, so a killed job's error is not logged
+        with self._lock:
+            self._in_flight -= 1
+
+    async def submit(self, kind: str, contents: bytes, profile: bool = False) -> dict:
+        """
+        Run ``kind`` parser on ``contents`` off the event loop.
+
+        ``profile`` samples the job in its worker process (see run_parse).
+        Without worker processes the job runs on a thread of this process,
+        which the request's own profiler already samples.
+
+        A job whose pool was recycled because another job hung is run
+        again on the new pool, within its original deadline.
+
+        Raises:
+            PoolSaturatedError: All workers busy and queue full
+            ParseTimeoutError: Job exceeded the configured timeout
+            BrokenProcessPool: The job's worker process died
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                self._rejected += 1
+                raise PoolSaturatedError(
+                    f"{self._in_flight} parse jobs in progress (limit {self.capacity})"
+                )
+            self._in_flight += 1
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        future = None
+        try:
+            while True:
+                executor = self.start()
+                future = loop.run_in_executor(executor, run_parse, kind, contents,
+                                              profile and executor is not None)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future),
+                                                  timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        self._timed_out += 1
+                    if executor is not None:
+                        self._recycle(executor)
+                    raise ParseTimeoutError(f"{kind} parse exceeded {self.timeout:.0f}s")
+                except BrokenProcessPool:
+                    if self._executor is executor:
+                        # This job's own worker died (e.g. out of memory)
+                        self._recycle(executor)
+                        raise
+                    # Killed along with a stuck job; run it on the new pool
+        finally:
+            # The slot is released when the job actually finishes, not when
+            # the caller stops waiting: a job on a thread cannot be killed
+            # and keeps running after its timeout.
+            if future is None:
+                self._release()
+            else:
+                future.add_done_callback(self._release)
+
+    def stats(self) -> dict:
+        """Current pool usage counters"""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self.queue_depth,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - max(1, self.max_workers)),
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "recycled": self._recycled,
+            }
@@ -0,0 +1,202 @@
+"""
+Zerodha Tax P&L Parser
+
+Reads the "Tradewise Exits" sheet of the Zerodha Console tax P&L workbook
+(Reports -> Tax P&L -> Download). The sheet lists every exit in sections:
+
+    Equity - Intraday        speculative income, reported as intraday_pnl
+    Equity - Short Term      STCG
+    Equity - Long Term       LTCG
+    Equity - Buyback, Non Equity, Mutual Funds, F&O, ...   ignored
+
+Each section title is followed by a header row (Symbol, ISIN, Entry Date,
+Exit Date, Quantity, Buy Value, Sell Value, Profit, ..., Taxable Profit)
+and its exits, up to the next title or blank row; "Total" rows are
+skipped. Zerodha already applies
+grandfathering in "Taxable Profit", so that column is used when present.
+Exits are split at the rules' cut-off date by their exit date.
+
+Older workbooks without a "Tradewise Exits" sheet are scanned sheet by
+sheet for the same section titles.
+
+Author: SmartTax Team
+"""
+
+import re
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app import metrics
+from app.breakdown import BUCKET_CODES, Breakdown, bucket_codes
+from app.column_mapped_parser import match_columns
+from app.excel_reader import iter_sheets
+from app.tax_rules import get_rules
+from app.tradebook_parser import parse_numbers, parse_times
+
+TRADEWISE_SHEET_PREFIX = "tradewise exits"
+
+# Section title -> bucket; other titles end the current section
+SECTION_BUCKETS = {
+    "equity - intraday": "intraday",
+    "equity - short term": "STCG",
+    "equity - long term": "LTCG",
+}
+
+SECTION_TITLE = re.compile(
+    r"^(equity\s*-|non equity|mutual funds?|f&o|futures|options|currency|commodity)"
+)
+
+COLUMN_ALIASES = {
+    "exit_date": ("exit date", "sell date"),
+    "taxable": ("taxable profit",),
+    "profit": ("profit", "realized p&l", "realised p&l", "p&l"),
+    # Only used for the trade-level breakdown
+    "symbol": ("symbol", "scrip"),
+    "isin": ("isin",),
+    "entry_date": ("entry date", "buy date"),
+    "quantity": ("quantity", "qty"),
+    "buy_value": ("buy value",),
+    "sell_value": ("sell value",),
+}
+
+_DETAIL_COLUMNS = ("symbol", "isin", "entry_date", "quantity", "buy_value", "sell_value")
+
+
+def section_title(row: Sequence[Any]) -> Optional[str]:
+    """Section title if ``row`` has a single text cell naming a section"""
+    cells = [str(v).strip().lower() for v in row if v is not None and str(v).strip()]
+    if len(cells) == 1 and SECTION_TITLE.match(cells[0]):
+        return re.sub(r"\s*-\s*", " - ", cells[0])
+    return None
+
+
+def _is_blank(row: Sequence[Any]) -> bool:
+    return all(v is None or not str(v).strip() for v in row)
+
+
+class ZerodhaTaxPnlParser:
+    """
+    Parser for the Zerodha Console tax P&L workbook.
+
+    ``rules`` selects the cut-off date for the before/after split, like
+    the Groww parser.
+    """
+
+    def __init__(self, rules=None):
+        self.cut_off = (rules or get_rules()).cut_off_date or date.max
+
+    def parse(self, file) -> dict:
+        with metrics.stage("section_scan"):
+            exits = self.read_exits(file)
+        with metrics.stage("compute"):
+            return self.compute(exits)
+
+    def parse_with_breakdown(self, file):
+        """Same as parse, plus one Breakdown row per exit"""
+        parts = []
+        with metrics.stage("section_scan"):
+            exits = self.read_exits(file)
+        with metrics.stage("compute"):
+            result = self.compute(exits, breakdown=parts)
+        return result, Breakdown.concat(parts)
+
+    def read_exits(self, file) -> Dict[str, Dict[str, List[Any]]]:
+        """Raw exit columns per bucket, from the tradewise sheet if there is one"""
+        tradewise = self._empty()
+        other = self._empty()
+        has_tradewise = False
+
+        for name, rows in iter_sheets(file):
+            if name.strip().lower().startswith(TRADEWISE_SHEET_PREFIX):
+                has_tradewise = True
+                self.read_sections(rows, tradewise)
+            elif not has_tradewise:
+                self.read_sections(rows, other)
+
+        return tradewise if has_tradewise else other
+
+    @staticmethod
+    def _empty() -> Dict[str, Dict[str, List[Any]]]:
+        return {
+            bucket: {name: [] for name in ("pnl", "exit_date") + _DETAIL_COLUMNS}
+            for bucket in ("intraday", "STCG", "LTCG")
+        }
+
+    def read_sections(self, rows, exits: Dict[str, Dict[str, List[Any]]]):
+        """Append the exits of every equity section in ``rows`` to ``exits``"""
+        bucket = None
+        columns = None
+
+        for row in rows:
+            title = section_title(row)
+            if title is not None:
+                bucket = SECTION_BUCKETS.get(title)
+                continue
+
+            # Header rows usually follow each title; keep the last one seen
+            found = match_columns(row, COLUMN_ALIASES)
+            if "exit_date" in found and ("taxable" in found or "profit" in found):
+                columns = found
+                continue
+
+            if bucket is None or columns is None:
+                continue
+            if _is_blank(row):
+                bucket = None
+                continue
+            first = next(str(v).strip().lower() for v in row if v is not None and str(v).strip())
+            if first.startswith("total"):
+                continue
+
+            data = exits[bucket]
+            for name, idx in (
+                ("pnl", columns.get("taxable", columns.get("profit"))),
+                ("exit_date", columns["exit_date"]),
+            ) + tuple((name, columns.get(name)) for name in _DETAIL_COLUMNS):
+                data[name].append(row[idx] if idx is not None and idx < len(row) else None)
+
+    def compute(self, exits: Dict[str, Dict[str, List[Any]]],
+                breakdown: Optional[list] = None) -> dict:
+        """Bucket totals; with a ``breakdown`` list, also append each bucket's exits"""
+        cut_off = np.datetime64(self.cut_off)
+        totals = {}
+        rows = 0
+        for bucket, data in exits.items():
+            pnl = parse_numbers(data["pnl"])
+            exit_day = parse_times(data["exit_date"]).astype("datetime64[D]")
+            valid = ~np.isnat(exit_day)
+            before = exit_day < cut_off
+            totals[bucket] = (
+                float(pnl[valid & before].sum()),
+                float(pnl[valid & ~before].sum()),
+            )
+            rows += int(valid.sum())
+
+            if breakdown is not None:
+                if bucket == "intraday":
+                    codes = np.full(int(valid.sum()), BUCKET_CODES["intraday"], dtype=np.int8)
+                else:
+                    codes = bucket_codes(np.full(int(valid.sum()), bucket == "LTCG"), before[valid])
+                breakdown.append(Breakdown.from_columns(
+                    int(valid.sum()),
+                    codes,
+                    name=np.asarray(data["symbol"], dtype=object)[valid],
+                    isin=np.asarray(data["isin"], dtype=object)[valid],
+                    buy_date=parse_times(data["entry_date"])[valid],
+                    sell_date=exit_day[valid],
+                    quantity=parse_numbers(data["quantity"])[valid],
+                    cost=parse_numbers(data["buy_value"])[valid],
+                    proceeds=parse_numbers(data["sell_value"])[valid],
+                    gain=pnl[valid],
+                ))
+
+        return {
+            "stcg_before": round(totals["STCG"][0], 2),
+            "stcg_after": round(totals["STCG"][1], 2),
+            "ltcg_before": round(totals["LTCG"][0], 2),
+            "ltcg_after": round(totals["LTCG"][1], 2),
+            "intraday_pnl": round(sum(totals["intraday"]), 2),
+            "rows": rows,
+        }
@@ -0,0 +1,110 @@
+"""
+Benchmark: Chatbot Prompt Reuse
+
+Times system prompt rendering with and without the memoized prompt, and
+checks that the history window keeps the request prefix stable between
+turns. With ``--ollama`` it also plays a short conversation against the
+local Ollama server and prints Ollama's prompt evaluation per turn, which
+should drop sharply after the first turn once the prompt cache is reused.
+
+Usage:
+    python -m benchmarks.bench_chat_prompt [--renders 2000] [--ollama]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import asyncio
+import time
+
+from app import chatbot as chatbot_module
+from app.chatbot import TaxAdvisorChatbot
+from app.ollama_client import OllamaClient
+
+USER_CONTEXT = {
+    "itr_type": "ITR-2",
+    "salary": {"gross_salary": 1850000, "tds_paid": 120000},
+    "equity": {"stcg_total": 42000, "ltcg_total": 180000},
+    "calculation": {"salary_tax": 118500, "total_before_cess": 141000,
+                    "cess": 5640, "total_tax": 146640, "net_payable": 26640},
+}
+
+QUESTIONS = [
+    "How is my LTCG taxed?",
+    "What about STCG?",
+    "Can I reduce my tax?",
+    "Explain my calculation",
+    "Is cess applied on capital gains tax too?",
+    "What is the 87A rebate limit?",
+]
+
+
+def time_renders(renders: int):
+    bot = TaxAdvisorChatbot()
+    bot.set_user_context(USER_CONTEXT)
+
+    start = time.perf_counter()
+    for _ in range(renders):
+        chatbot_module._PROMPT_CACHE.clear()
+        chatbot_module._static_prompt.cache_clear()
+        bot.build_system_prompt()
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(renders):
+        bot.build_system_prompt()
+    warm_s = time.perf_counter() - start
+
+    print(f"  render (uncached): {cold_s / renders * 1e6:8.1f} us/prompt")
+    print(f"  render (memoized): {warm_s / renders * 1e6:8.1f} us/prompt")
+
+
+def check_stable_prefix(turns: int = 40):
+    """Count turns whose messages extend the previous request's prefix"""
+    bot = TaxAdvisorChatbot()
+    bot.set_user_context(USER_CONTEXT)
+
+    previous = None
+    reused = 0
+    for turn in range(turns):
+        messages = bot.build_messages(f"question {turn}")
+        if previous is not None and messages[:len(previous) - 1] == previous[:-1]:
+            reused += 1
+        previous = messages
+        bot._record_exchange(f"question {turn}", f"answer {turn}")
+
+    print(f"  {reused}/{turns - 1} follow-up requests extend the previous prompt")
+
+
+async def play_conversation(client: OllamaClient):
+    bot = TaxAdvisorChatbot()
+    bot.set_user_context(USER_CONTEXT)
+
+    print(f"  {'turn':>4} {'prompt tok':>10} {'prompt ms':>10} {'eval ms':>9}")
+    for turn, question in enumerate(QUESTIONS, 1):
+        await bot.agenerate_response(question, client)
+        t = bot.last_timings
+        print(f"  {turn:>4} {t.get('prompt_tokens', 0):>10} "
+              f"{t.get('prompt_eval_ms', 0):>10.1f} {t.get('eval_ms', 0):>9.1f}")
+    await client.aclose()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--renders", type=int, default=2000)
+    arg_parser.add_argument("--ollama", action="store_true",
+                            help="Also run a conversation against the local Ollama")
+    args = arg_parser.parse_args()
+
+    print("System prompt:")
+    time_renders(args.renders)
+    print("History window:")
+    check_stable_prefix()
+
+    if args.ollama:
+        print("Ollama prompt evaluation per turn:")
+        asyncio.run(play_conversation(OllamaClient()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark: Groww Equity Trades Parser
+
+Compares the vectorized GrowwCapitalGainsParser against the previous
+row-by-row implementation on a synthetic report, and checks that both
+produce the same result.
+
+Usage:
+    python -m benchmarks.bench_groww_parser [--rows 20000] [--repeat 3]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from app.breakdown import Breakdown
+from app.groww_parser import GrowwCapitalGainsParser, parse_amount
+from app.tax_rules import get_rules
+
+# The parser's own default: one rate for the whole year when there is no cut-off
+CUT_OFF_DATE = get_rules().cut_off_date or date.max
+
+
+def make_report(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Build a raw (header=None) Groww report sheet with ``rows`` trades,
+    split between a Short Term and a Long Term section.
+    """
+    rng = random.Random(seed)
+    start = date(2024, 4, 1)
+    headers = ["Stock name", "ISIN", "Quantity", "Buy date", "Buy price",
+               "Sell date", "Sell price", "Realised P&L"]
+
+    sheet = [["Groww Equity Trades Report"] + [None] * 7, [None] * 8]
+    for title, count in (("Short Term Trades", rows // 2), ("Long Term Trades", rows - rows // 2)):
+        sheet.append([title] + [None] * 7)
+        sheet.append(headers)
+        for _ in range(count):
+            sell = start + timedelta(days=rng.randint(0, 364))
+            pnl = round(rng.uniform(-25_000, 25_000), 2)
+            sheet.append([
+                "STOCK",
+                "INE000000000",
+                rng.randint(1, 500),
+                (sell - timedelta(days=rng.randint(1, 900))).strftime("%d-%m-%Y"),
+                100.0,
+                sell.strftime("%d-%m-%Y"),
+                110.0,
+                f"({abs(pnl):,.2f})" if pnl < 0 else f"{pnl:,.2f}",
+            ])
+        sheet.append(["Total"] + [None] * 7)
+        sheet.append([None] * 8)
+
+    return pd.DataFrame(sheet)
+
+
+def legacy_parse(df: pd.DataFrame) -> dict:
+    """The original per-row ``df.iloc`` implementation, kept as a reference"""
+    stcg_before = stcg_after = 0.0
+    ltcg_before = ltcg_after = 0.0
+    mode = None
+    headers = None
+
+    for i in range(len(df)):
+        row = df.iloc[i]
+        first_cell = str(row[0]).lower()
+
+        if "short term trades" in first_cell:
+            mode, headers = "STCG", None
+            continue
+        if "long term trades" in first_cell:
+            mode, headers = "LTCG", None
+            continue
+        if mode and headers is None:
+            headers = [str(x).lower().strip() for x in row]
+            continue
+        if mode and "total" in first_cell:
+            mode, headers = None, None
+            continue
+
+        if mode and headers:
+            try:
+                pnl_idx = next(i for i, h in enumerate(headers) if "p&l" in h or "pnl" in h)
+                sell_idx = next(i for i, h in enumerate(headers) if "sell" in h and "date" in h)
+            except StopIteration:
+                continue
+
+            pnl = parse_amount(row[pnl_idx])
+            sell_date = pd.to_datetime(row[sell_idx], dayfirst=True, errors="coerce")
+            if pd.isna(sell_date):
+                continue
+
+            is_before = sell_date.date() < CUT_OFF_DATE
+            if mode == "STCG":
+                if is_before:
+                    stcg_before += pnl
+                else:
+                    stcg_after += pnl
+            else:
+                if is_before:
+                    ltcg_before += pnl
+                else:
+                    ltcg_after += pnl
+
+    return {
+        "stcg_before": round(stcg_before, 2),
+        "stcg_after": round(stcg_after, 2),
+        "ltcg_before": round(ltcg_before, 2),
+        "ltcg_after": round(ltcg_after, 2),
+    }
+
+
+def _collect(parser, df):
+    parts = []
+    parser.parse_dataframe(df, breakdown=parts)
+    return parts
+
+
+def best_of(fn, repeat: int) -> float:
+    """Fastest wall-clock time of ``repeat`` runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rows", type=int, default=20_000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    df = make_report(args.rows)
+    parser = GrowwCapitalGainsParser()
+
+    expected = legacy_parse(df)
+    actual = parser.parse_dataframe(df)
+    if actual != expected:
+        raise SystemExit(f"Result mismatch:\n  legacy:     {expected}\n  vectorized: {actual}")
+
+    parts = []
+    if parser.parse_dataframe(df, breakdown=parts) != expected:
+        raise SystemExit("Result changes when a breakdown is collected")
+    table = Breakdown.concat(parts)
+    for bucket, total in expected.items():
+        gain = float(table.arrays["gain"][table.select(bucket=bucket)].sum())
+        if abs(gain - total) > 0.01:
+            raise SystemExit(f"Breakdown {bucket}: {gain!r}, summary {total!r}")
+
+    legacy_s = best_of(lambda: legacy_parse(df), args.repeat)
+    vector_s = best_of(lambda: parser.parse_dataframe(df), args.repeat)
+    detail_s = best_of(
+        lambda: Breakdown.concat(_collect(parser, df)), args.repeat
+    )
+
+    print(f"Groww parser, {args.rows:,} trades (best of {args.repeat})")
+    print(f"  legacy row loop: {legacy_s * 1000:10.1f} ms")
+    print(f"  vectorized:      {vector_s * 1000:10.1f} ms")
+    print(f"  speedup:         {legacy_s / vector_s:10.1f}x")
+    print(f"  with breakdown:  {detail_s * 1000:10.1f} ms ({len(table):,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark: Compiled Slab Tax Lookup
+
+Runs check_slab_tables first (every registered schedule must reproduce
+the original slab-by-slab loop exactly), then times the loop against the
+compiled lookup on the default schedule.
+
+Usage:
+    python -m benchmarks.bench_slab_tax [--samples 200000]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from app.utils import NEW_REGIME_SLABS, NEW_REGIME_TABLE
+from benchmarks.check_slab_tables import (
+    SlabTableMismatch, loop_slab_tax, sample_incomes, verify,
+)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--samples", type=int, default=200_000)
+    args = arg_parser.parse_args()
+
+    try:
+        checked = verify()
+    except SlabTableMismatch as e:
+        sys.exit(str(e))
+    print(f"Compiled slab tables match the loop on {checked:,} incomes")
+
+    incomes = sample_incomes(NEW_REGIME_SLABS, args.samples)
+    start = time.perf_counter()
+    for income in incomes:
+        loop_slab_tax(income, NEW_REGIME_SLABS)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for income in incomes:
+        NEW_REGIME_TABLE.tax(income)
+    table_s = time.perf_counter() - start
+
+    array = np.array(incomes)
+    start = time.perf_counter()
+    NEW_REGIME_TABLE.tax_array(array)
+    array_s = time.perf_counter() - start
+
+    print(f"  loop:            {loop_s / len(incomes) * 1e9:8.0f} ns/income")
+    print(f"  SlabTable.tax:   {table_s / len(incomes) * 1e9:8.0f} ns/income")
+    print(f"  tax_array:       {array_s / len(incomes) * 1e9:8.0f} ns/income")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark: Tradebook FIFO Capital Gains Engine
+
+Generates a synthetic Zerodha-style tradebook CSV (default 100k trades over
+3,000 scrips, 2016-2025, including pre-2018 grandfathered lots and
+intraday round trips, also in scrips already held), checks the engine against a straightforward
+deque-of-dicts FIFO reference on a smaller book, then times reading and
+matching the full book.
+
+Usage:
+    python -m benchmarks.bench_tradebook [--trades 100000] [--scrips 3000]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import csv
+import io
+import random
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+from app.tax_rules import get_rules
+from app.tradebook_parser import TradebookCapitalGainsParser, build_trades, read_columns
+
+HEADER = ["symbol", "isin", "trade_date", "exchange", "segment", "series",
+          "trade_type", "auction", "quantity", "price", "trade_id", "order_id",
+          "order_execution_time"]
+
+
+def make_tradebook(trades: int, scrips: int, seed: int = 0) -> bytes:
+    """Zerodha tradebook CSV bytes; sells never exceed holdings"""
+    rng = random.Random(seed)
+    start = date(2016, 4, 1)
+    span = (date(2025, 3, 31) - start).days
+
+    days = sorted(start + timedelta(days=rng.randrange(span)) for _ in range(trades))
+    holdings = defaultdict(int)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(HEADER)
+
+    for n, day in enumerate(days):
+        s = rng.randrange(scrips)
+        isin = f"INE{s:07d}01"
+        price = round(100 + s % 900 + rng.uniform(-50, 50), 2)
+        rows = []
+        if holdings[s] > 0 and rng.random() < 0.45:
+            qty = rng.randint(1, holdings[s])
+            holdings[s] -= qty
+            rows.append(("sell", qty))
+        elif rng.random() < 0.05:
+            qty = rng.randint(1, 50)
+            rows += [("buy", qty), ("sell", qty)]     # intraday round trip
+        else:
+            qty = rng.randint(1, 100)
+            holdings[s] += qty
+            rows.append(("buy", qty))
+
+        for k, (side, qty) in enumerate(rows):
+            writer.writerow([f"SCRIP{s}", isin, day.isoformat(), "NSE", "EQ", "EQ",
+                             side, "false", qty, price + k, f"T{n}{k}", f"O{n}",
+                             f"{day.isoformat()}T10:{k:02d}:00"])
+    return out.getvalue().encode()
+
+
+def reference_gains(contents: bytes, cut_off: date) -> dict:
+    """
+    Plain FIFO with a deque of dicts per ISIN, kept as the reference. Each
+    ISIN's trades on one day are netted against each other first
+    (intraday); only the rest goes through the holdings FIFO.
+    """
+    rows = list(csv.DictReader(io.StringIO(contents.decode())))
+    rows.sort(key=lambda r: (r["isin"], r["order_execution_time"]))
+
+    days = defaultdict(list)
+    for r in rows:
+        days[(r["isin"], r["trade_date"])].append(r)
+
+    lots = defaultdict(deque)
+    totals = {"stcg_before": 0.0, "stcg_after": 0.0, "ltcg_before": 0.0,
+              "ltcg_after": 0.0, "intraday_pnl": 0.0}
+
+    def match(queue, qty, price, day):
+        while qty > 1e-9 and queue:
+            lot = queue[0]
+            take = min(qty, lot["qty"])
+            gain = take * price - take * lot["price"]
+            try:
+                anniversary = lot["day"].replace(year=lot["day"].year + 1)
+            except ValueError:
+                anniversary = lot["day"].replace(year=lot["day"].year + 1, day=28)
+            if day == lot["day"]:
+                bucket = "intraday_pnl"
+            else:
+                term = "ltcg" if day > anniversary else "stcg"
+                bucket = f"{term}_{'before' if day < cut_off else 'after'}"
+            totals[bucket] += gain
+            qty -= take
+            lot["qty"] -= take
+            if lot["qty"] <= 1e-9:
+                queue.popleft()
+        return qty
+
+    for (isin, trade_date), group in sorted(days.items()):
+        day = date.fromisoformat(trade_date)
+        same_day = deque({"qty": float(r["quantity"]), "price": float(r["price"]), "day": day}
+                         for r in group if r["trade_type"] == "buy")
+        for r in group:
+            if r["trade_type"] == "sell":
+                left = match(same_day, float(r["quantity"]), float(r["price"]), day)
+                match(lots[isin], left, float(r["price"]), day)
+        lots[isin].extend(same_day)
+    return {k: round(v, 2) for k, v in totals.items()}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--trades", type=int, default=100_000)
+    arg_parser.add_argument("--scrips", type=int, default=3000)
+    args = arg_parser.parse_args()
+
+    parser = TradebookCapitalGainsParser(fmv={})
+    cut_off = get_rules().cut_off_date
+
+    sample = make_tradebook(5000, 200, seed=1)
+    expected = reference_gains(sample, cut_off)
+    actual = parser.parse(io.BytesIO(sample))
+    for key, value in expected.items():
+        if abs(actual[key] - value) > 0.05:
+            raise SystemExit(f"{key}: engine {actual[key]!r}, reference {value!r}")
+    print("FIFO engine matches the reference on a 5,000-trade book")
+
+    contents = make_tradebook(args.trades, args.scrips)
+
+    start = time.perf_counter()
+    data = read_columns(csv.reader(io.StringIO(contents.decode())))
+    read_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    trades = build_trades(data)
+    build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = parser.compute(trades)
+    compute_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser.parse(io.BytesIO(contents))
+    total_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, table = parser.parse_with_breakdown(io.BytesIO(contents))
+    breakdown_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference_gains(contents, cut_off)
+    reference_s = time.perf_counter() - start
+
+    print(f"{result['trades']:,} trades, {result['scrips']:,} scrips, "
+          f"{result['matched_lots']:,} matched lots")
+    print(f"  read CSV columns:  {read_s * 1000:8.1f} ms")
+    print(f"  build arrays:      {build_s * 1000:8.1f} ms")
+    print(f"  FIFO + classify:   {compute_s * 1000:8.1f} ms")
+    print(f"  parse() end to end:{total_s * 1000:8.1f} ms")
+    print(f"  with breakdown:    {breakdown_s * 1000:8.1f} ms ({len(table):,} lot rows)")
+    print(f"  reference FIFO:    {reference_s * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
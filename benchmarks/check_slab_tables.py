@@ -0,0 +1,131 @@
+"""
+Check: Compiled Slab Tables Match the Slab Loop
+
+Every slab schedule in the tax rule registry (each financial year and
+regime in app/rules/) is compiled into a SlabTable. This checks that
+SlabTable.tax and tax_array return exactly the float the original
+slab-by-slab loop returns, on every slab boundary (and one paisa either
+side), on edge cases and on random incomes. It also checks that each
+schedule shares its compiled table.
+
+Any mismatch raises SlabTableMismatch; run as a script, it prints the
+first mismatches and exits with status 1. ``python -m benchmarks`` runs
+it before timing anything.
+
+Usage:
+    python -m benchmarks.check_slab_tables [--samples 20000]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import random
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from app.tax_rules import compile_slabs, load_rules
+
+Slabs = Sequence[Tuple[float, float]]
+
+# Mismatches listed in the error before it is cut short
+MAX_REPORTED = 10
+
+
+class SlabTableMismatch(AssertionError):
+    """Raised when a compiled SlabTable disagrees with the slab loop"""
+
+
+def loop_slab_tax(income: float, slabs: Slabs) -> float:
+    """The original progressive slab loop, kept as the reference"""
+    tax = 0.0
+    prev_limit = 0.0
+
+    for limit, rate in slabs:
+        if income <= prev_limit:
+            break
+
+        taxable_part = min(income, limit) - prev_limit
+        tax += taxable_part * rate
+        prev_limit = limit
+
+    return tax
+
+
+def sample_incomes(slabs: Slabs, samples: int, seed: int = 0) -> List[float]:
+    """Edge cases, every slab boundary and its neighbours, and random incomes"""
+    rng = random.Random(seed)
+    incomes = [0.0, -1.0, 0.01, 1e12]
+    for limit, _ in slabs[:-1]:
+        incomes += [limit - 0.01, float(limit), limit + 0.01]
+
+    top = max([limit for limit, _ in slabs[:-1]] or [1_000_000])
+    incomes += [round(rng.uniform(0, 2 * top), 2) for _ in range(samples // 2)]
+    incomes += [float(rng.randint(0, 50_000_000)) for _ in range(samples - samples // 2)]
+    return incomes
+
+
+def schedules() -> Dict[str, Tuple[Slabs, object]]:
+    """Rule version -> (slabs, compiled table) for every registered schedule"""
+    return {
+        rules.rule_version: (rules.slabs, rules.slab_table)
+        for rules in load_rules().values()
+    }
+
+
+def mismatches(name: str, slabs: Slabs, table, incomes: List[float]) -> List[str]:
+    """Every way ``table`` differs from the loop on ``incomes``"""
+    errors = []
+    if compile_slabs(slabs) is not table:
+        errors.append(f"{name}: compile_slabs did not return the shared table")
+
+    vector = table.tax_array(np.array(incomes)).tolist()
+    for income, from_array in zip(incomes, vector):
+        expected = loop_slab_tax(income, slabs)
+        actual = table.tax(income)
+        if actual != expected:
+            errors.append(f"{name}: tax({income!r}) = {actual!r}, loop gives {expected!r}")
+        if from_array != expected:
+            errors.append(f"{name}: tax_array at {income!r} = {from_array!r}, loop gives {expected!r}")
+    return errors
+
+
+def verify(samples: int = 20_000, seed: int = 0) -> int:
+    """
+    Check every registered schedule; returns the number of incomes checked.
+
+    Raises:
+        SlabTableMismatch: Some table differs from the loop
+    """
+    errors = []
+    checked = 0
+    for name, (slabs, table) in sorted(schedules().items()):
+        incomes = sample_incomes(slabs, samples, seed)
+        errors += mismatches(name, slabs, table, incomes)
+        checked += len(incomes)
+
+    if errors:
+        shown = "\n".join(errors[:MAX_REPORTED])
+        more = f"\n... and {len(errors) - MAX_REPORTED} more" if len(errors) > MAX_REPORTED else ""
+        raise SlabTableMismatch(f"{len(errors)} slab table mismatches:\n{shown}{more}")
+    return checked
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--samples", type=int, default=20_000,
+                            help="random incomes per schedule")
+    args = arg_parser.parse_args(argv)
+
+    try:
+        checked = verify(args.samples)
+    except SlabTableMismatch as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"{len(schedules())} slab schedules match the loop on {checked:,} incomes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Load Test: Throughput and Latency of a Running API
+
+Drives a running SmartTax API (single uvicorn process or the gunicorn
+multi-worker mode) with ``--concurrency`` clients for ``--duration``
+seconds and reports requests/s and latency percentiles per scenario:
+
+    health      GET /
+    tax         POST /calculate/tax with varying incomes
+    parse       POST /parse/equity, the same Groww report every time
+                (parse cache hits after the first request)
+    breakdown   GET /parse/breakdown/{id} pages of that report
+    chat        POST /chatbot/message, a new question each time (point the
+                API at benchmarks.stub_ollama to test without a model)
+    mixed       tax 70%, parse 20%, breakdown 10%
+
+With ``--target-rps`` the script exits non-zero when a scenario falls
+below it, so the throughput target in the README can be checked:
+
+    gunicorn -c gunicorn.conf.py app.main:app &
+    python -m benchmarks.load_test --scenario tax --target-rps 600
+
+Usage:
+    python -m benchmarks.load_test [--url http://localhost:8000]
+        [--scenario mixed] [--concurrency 32] [--duration 15]
+        [--target-rps N]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import asyncio
+import io
+import random
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.bench_groww_parser import make_report
+
+SCENARIOS = ("health", "tax", "parse", "breakdown", "chat", "mixed")
+MIXED_WEIGHTS = (("tax", 0.7), ("parse", 0.2), ("breakdown", 0.1))
+
+
+def make_upload(rows: int = 2000) -> bytes:
+    out = io.BytesIO()
+    make_report(rows).to_excel(out, header=False, index=False)
+    return out.getvalue()
+
+
+class LoadTest:
+    def __init__(self, url: str, concurrency: int, duration: float):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.duration = duration
+        self.upload = make_upload()
+        self.breakdown_id = None
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    async def request(self, client: httpx.AsyncClient, rng: random.Random, kind: str):
+        if kind == "health":
+            return await client.get("/")
+        if kind == "tax":
+            return await client.post("/calculate/tax", json={
+                "gross_salary": rng.randrange(300_000, 5_000_000, 1000),
+                "stcg_after": rng.randrange(0, 500_000, 100),
+                "ltcg_after": rng.randrange(0, 500_000, 100),
+            })
+        if kind == "chat":
+            # Open-ended, so the intent router hands it to the LLM, and a
+            # fresh number each time, so the answer cache is not hit
+            return await client.post("/chatbot/message", json={
+                "message": f"Explain why my refund of Rs {rng.randrange(10**7)} might be delayed",
+            })
+        if kind == "parse":
+            return await client.post(
+                "/parse/equity", data={"broker": "groww"},
+                files={"file": ("report.xlsx", self.upload)},
+            )
+        return await client.get(f"/parse/breakdown/{self.breakdown_id}",
+                                params={"offset": rng.randrange(0, 1900), "limit": 100})
+
+    async def client_loop(self, client: httpx.AsyncClient, scenario: str, seed: int, deadline: float):
+        rng = random.Random(seed)
+        kinds, weights = zip(*MIXED_WEIGHTS)
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0] if scenario == "mixed" else scenario
+            start = time.perf_counter()
+            try:
+                response = await self.request(client, rng, kind)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            if ok:
+                self.latencies.setdefault(kind, []).append(elapsed)
+            else:
+                self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def run(self, scenario: str) -> float:
+        limits = httpx.Limits(max_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.url, timeout=60, limits=limits) as client:
+            if scenario in ("parse", "breakdown", "mixed"):
+                # Parse once up front: later uploads are cache hits, and the
+                # breakdown scenario needs the ID
+                response = await self.request(client, random.Random(0), "parse")
+                response.raise_for_status()
+                self.breakdown_id = response.json()["data"]["breakdown_id"]
+
+            start = time.perf_counter()
+            deadline = start + self.duration
+            await asyncio.gather(*(self.client_loop(client, scenario, seed, deadline)
+                                   for seed in range(self.concurrency)))
+            return time.perf_counter() - start
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        """requests/s, latency percentiles (ms) and errors per request kind"""
+        stats = {}
+        for kind in sorted(set(self.latencies) | set(self.errors)):
+            values = np.asarray(self.latencies.get(kind, [0.0])) * 1000
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            stats[kind] = {
+                "rps": round(len(self.latencies.get(kind, [])) / elapsed, 1),
+                "p50_ms": round(float(p50), 1),
+                "p95_ms": round(float(p95), 1),
+                "p99_ms": round(float(p99), 1),
+                "errors": self.errors.get(kind, 0),
+            }
+        return stats
+
+    def report(self, elapsed: float) -> Dict[str, float]:
+        """Print one line per request kind; returns requests/s per kind"""
+        stats = self.summary(elapsed)
+        print(f"{'kind':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for kind, row in stats.items():
+            print(f"{kind:<10} {row['rps']:8.1f} {row['p50_ms']:8.1f} {row['p95_ms']:8.1f} "
+                  f"{row['p99_ms']:8.1f} {row['errors']:7d}")
+        rates = {kind: row["rps"] for kind, row in stats.items()}
+        rates["total"] = sum(rates.values())
+        print(f"{'total':<10} {rates['total']:8.1f}")
+        return rates
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--url", default="http://localhost:8000")
+    arg_parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    arg_parser.add_argument("--concurrency", type=int, default=32)
+    arg_parser.add_argument("--duration", type=float, default=15.0)
+    arg_parser.add_argument("--target-rps", type=float, default=None,
+                            help="exit 1 if total requests/s is below this")
+    args = arg_parser.parse_args()
+
+    test = LoadTest(args.url, args.concurrency, args.duration)
+    elapsed = asyncio.run(test.run(args.scenario))
+    print(f"{args.scenario}: {args.concurrency} clients for {elapsed:.1f}s against {args.url}")
+    rates = test.report(elapsed)
+
+    if args.target_rps is not None and rates["total"] < args.target_rps:
+        raise SystemExit(f"{rates['total']:.1f} req/s is below the target of {args.target_rps:.0f}")
+
+
+if __name__ == "__main__":
+    main()
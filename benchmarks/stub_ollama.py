@@ -0,0 +1,120 @@
+"""
+Stub Ollama Server for Load Tests
+
+Answers the Ollama endpoints the API uses (``/api/tags`` and ``/api/chat``,
+streamed or not) with a canned reply after a fixed delay, so chatbot
+endpoints can be load tested without a GPU or a model download. Replies
+carry Ollama's timing fields, so the API's timing stats keep working.
+
+Usage:
+    python -m benchmarks.stub_ollama [--port 11435] [--latency 0.05]
+    SMARTTAX_OLLAMA_URL=http://localhost:11435 uvicorn app.main:app
+
+Author: SmartTax Team
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL = "phi3:mini"
+REPLY = ("Under the new regime, long term capital gains on listed equity above "
+         "Rs 1.25 lakh are taxed at 12.5%, and short term gains at 20%.")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "StubOllama"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, body: dict, status: int = 200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": MODEL}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        self.server.requests += 1
+        latency = self.server.latency
+        words = REPLY.split(" ")
+        final = {
+            "model": request.get("model", MODEL), "done": True,
+            "prompt_eval_count": 400, "prompt_eval_duration": int(latency * 0.3e9),
+            "eval_count": len(words), "eval_duration": int(latency * 0.7e9),
+            "load_duration": 0, "total_duration": int(latency * 1e9),
+        }
+
+        if not request.get("stream", True):
+            time.sleep(latency)
+            self._send_json({**final, "message": {"role": "assistant", "content": REPLY}})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(latency / len(words))
+            token = word if i == 0 else " " + word
+            self._chunk({"model": final["model"], "done": False,
+                         "message": {"role": "assistant", "content": token}})
+        self._chunk({**final, "message": {"role": "assistant", "content": ""}})
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, body: dict):
+        data = json.dumps(body).encode() + b"\n"
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class StubOllama(ThreadingHTTPServer):
+    """Threaded stub server; ``start`` runs it in a daemon thread"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.05):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.requests = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "StubOllama":
+        threading.Thread(target=self.serve_forever, name="stub-ollama", daemon=True).start()
+        return self
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--port", type=int, default=11435)
+    arg_parser.add_argument("--latency", type=float, default=0.05,
+                            help="seconds per reply")
+    args = arg_parser.parse_args()
+
+    server = StubOllama(args.port, args.latency)
+    print(f"Stub Ollama on {server.url} ({args.latency * 1000:.0f} ms per reply)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
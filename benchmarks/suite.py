@@ -0,0 +1,420 @@
+"""
+Benchmark Suite: Parsers, Tax Functions and the API Under Load
+
+One command to tell whether a change made things faster or slower:
+
+    python -m benchmarks                  # run, compare with baseline.json
+    python -m benchmarks --quick          # smaller inputs, fewer repeats
+    python -m benchmarks --save-baseline  # store this run as the baseline
+
+Micro-benchmarks run every parser on synthetic documents (benchmarks/
+synthetic.py: text and scanned Form-16 PDFs, Groww / Zerodha reports,
+tradebooks, MF statements) through the same entry point as the API
+worker processes, and the tax functions in app.utils. Each benchmark runs
+in a fresh process, so its peak RSS is its own.
+
+Before timing anything, check_slab_tables verifies every registered slab
+schedule against the slab loop; a mismatch ends the run with status 1.
+
+The load test starts the API with uvicorn, pointed at a stub Ollama
+(benchmarks/stub_ollama.py), and drives every load_test scenario against
+it, recording the server's and parser workers' peak RSS.
+
+Reported per benchmark: p50 / p95 / p99 latency, throughput (rows or
+calculations per second for micro-benchmarks, requests per second under
+load) and peak RSS. Every metric is compared with the stored baseline;
+ones worse by more than ``--threshold`` are flagged, and with
+``--fail-on-regression`` the exit status is 1. Timings are only
+comparable on the machine that recorded the baseline.
+
+Usage:
+    python -m benchmarks [--quick] [--only groww,tax_batch] [--no-load]
+        [--baseline benchmarks/baseline.json] [--save-baseline]
+        [--output results.json] [--threshold 0.25] [--fail-on-regression]
+
+Author: SmartTax Team
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+import numpy as np
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Input sizes and repeats: full run, and --quick
+SIZES = {
+    "full": {"rows": 5000, "trades": 20000, "redemptions": 5000, "form16_pages": 6,
+             "batch": 10000, "repeat": 10, "duration": 10.0, "concurrency": 32},
+    "quick": {"rows": 1000, "trades": 3000, "redemptions": 1000, "form16_pages": 2,
+              "batch": 1000, "repeat": 3, "duration": 3.0, "concurrency": 16},
+}
+
+# Calculations per timed call for the scalar tax functions
+SCALAR_CALLS = 1000
+
+LOAD_SCENARIOS = ("health", "tax", "parse", "breakdown", "chat", "mixed")
+
+# Stub Ollama reply time, seconds
+STUB_LATENCY = 0.05
+
+
+# ============================================================
+# MICRO-BENCHMARKS
+# ============================================================
+
+def _parse(kind: str) -> Callable[[bytes], Any]:
+    def run(contents: bytes):
+        from app.worker_pool import run_parse
+        return run_parse(kind, contents)
+    return run
+
+
+def _tesseract_missing() -> Optional[str]:
+    import pytesseract
+    from app import form16_parser  # noqa: F401  (sets the Tesseract path)
+    if form16_parser.tesserocr is not None:
+        return None
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        return f"Tesseract not available ({type(e).__name__})"
+    return None
+
+
+def _incomes(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.round(rng.uniform(0, 5_000_000, n), 2)
+
+
+def _run_slab_tax(incomes):
+    from app.utils import calculate_new_regime_tax
+    for income in incomes:
+        calculate_new_regime_tax(income)
+
+
+def _run_capital_gains(gains):
+    from app.utils import calculate_equity_mf_capital_gains_tax, calculate_equity_stock_capital_gains_tax
+    for stcg, ltcg in gains:
+        calculate_equity_stock_capital_gains_tax(stcg / 2, stcg / 2, ltcg / 2, ltcg / 2)
+        calculate_equity_mf_capital_gains_tax(stcg, ltcg)
+
+
+def _run_tax_batch(columns):
+    from app.utils import calculate_tax_batch
+    calculate_tax_batch(**columns)
+
+
+def _batch_columns(n: int) -> dict:
+    incomes = _incomes(n)
+    gains = _incomes(n, seed=1) / 10
+    return {"gross_salary": incomes, "tds_paid": incomes * 0.1,
+            "stcg_after": gains, "ltcg_after": gains * 2}
+
+
+class Micro(NamedTuple):
+    make: Callable[[dict], Any]         # input, built in the suite process
+    run: Callable[[Any], Any]           # one timed call, in the benchmark process
+    units: Callable[[dict], int]        # rows / calculations per call
+    unit: str
+    skip: Optional[Callable[[], Optional[str]]] = None
+
+
+def _synthetic(name: str, size_key: Optional[str], **kwargs) -> Callable[[dict], bytes]:
+    def make(sizes: dict) -> bytes:
+        from benchmarks import synthetic
+        args = (sizes[size_key],) if size_key else ()
+        return getattr(synthetic, name)(*args, **kwargs)
+    return make
+
+
+MICRO: Dict[str, Micro] = {
+    "form16_text": Micro(_synthetic("form16_pdf", "form16_pages"), _parse("form16"),
+                         lambda s: s["form16_pages"], "pages"),
+    "form16_scanned": Micro(_synthetic("form16_pdf", "form16_pages", scanned=True),
+                            _parse("form16"), lambda s: s["form16_pages"], "pages",
+                            skip=_tesseract_missing),
+    "groww": Micro(_synthetic("groww_xlsx", "rows"), _parse("groww"),
+                   lambda s: s["rows"], "rows"),
+    "zerodha": Micro(_synthetic("zerodha_xlsx", "rows"), _parse("zerodha"),
+                     lambda s: s["rows"], "rows"),
+    "tradebook": Micro(_synthetic("tradebook_csv", "trades"), _parse("tradebook"),
+                       lambda s: s["trades"], "trades"),
+    "mf_statement": Micro(_synthetic("mf_statement_xlsx", "redemptions"), _parse("mf"),
+                          lambda s: s["redemptions"], "redemptions"),
+    "slab_tax": Micro(lambda s: _incomes(SCALAR_CALLS).tolist(), _run_slab_tax,
+                      lambda s: SCALAR_CALLS, "calcs"),
+    "capital_gains_tax": Micro(lambda s: (_incomes(2 * SCALAR_CALLS) / 10).reshape(-1, 2).tolist(),
+                               _run_capital_gains, lambda s: SCALAR_CALLS, "calcs"),
+    "tax_batch": Micro(lambda s: _batch_columns(s["batch"]), _run_tax_batch,
+                       lambda s: s["batch"], "rows"),
+}
+
+
+def _percentiles(seconds: List[float]) -> Dict[str, float]:
+    p50, p95, p99 = np.percentile(np.asarray(seconds) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3)}
+
+
+def measure(name: str, payload: Any, repeat: int, units: int) -> dict:
+    """Time ``repeat`` calls after one warm-up; runs in a fresh process"""
+    run = MICRO[name].run
+    run(payload)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(payload)
+        times.append(time.perf_counter() - start)
+
+    return {
+        **_percentiles(times),
+        "throughput": round(units * repeat / sum(times), 1),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run_micro(names: List[str], sizes: dict) -> Dict[str, dict]:
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for name in names:
+        bench = MICRO[name]
+        reason = bench.skip() if bench.skip else None
+        if reason:
+            print(f"  {name:<18} skipped: {reason}")
+            results[name] = {"skipped": reason}
+            continue
+
+        payload = bench.make(sizes)
+        units = bench.units(sizes)
+        repeat = sizes["repeat"] if bench.unit not in ("calcs",) else sizes["repeat"] * 20
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(measure, name, payload, repeat, units).result()
+        result["unit"] = f"{bench.unit}/s"
+        results[name] = result
+        print(f"  {name:<18} p50 {result['p50_ms']:9.3f} ms  p95 {result['p95_ms']:9.3f} ms  "
+              f"p99 {result['p99_ms']:9.3f} ms  {result['throughput']:>12,.0f} {result['unit']:<15}"
+              f" peak RSS {result['peak_rss_mb']:7.1f} MB")
+    return results
+
+
+# ============================================================
+# LOAD TEST
+# ============================================================
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb(pid: int) -> float:
+    """VmHWM (peak resident set) of a process from /proc, 0 if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+
+def _children(pid: int) -> List[int]:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def run_load(scenarios: List[str], sizes: dict) -> Dict[str, dict]:
+    from benchmarks.load_test import LoadTest
+    from benchmarks.stub_ollama import StubOllama
+
+    stub = StubOllama(latency=STUB_LATENCY).start()
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "SMARTTAX_OLLAMA_URL": stub.url, "SMARTTAX_PARSE_WORKERS": "1",
+           "SMARTTAX_PREWARM_DELAY": "0"}
+    for name in ("SMARTTAX_PARSE_CACHE_DB", "SMARTTAX_BREAKDOWN_DIR"):
+        env.pop(name, None)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"], env=env,
+    )
+
+    results = {}
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                if httpx.get(f"{url}/debug/startup").json()["data"]["prewarm"]["state"] in (
+                        "done", "failed", "disabled"):
+                    break
+            except (httpx.HTTPError, ValueError, KeyError, TypeError):
+                pass
+            if time.time() > deadline or server.poll() is not None:
+                raise SystemExit("API server did not start")
+            time.sleep(0.2)
+
+        for scenario in scenarios:
+            test = LoadTest(url, sizes["concurrency"], sizes["duration"])
+            elapsed = asyncio.run(test.run(scenario))
+            latencies = [t for values in test.latencies.values() for t in values]
+            results[scenario] = {
+                **_percentiles(latencies or [0.0]),
+                "throughput": round(len(latencies) / elapsed, 1),
+                "unit": "req/s",
+                "errors": sum(test.errors.values()),
+            }
+            row = results[scenario]
+            print(f"  {scenario:<18} p50 {row['p50_ms']:9.3f} ms  p95 {row['p95_ms']:9.3f} ms  "
+                  f"p99 {row['p99_ms']:9.3f} ms  {row['throughput']:>12,.1f} req/s"
+                  f"{'':<10} errors {row['errors']}")
+
+        results["server"] = {
+            "peak_rss_mb": _peak_rss_mb(server.pid),
+            "workers_peak_rss_mb": round(sum(_peak_rss_mb(p) for p in _children(server.pid)), 1),
+            "stub_ollama_requests": stub.requests,
+        }
+        print(f"  server peak RSS {results['server']['peak_rss_mb']} MB, parser workers "
+              f"{results['server']['workers_peak_rss_mb']} MB")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        stub.shutdown()
+    return results
+
+
+# ============================================================
+# BASELINE COMPARISON
+# ============================================================
+
+# Metric -> True if larger is better
+_METRICS = {"p50_ms": False, "p95_ms": False, "p99_ms": False, "throughput": True,
+            "peak_rss_mb": False, "workers_peak_rss_mb": False}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[dict]:
+    """Per metric change against the baseline; ``status`` is ok/improved/regressed"""
+    rows = []
+    for section in ("micro", "load"):
+        for name, metrics in current.get(section, {}).items():
+            old = baseline.get(section, {}).get(name, {})
+            for metric, higher_is_better in _METRICS.items():
+                if metric not in metrics or not old.get(metric):
+                    continue
+                change = (metrics[metric] - old[metric]) / old[metric]
+                worse = -change if higher_is_better else change
+                status = ("regressed" if worse > threshold
+                          else "improved" if worse < -threshold else "ok")
+                rows.append({"benchmark": f"{section}.{name}", "metric": metric,
+                             "baseline": old[metric], "current": metrics[metric],
+                             "change": round(change, 4), "status": status})
+    return rows
+
+
+def print_comparison(rows: List[dict], threshold: float):
+    flagged = [r for r in rows if r["status"] != "ok"]
+    print(f"\nAgainst baseline: {len(rows)} metrics, {len(flagged)} changed by more than "
+          f"{threshold:.0%}")
+    for r in flagged:
+        print(f"  {r['status']:<10} {r['benchmark']:<26} {r['metric']:<20} "
+              f"{r['baseline']:>12,.3f} -> {r['current']:>12,.3f} ({r['change']:+.1%})")
+
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--quick", action="store_true", help="smaller inputs, fewer repeats")
+    arg_parser.add_argument("--only", default="",
+                            help=f"comma-separated subset of: {', '.join(MICRO)}, load")
+    arg_parser.add_argument("--no-load", action="store_true", help="skip the API load test")
+    arg_parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    arg_parser.add_argument("--save-baseline", action="store_true",
+                            help="write this run to --baseline")
+    arg_parser.add_argument("--output", help="also write this run's results as JSON")
+    arg_parser.add_argument("--threshold", type=float, default=0.25,
+                            help="relative change that counts as a regression")
+    arg_parser.add_argument("--fail-on-regression", action="store_true")
+    args = arg_parser.parse_args(argv)
+
+    mode = "quick" if args.quick else "full"
+    sizes = SIZES[mode]
+    only = [n.strip() for n in args.only.split(",") if n.strip()]
+    unknown = set(only) - set(MICRO) - {"load"}
+    if unknown:
+        arg_parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "mode": mode,
+            "sizes": sizes,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+    }
+
+    # Timings of wrong results are worthless; the slab check fails the run
+    from benchmarks.check_slab_tables import SlabTableMismatch, verify
+    try:
+        verify()
+    except SlabTableMismatch as e:
+        print(f"Slab table check failed: {e}", file=sys.stderr)
+        return 1
+
+    micro = [n for n in MICRO if not only or n in only]
+    if micro:
+        print(f"Micro-benchmarks ({mode}):")
+        results["micro"] = run_micro(micro, sizes)
+    if not args.no_load and (not only or "load" in only):
+        print(f"Load test ({sizes['concurrency']} clients, {sizes['duration']:.0f}s per scenario,"
+              f" stub Ollama {STUB_LATENCY * 1000:.0f} ms):")
+        results["load"] = run_load(list(LOAD_SCENARIOS), sizes)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("sizes") != sizes:
+            print(f"\nNote: baseline was recorded in {baseline.get('meta', {}).get('mode')} mode;"
+                  " input sizes differ")
+        rows = compare(results, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        if args.fail_on_regression and any(r["status"] == "regressed" for r in rows):
+            status = 1
+    elif args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Synthetic Documents for Benchmarks
+
+Deterministic (seeded) generators for every document type the API parses,
+sized by a single argument so benchmarks can scale them:
+
+    form16_pdf(pages, scanned)   Form-16 with a salary / TDS table; the
+                                 scanned variant is image-only pages
+    groww_xlsx(rows)             Groww equity capital gains report
+    zerodha_xlsx(rows)           Zerodha Console tax P&L workbook
+    tradebook_csv(trades)        Zerodha tradebook (raw buys and sells)
+    mf_statement_xlsx(rows)      CAMS / KFintech capital gains statement
+
+Each returns the file bytes as they would be uploaded.
+
+Author: SmartTax Team
+"""
+
+import io
+import random
+from datetime import date, timedelta
+
+import fitz  # PyMuPDF
+from openpyxl import Workbook
+
+from benchmarks.bench_groww_parser import make_report
+from benchmarks.bench_mf_statement import make_statement, to_xlsx
+from benchmarks.bench_tradebook import make_tradebook
+
+# Known answers, so benchmarks can check the parser actually found them
+FORM16_GROSS_SALARY = 1_650_000.0
+FORM16_TDS = 130_000.0
+
+ZERODHA_HEADER = [None, "Symbol", "ISIN", "Entry Date", "Exit Date", "Quantity", "Buy Value",
+                  "Sell Value", "Profit", "Period of Holding", "Fair Market Value",
+                  "Taxable Profit", "Turnover"]
+
+
+def form16_pdf(pages: int = 4, scanned: bool = False, dpi: int = 150) -> bytes:
+    """
+    Form-16 PDF: a Part A summary page, a ruled salary / TDS table and
+    ``pages - 2`` pages of filler text (at least the first two).
+    ``scanned`` replaces every page with a rendered image of itself.
+    """
+    doc = fitz.open()
+
+    page = doc.new_page()
+    lines = ["FORM NO. 16", "Part A - Certificate under section 203 of the Income-tax Act, 1961",
+             "Employer: Acme Software Pvt Ltd", "PAN of the Employee: ABCDE1234F",
+             "Assessment Year 2025-26"]
+    for i, line in enumerate(lines):
+        page.insert_text((72, 72 + 20 * i), line)
+
+    page = doc.new_page()
+    page.insert_text((55, 40), "Part B - Details of salary paid and tax deducted")
+    rows = [("Gross salary as per section 17(1)", f"{FORM16_GROSS_SALARY:.2f}"),
+            ("Standard deduction u/s 16(ia)", "75000.00"),
+            ("Tax deducted at source", f"{FORM16_TDS:.2f}")]
+    top, height = 50, 25
+    page.draw_rect(fitz.Rect(50, top, 550, top + height * len(rows)))
+    page.draw_line((360, top), (360, top + height * len(rows)))
+    for i, (label, amount) in enumerate(rows):
+        if i:
+            page.draw_line((50, top + height * i), (550, top + height * i))
+        page.insert_text((55, top + height * i + 17), label)
+        page.insert_text((365, top + height * i + 17), amount)
+
+    rng = random.Random(pages)
+    for n in range(max(0, pages - 2)):
+        page = doc.new_page()
+        for i in range(30):
+            page.insert_text((72, 60 + 22 * i),
+                             f"Quarter {i % 4 + 1} receipt {rng.randrange(10**7):08d} "
+                             f"amount paid {rng.randrange(10**5)}.00 deposited")
+
+    if scanned:
+        images = fitz.open()
+        for page in doc:
+            pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+            image_page = images.new_page(width=page.rect.width, height=page.rect.height)
+            image_page.insert_image(image_page.rect, stream=pix.tobytes("png"))
+        doc = images
+
+    return doc.tobytes(garbage=3, deflate=True)
+
+
+def groww_xlsx(rows: int = 5000) -> bytes:
+    out = io.BytesIO()
+    make_report(rows).to_excel(out, header=False, index=False)
+    return out.getvalue()
+
+
+def zerodha_xlsx(rows: int = 5000, seed: int = 0) -> bytes:
+    """Tax P&L with a summary sheet and intraday / short / long term sections"""
+    rng = random.Random(seed)
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet("Equity")
+    summary.append(["Summary"])
+    sheet = wb.create_sheet("Tradewise Exits from 2024-04-01")
+    sheet.append([None, "Client ID", "AB1234"])
+
+    start = date(2024, 4, 1)
+    sections = (("Equity - Intraday", 0, 0), ("Equity - Short Term", 1, 364),
+                ("Equity - Long Term", 366, 3000))
+    for s, (title, min_held, max_held) in enumerate(sections):
+        sheet.append([])
+        sheet.append([None, title])
+        sheet.append(ZERODHA_HEADER)
+        for n in range(rows // 3 + (s < rows % 3)):
+            exit_day = start + timedelta(days=rng.randrange(365))
+            entry_day = exit_day - timedelta(days=rng.randint(min_held, max_held))
+            qty = rng.randint(1, 200)
+            buy = round(qty * rng.uniform(100, 3000), 2)
+            sell = round(buy * rng.uniform(0.8, 1.3), 2)
+            sym = rng.randrange(500)
+            sheet.append([None, f"SCRIP{sym}", f"INE{sym:07d}01", entry_day, exit_day, qty,
+                          buy, sell, round(sell - buy, 2), (exit_day - entry_day).days, 0,
+                          round(sell - buy, 2), round(sell + buy, 2)])
+
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def tradebook_csv(trades: int = 20000, scrips: int = 500) -> bytes:
+    return make_tradebook(trades, scrips)
+
+
+def mf_statement_xlsx(rows: int = 5000, schemes: int = 60) -> bytes:
+    return to_xlsx(make_statement(rows, schemes))
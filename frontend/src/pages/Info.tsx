@@ -43,31 +43,27 @@ const Info = () => {
                   <div className="bg-[rgb(var(--color-bg-primary))] rounded-xl p-6 border border-[rgb(var(--color-border-subtle))]">
                     <div className="space-y-3 text-[15px]">
                       <div className="flex justify-between py-2">
-                        <span className="text-[rgb(var(--color-text-secondary))]">Up to ₹4,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">Up to ₹3,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">Nil</span>
                       </div>
                       <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">₹4,00,001 – ₹8,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">₹3,00,001 – ₹7,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">5%</span>
                       </div>
                       <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">₹8,00,001 – ₹12,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">₹7,00,001 – ₹10,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">10%</span>
                       </div>
                       <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">₹12,00,001 – ₹16,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">₹10,00,001 – ₹12,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">15%</span>
                       </div>
                       <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">₹16,00,001 – ₹20,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">₹12,00,001 – ₹15,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">20%</span>
                       </div>
                       <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">₹20,00,001 – ₹24,00,000</span>
-                        <span className="font-medium text-[rgb(var(--color-text-primary))]">25%</span>
-                      </div>
-                      <div className="flex justify-between py-2 border-t border-[rgb(var(--color-border-subtle))]">
-                        <span className="text-[rgb(var(--color-text-secondary))]">Above ₹24,00,000</span>
+                        <span className="text-[rgb(var(--color-text-secondary))]">Above ₹15,00,000</span>
                         <span className="font-medium text-[rgb(var(--color-text-primary))]">30%</span>
                       </div>
                     </div>
@@ -79,7 +75,7 @@ const Info = () => {
                     Section 87A rebate
                   </h3>
                   <p className="text-[15px] text-[rgb(var(--color-text-secondary))] leading-relaxed">
-                    If your taxable income is ₹12,00,000 or less, your tax becomes zero (including cess).
+                    If your taxable income is ₹7,00,000 or less, your tax becomes zero (including cess).
                   </p>
                 </div>
 
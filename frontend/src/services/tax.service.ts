@@ -18,10 +18,11 @@ export const taxService = {
     return response.data.data;
   },
 
-  async parseEquity(file: File, broker: 'groww' | 'zerodha' = 'groww'): Promise<any> {
+  async parseEquity(file: File, broker?: 'groww' | 'zerodha'): Promise<any> {
     const formData = new FormData();
     formData.append('file', file);
-    formData.append('broker', broker);
+    // The backend detects the format; broker is only a fallback hint
+    if (broker) formData.append('broker', broker);
     
     const response = await api.post<ApiResponse<any>>('/parse/equity', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
@@ -0,0 +1,64 @@
+"""
+Gunicorn Configuration (Multi-Worker Deployment)
+
+Runs several uvicorn workers behind one gunicorn master:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+The app is imported once in the master (``preload_app``) and, before any
+worker forks, app.startup.preload() builds the parser objects and compiled
+tax rules, so every worker shares those pages copy-on-write instead of
+importing pandas / OCR libraries itself.
+
+State that must be seen by every worker is moved to shared backends on
+this host unless already configured:
+- Chat sessions: SQLite (WAL) file
+- Parse results: SQLite (WAL) tier of the parse cache
+- Trade-level breakdowns: .npz directory, so a breakdown_id returned by
+  one worker can be paged through on any other
+- Saved profiles (SMARTTAX_PROFILE=1): one directory, so
+  GET /admin/profiles lists every worker's slow requests
+In-memory caches (LLM answers, format detection) stay per worker.
+
+Each worker gets its own parser process pool; CPU cores are split between
+the workers so the host is not oversubscribed.
+
+Configuration (environment variables):
+    WEB_CONCURRENCY: API worker processes (default: CPU count)
+    PORT: Port to bind (default: 8000)
+    SMARTTAX_STATE_DIR: Directory for the shared state files (default: .)
+    SMARTTAX_PARSE_WORKERS: Parser processes per API worker (default:
+        CPU count / WEB_CONCURRENCY, at least 1)
+
+Author: SmartTax Team
+"""
+
+import os
+
+_cpus = os.cpu_count() or 1
+_state_dir = os.getenv("SMARTTAX_STATE_DIR", ".")
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(_cpus)))
+worker_class = "uvicorn.workers.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+preload_app = True
+
+# Form-16 OCR can take a while; parse jobs have their own timeout
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Read by the app at import, which happens after this file is loaded
+os.environ.setdefault("SMARTTAX_CHAT_BACKEND", "sqlite")
+os.environ.setdefault("SMARTTAX_CHAT_DB", os.path.join(_state_dir, "smarttax_sessions.db"))
+os.environ.setdefault("SMARTTAX_PARSE_CACHE_DB", os.path.join(_state_dir, "smarttax_parse_cache.db"))
+os.environ.setdefault("SMARTTAX_BREAKDOWN_DIR", os.path.join(_state_dir, "smarttax_breakdowns"))
+os.environ.setdefault("SMARTTAX_PROFILE_DIR", os.path.join(_state_dir, "smarttax_profiles"))
+os.environ.setdefault("SMARTTAX_PARSE_WORKERS", str(max(1, _cpus // max(1, workers))))
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded, before workers fork"""
+    from app import startup
+
+    server.log.info("Preloaded parsers and tax rules in %.0f ms", startup.preload())